@@ -0,0 +1,63 @@
+"""
+Memory and attribute access cost of the geometry and light ray classes
+
+Run from the repository root with: python -m benchmarks.bench_geometry
+"""
+import timeit
+import tracemalloc
+
+import numpy
+
+from illumigator import geometry, light
+
+
+COUNT = 20000
+
+
+def measure_memory(create) -> float:
+    # Bytes per object, not counting the arrays the objects point to (they are shared here)
+    tracemalloc.start()
+    objects = [create() for _ in range(COUNT)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objects
+    return size / COUNT
+
+
+def measure_time(statement: str, namespace: dict, number: int = 200000) -> float:
+    # Nanoseconds per execution, best of five runs
+    return min(timeit.repeat(statement, globals=namespace, number=number, repeat=5)) / number * 1e9
+
+
+def main():
+    point1, point2 = numpy.zeros(2), numpy.ones(2)
+    line = geometry.Line(None, point1, point2, is_receiver=True)
+    arc = geometry.Arc(None, point1, 100, 0, numpy.pi / 5)
+    ray = light.LightRay(point1, point2)
+    namespace = {"geometry": geometry, "light": light, "line": line, "ray": ray, "point1": point1, "point2": point2}
+
+    print(f"{'':32}{'bytes/object':>14}")
+    print(f"{'Line':32}{measure_memory(lambda: geometry.Line(None, point1, point2)):>14.1f}")
+    print(f"{'Arc':32}{measure_memory(lambda: geometry.Arc(None, point1, 100, 0, numpy.pi / 5)):>14.1f}")
+    print(f"{'LightRay':32}{measure_memory(lambda: light.LightRay(point1, point2)):>14.1f}")
+    print()
+
+    print(f"{'':32}{'ns/op':>14}")
+    timings = {
+        "Line()": "geometry.Line(None, point1, point2)",
+        "LightRay()": "light.LightRay(point1, point2)",
+        "line.is_receiver": "line.is_receiver",
+        "line.parent_object": "line.parent_object",
+        "line._point1": "line._point1",
+        "ray.direction": "ray.direction",
+        "ray.generation = 1": "ray.generation = 1",
+    }
+    if hasattr(line, "flags"):
+        timings["line.flags & RECEIVER"] = "line.flags & geometry.RECEIVER"
+    for name, statement in timings.items():
+        print(f"{name:32}{measure_time(statement, namespace):>14.1f}")
+    del arc
+
+
+if __name__ == "__main__":
+    main()
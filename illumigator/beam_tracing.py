@@ -0,0 +1,148 @@
+import math
+from collections import deque
+
+import numpy
+
+from illumigator import geometry, light, util, visibility
+
+
+class Beam:
+    """
+    The rays of a sweep between two of its positions, each position carrying power_scale of the source power
+    """
+    __slots__ = ("sweep", "start", "end", "power_scale", "spacing", "generation")
+
+    def __init__(self, sweep: visibility.SegmentSweep, start: float, end: float, power_scale: float, spacing: float, generation: int):
+        self.sweep = sweep
+        self.start = start
+        self.end = end
+        self.power_scale = power_scale
+        self.spacing = spacing  # Distance between the rays of the light source, in positions of the sweep
+        self.generation = generation
+
+
+class BeamTracer:
+    """
+    Follows the light of a source as intervals of rays through flat mirrors, to find the exact share of its power that
+    reaches each line segment first. Light that meets curved or refracting geometry is handed back as sampled rays,
+    sample_density of them per ray of the light source. The power those rays carry is only as exact as that sampling:
+    each sampled interval can be off by at most its own share of power, and less the denser it is sampled.
+    """
+
+    def __init__(self, line_p1, line_p2, line_flags, arc_data, circle_data, edge_p1, edge_p2, max_intervals=util.MAX_BEAM_INTERVALS,
+                 max_generations=util.MAX_GENERATIONS, sample_density=util.BEAM_SAMPLE_DENSITY):
+        self.line_p1, self.line_p2, self.line_flags = line_p1, line_p2, line_flags
+        self.arc_data, self.circle_data = arc_data, circle_data
+        self.edge_p1, self.edge_p2 = edge_p1, edge_p2
+        self.max_intervals = max_intervals
+        self.max_generations = max_generations
+        self.sample_density = sample_density
+
+        # Arcs are taken as whole circles here, which only adds a few positions where nothing changes
+        centers = numpy.concatenate([arc_data[:, 0:2], circle_data[:, 0:2]])
+        radii = numpy.concatenate([arc_data[:, 2], circle_data[:, 2]])
+        self.circles = (centers, radii) if len(centers) > 0 else None
+        self.all_p1, self.all_p2 = numpy.concatenate([line_p1, edge_p1]), numpy.concatenate([line_p2, edge_p2])
+        arc_ends = numpy.concatenate([
+            arc_data[:, 0:2] + arc_data[:, 2:3] * numpy.column_stack([numpy.cos(arc_data[:, index]), numpy.sin(arc_data[:, index])])
+            for index in (3, 4)
+        ])
+        self.critical_points = numpy.concatenate([
+            self.all_p1, self.all_p2, visibility.get_crossings(self.all_p1, self.all_p2), arc_ends,
+            visibility.get_circle_cuts(centers, radii, self.all_p1, self.all_p2), visibility.get_circle_crossings(centers, radii),
+        ])
+        self.cast_other = self._cast_other if len(centers) > 0 or len(edge_p1) > 0 else None
+
+    def _cast_other(self, ray_origin: numpy.ndarray, ray_dir: numpy.ndarray) -> numpy.ndarray:
+        distances = numpy.full(len(ray_dir), float('inf'))
+        if len(self.arc_data) > 0:
+            distances = numpy.minimum(distances, light.get_arc_raycast_results(
+                ray_origin[:, 0], ray_origin[:, 1], ray_dir[:, 0], ray_dir[:, 1], self.arc_data[:, 0], self.arc_data[:, 1],
+                self.arc_data[:, 2], self.arc_data[:, 3], self.arc_data[:, 4])[0])
+        if len(self.circle_data) > 0:
+            distances = numpy.minimum(distances, light.get_circle_raycast_results(
+                ray_origin, ray_dir, self.circle_data[:, 0:2], self.circle_data[:, 2])[0])
+        if len(self.edge_p1) > 0:
+            distances = numpy.minimum(distances, light.get_line_raycast_results(ray_origin, ray_dir, self.edge_p1, self.edge_p2)[0])
+        return distances
+
+    def _get_critical_points(self, start_segment) -> numpy.ndarray:
+        # Geometry that the start line goes through is cut off there
+        if start_segment is None:
+            return self.critical_points
+        cuts = [self.critical_points, visibility.get_line_cuts(self.all_p1, self.all_p2, *start_segment)]
+        if self.circles is not None:
+            cuts.append(visibility.get_circle_cuts(*self.circles, start_segment[0][None], start_segment[1][None]))
+        return numpy.concatenate(cuts)
+
+    def _get_radial_sweep(self, origin, start_angle, end_angle, start_line=None) -> visibility.Visibility:
+        return visibility.Visibility(origin, self.line_p1, self.line_p2, start_angle, end_angle,
+                                     self._get_critical_points(start_line), self.circles, start_line, self.cast_other)
+
+    def _get_parallel_sweep(self, center, direction, half_width, start_line=None) -> visibility.BeamVisibility:
+        across = numpy.array([-direction[1], direction[0]])
+        start_segment = start_line if start_line is not None else (center - across * half_width, center + across * half_width)
+        return visibility.BeamVisibility(center, direction, half_width, self.line_p1, self.line_p2,
+                                         self._get_critical_points(start_segment), self.circles, start_line, self.cast_other)
+
+    def trace_radial(self, origin: numpy.ndarray, start_angle: float, end_angle: float, ray_count: int):
+        sweep = self._get_radial_sweep(origin, start_angle, end_angle)
+        return self._trace(Beam(sweep, 0, sweep.end, 1 / sweep.end, sweep.end / ray_count, 0))
+
+    def trace_parallel(self, center: numpy.ndarray, direction: numpy.ndarray, width: float, ray_count: int):
+        sweep = self._get_parallel_sweep(center, direction, width / 2)
+        return self._trace(Beam(sweep, 0, sweep.end, 1 / sweep.end, sweep.end / max(ray_count - 1, 1), 0))
+
+    def _trace(self, beam: Beam) -> tuple[numpy.ndarray, list]:
+        # Returns the share of power first reaching each line segment, and the sampled rays that take over where
+        # beams cannot follow the light, as (origins, directions, share of power per ray, generation)
+        power = numpy.zeros(len(self.line_p1))
+        sampled_rays = []
+        beams = deque([beam])
+        interval_count = 0
+        while len(beams) > 0:
+            beam = beams.popleft()
+            if interval_count >= self.max_intervals:
+                sampled_rays.append(self._sample(beam, beam.start, beam.end))
+                continue
+            boundaries = numpy.clip(beam.sweep.boundaries, beam.start, beam.end)
+            for start, end, segment in zip(boundaries[:-1].tolist(), boundaries[1:].tolist(), beam.sweep.segments.tolist()):
+                if end <= start or segment == visibility.MISSED:
+                    continue
+                interval_count += 1
+                if segment == visibility.OTHER or self.line_flags[segment] & geometry.REFRACTIVE:
+                    sampled_rays.append(self._sample(beam, start, end))
+                elif not self.line_flags[segment] & geometry.REFLECTIVE:
+                    power[segment] += (end - start) * beam.power_scale
+                elif beam.generation < self.max_generations:
+                    beams.append(self._reflect(beam, start, end, segment))
+        return power, sampled_rays
+
+    def _sample(self, beam: Beam, start: float, end: float) -> tuple[numpy.ndarray, numpy.ndarray, float, int]:
+        # sample_density times as many rays as the light source would have sent between the two positions
+        ray_count = max(math.ceil((end - start) / beam.spacing * self.sample_density), 1)
+        ray_origin, ray_dir = beam.sweep.get_rays(start + (numpy.arange(ray_count) + 0.5) * (end - start) / ray_count)
+        return ray_origin, ray_dir, (end - start) * beam.power_scale / ray_count, beam.generation
+
+    def _reflect(self, beam: Beam, start: float, end: float, segment: int) -> Beam:
+        # The light reflected off a flat mirror is the same kind of family, mirrored and starting on the mirror
+        sweep = beam.sweep
+        mirror = (self.line_p1[segment], self.line_p2[segment])
+        hit_start, hit_end = sweep.get_hits(numpy.array([start, end]), segment)
+        normal = numpy.array([mirror[0][1] - mirror[1][1], mirror[1][0] - mirror[0][0]])
+        normal /= numpy.linalg.norm(normal)
+        match sweep:
+            case visibility.Visibility():
+                origin = sweep.origin - 2 * normal * ((sweep.origin - mirror[0]) @ normal)
+                angle_start = math.atan2(hit_start[1] - origin[1], hit_start[0] - origin[0])
+                angle_end = math.atan2(hit_end[1] - origin[1], hit_end[0] - origin[0])
+                spread = (angle_end - angle_start) % (2 * numpy.pi)
+                if spread > numpy.pi:  # Reflection turns the window around
+                    angle_start, spread = angle_end, 2 * numpy.pi - spread
+                reflected = self._get_radial_sweep(origin, angle_start, angle_start + spread, mirror)
+            case _:
+                direction = geometry.reflect(sweep.direction, normal)
+                across = numpy.array([-direction[1], direction[0]])
+                half_width = abs((hit_end - hit_start) @ across) / 2
+                reflected = self._get_parallel_sweep((hit_start + hit_end) / 2, direction, half_width, mirror)
+        return Beam(reflected, 0, reflected.end, beam.power_scale, beam.spacing, beam.generation + 1)
@@ -78,6 +78,17 @@ class PlayerSpriteLoader(SpriteLoader):
 
         self.stationary = self._sprites[0]
 
+    def reset(self, animations: bool = False):
+        # Walking frames are reset every idle frame, the death and idle animations only when the gator starts over
+        super().reset()
+        if animations:
+            self.dead = False
+            self._dead_index = -1
+            self._dead_frames_shown = 0
+            self.idle = False
+            self._idle_index = -1
+            self._idle_frames_shown = 0
+
     def __next__(self):
         if self.dead:
             # Show last death sprite for 20 frames
@@ -181,11 +192,33 @@ class Gator:
         self.mirror_in_reach = None
         self.rotation_dir = 0
         self.rotation_factor = 0
-        self.player = pyglet.media.player.Player()
+        self.player: pyglet.media.Player | None = None  # Made by arcade.play_sound on the main thread, levels are built on a worker thread
 
 
         self.walking_sound = util.load_sound("new_walk.wav")
         self.walking_volume = walking_volume
+        self._initial_texture = self.sprite.texture
+
+    def get_position(self) -> numpy.ndarray:
+        return numpy.array([self.sprite.center_x, self.sprite.center_y])
+
+    def reset(self, position):
+        self.status = "alive"
+        for loader in (self.left_character_loader, self.right_character_loader):
+            loader.reset(animations=True)
+        self.sprite.texture = self._initial_texture
+        self.move_to(position)
+        self.last_movement_timestamp = time.time()
+
+        self.left = False
+        self.right = False
+        self.up = False
+        self.down = False
+        self.mirror_in_reach = None
+        self.rotation_dir = 0
+        self.rotation_factor = 0
+        if self.player is not None and arcade.Sound.is_playing(self.walking_sound, self.player):
+            arcade.stop_sound(self.player)
 
     def draw(self):
         if self.mirror_in_reach is not None:
@@ -211,7 +244,8 @@ class Gator:
         self.walking_volume = walking_volume
         self.walk(level, enemy)
 
-        mirror, dist_squared = worldobjects.find_nearest_world_object(self.world_object.position, level.mirror_list)
+        mirror, dist_squared = worldobjects.find_nearest_world_object(
+            self.world_object.position, level.mirror_list + level.curved_mirror_list)
         self.mirror_in_reach = mirror if dist_squared < util.PLAYER_REACH_DISTANCE_SQUARED else None
 
         # Rotation
@@ -244,7 +278,7 @@ class Gator:
         # If player isn't moving
         if numpy.array_equal(direction, numpy.zeros(2)):
             # Check if sound should be stopped
-            if arcade.Sound.is_playing(self.walking_sound, self.player):
+            if self.player is not None and arcade.Sound.is_playing(self.walking_sound, self.player):
                 arcade.stop_sound(self.player)
 
             # Check timer for idling
@@ -263,7 +297,7 @@ class Gator:
         # If player is moving
         else:
             # Check if sound should be played
-            if not arcade.Sound.is_playing(self.walking_sound, self.player) and self.walking_volume > 0:
+            if (self.player is None or not arcade.Sound.is_playing(self.walking_sound, self.player)) and self.walking_volume > 0:
                 self.player = arcade.play_sound(self.walking_sound, float(self.walking_volume))
 
             # Reset timer for idling
@@ -342,6 +376,22 @@ class Enemy:
              8),
             is_enemy=True
         )
+        self._initial_texture = self.sprite.texture
+
+    def get_position(self) -> numpy.ndarray:
+        return numpy.array([self.sprite.center_x, self.sprite.center_y])
+
+    def reset(self, position):
+        if self.status == "aggro":  # Undo update_geometry_shape
+            sprite_path, sprite_scale, sprite_width, sprite_height = util.ENEMY_SPRITE_INFO
+            self.world_object.position = self.world_object.position - numpy.array([2 * sprite_scale, 6 * sprite_scale])
+            self._set_geometry_shape(14, 8)
+        self.status = "asleep"
+        self.left_character_loader.reset()
+        self.right_character_loader.reset()
+        self.sleep_texture_iter = self.left_character_loader.iter_sleep_sprite()
+        self.sprite.texture = self._initial_texture
+        self.move_to(position)
 
     def update(self, level, gator):
         if self.status == "asleep":
@@ -356,7 +406,7 @@ class Enemy:
             else:
                 direction_from_obstacle = self.world_object.position - worldobjects.find_nearest_world_object(
                     self.world_object.position,
-                    level.wall_list + level.mirror_list + level.lens_list + level.light_receiver_list + level.light_source_list
+                    level.wall_list + level.mirror_list + level.curved_mirror_list + level.lens_list + level.prism_list + level.ball_lens_list + level.light_receiver_list + level.light_source_list
                 )[0].position
 
                 direction = (0.7/numpy.linalg.norm(direction_to_player)) * direction_to_player + (0.3/numpy.linalg.norm(direction_from_obstacle)) * direction_from_obstacle
@@ -390,13 +440,19 @@ class Enemy:
     def update_geometry_shape(self):
         wo = self.world_object
         sprite_path, sprite_scale, sprite_width, sprite_height = util.ENEMY_SPRITE_INFO
-        wo.position += numpy.array([2 * sprite_scale, 6 * sprite_scale])
-        axis1 = numpy.array([0.5 * (sprite_width-2) * sprite_scale, 0])
-        axis2 = numpy.array([0, 0.5 * (sprite_height-6) * sprite_scale])
+        wo.position = wo.position + numpy.array([2 * sprite_scale, 6 * sprite_scale])
+        self._set_geometry_shape(sprite_width - 2, sprite_height - 6)
+
+    def _set_geometry_shape(self, width, height):
+        wo = self.world_object
+        sprite_scale = util.ENEMY_SPRITE_INFO[1]
+        axis1 = numpy.array([0.5 * width * sprite_scale, 0])
+        axis2 = numpy.array([0, 0.5 * height * sprite_scale])
         wo.geometry_segments[0]._point1 = wo.position - axis1 - axis2
         wo.geometry_segments[0]._point2 = wo.position + axis1 + axis2
         wo.geometry_segments[1]._point1 = wo.position - axis1 + axis2
         wo.geometry_segments[1]._point2 = wo.position + axis1 - axis2
+        wo.capture_geometry()
 
 
     def draw(self):
@@ -7,24 +7,55 @@ import numpy
 from illumigator import util
 
 
+# Bits of Geometry.flags
+REFLECTIVE = 1 << 0
+REFRACTIVE = 1 << 1
+RECEIVER = 1 << 2
+ENEMY = 1 << 3
+
+
+def _flag_property(flag: int) -> property:
+    def get_flag(self) -> bool:
+        return self.flags & flag != 0
+
+    def set_flag(self, value: bool):
+        self.flags = self.flags | flag if value else self.flags & ~flag
+
+    return property(get_flag, set_flag)
+
+
 class Geometry(ABC):
+    # Levels and their ray trees create a lot of these, so they are slotted and keep their flags in one int
+    __slots__ = ("parent_object", "flags")
+
     def __init__(self, parent_object, is_reflective: bool, is_refractive: bool, is_receiver: bool, is_enemy: bool):
         self.parent_object = parent_object
-        self.is_reflective = is_reflective
-        self.is_refractive = is_refractive
-        self.is_receiver = is_receiver
-        self.is_enemy = is_enemy
+        self.flags = (
+            (REFLECTIVE if is_reflective else 0)
+            | (REFRACTIVE if is_refractive else 0)
+            | (RECEIVER if is_receiver else 0)
+            | (ENEMY if is_enemy else 0)
+        )
+
+    is_reflective = _flag_property(REFLECTIVE)
+    is_refractive = _flag_property(REFRACTIVE)
+    is_receiver = _flag_property(RECEIVER)
+    is_enemy = _flag_property(ENEMY)
 
     @abstractmethod
     def draw(self, *, color=arcade.color.BLUE, thickness=3):
         pass
 
     @abstractmethod
-    def move(self, world_object_center, move_distance, rotate_angle=0):
+    def pack(self) -> tuple:
+        # Row of this segment in the packed array of its geometry registry
         pass
 
 
 class Line(Geometry):
+    __slots__ = ("_point1", "_point2", "_normal")
+    PACKED_WIDTH = 4  # x1, y1, x2, y2
+
     def __init__(
         self,
         parent_object,
@@ -36,23 +67,12 @@ class Line(Geometry):
         is_enemy: bool = False
     ):
         super().__init__(parent_object, is_reflective, is_refractive, is_receiver, is_enemy)
-        if is_reflective:
-            self._normal = None
+        self._normal = None
         self._point1 = point1
         self._point2 = point2
-        self._length = numpy.linalg.norm(point2 - point1)
 
-    def move(self, world_object_center, move_distance, rotate_angle=0):
-        self._point1 = (
-            util.rotate_around_point(world_object_center, self._point1, rotate_angle)
-            + move_distance
-        )
-        self._point2 = (
-            util.rotate_around_point(world_object_center, self._point2, rotate_angle)
-            + move_distance
-        )
-        if self.is_reflective:
-            self.calculate_normal()
+    def pack(self) -> tuple:
+        return self._point1[0], self._point1[1], self._point2[0], self._point2[1]
 
     def calculate_normal(self):
         x = self._point1[1] - self._point2[1]
@@ -68,36 +88,81 @@ class Line(Geometry):
         )
 
 
-# class Circle(Geometry):
-#     def __init__(
-#         self,
-#         parent_object,
-#         center: numpy.ndarray,
-#         radius: float,
-#         is_reflective: bool = False,
-#         is_refractive: bool = False,
-#         is_receiver: bool = False,
-#         is_enemy: bool = False
-#     ):
-#         super().__init__(parent_object, is_reflective, is_refractive, is_receiver, is_enemy)
-#         self.center = center
-#         self.radius = radius
-#
-#     def move(self, world_object_center, move_distance, rotate_angle=0):
-#         self.center = (
-#             util.rotate_around_point(world_object_center, self.center, rotate_angle)
-#             + move_distance
-#         )
-#
-#     def draw(self, *, color=arcade.color.MAGENTA, thickness=1):
-#         arcade.draw_circle_outline(
-#             self.center[0], self.center[1],
-#             self.radius, color,
-#             border_width=thickness
-#         )
+class Circle(Geometry):
+    __slots__ = ("center", "radius")
+    PACKED_WIDTH = 3  # center x, center y, radius
+
+    def __init__(
+        self,
+        parent_object,
+        center: numpy.ndarray,
+        radius: float,
+        is_reflective: bool = False,
+        is_refractive: bool = False,
+        is_receiver: bool = False,
+        is_enemy: bool = False
+    ):
+        super().__init__(parent_object, is_reflective, is_refractive, is_receiver, is_enemy)
+        self.center = center
+        self.radius = radius
+
+    def pack(self) -> tuple:
+        return self.center[0], self.center[1], self.radius
+
+    def draw(self, *, color=arcade.color.MAGENTA, thickness=3):
+        arcade.draw_circle_outline(
+            self.center[0], self.center[1],
+            self.radius, color,
+            border_width=thickness,
+            num_segments=256,
+        )
+
+    def get_normal(self, point: numpy.ndarray) -> numpy.ndarray:
+        return (point - self.center) / self.radius
+
+
+class Polygon(Geometry):
+    __slots__ = ("vertices", "normals", "center", "radius")
+    PACKED_WIDTH = 3  # Bounding circle: center x, center y, radius
+
+    def __init__(
+        self,
+        parent_object,
+        vertices: numpy.ndarray,
+        is_reflective: bool = False,
+        is_refractive: bool = False,
+        is_receiver: bool = False,
+        is_enemy: bool = False
+    ):
+        super().__init__(parent_object, is_reflective, is_refractive, is_receiver, is_enemy)
+        if len(vertices) < 3:
+            raise ValueError("Polygon needs at least 3 vertices")
+        self.set_vertices(vertices)
+
+    def set_vertices(self, vertices: numpy.ndarray):
+        # Closed outline, edge i goes from vertex i to vertex i + 1 and normals[i] points out of the polygon
+        self.vertices = numpy.asarray(vertices, dtype=float)
+        edges = numpy.roll(self.vertices, -1, axis=0) - self.vertices
+        self.normals = numpy.column_stack([edges[:, 1], -edges[:, 0]]) / numpy.hypot(edges[:, 0], edges[:, 1])[:, None]
+        if numpy.sum(edges[:, 0] * (self.vertices[:, 1] + numpy.roll(self.vertices[:, 1], -1))) > 0:
+            self.normals = -self.normals  # Vertices are in clockwise order
+        self.center = self.vertices.mean(axis=0)
+        self.radius = numpy.max(numpy.hypot(*(self.vertices - self.center).T))
+
+    def get_edges(self) -> tuple[numpy.ndarray, numpy.ndarray]:
+        return self.vertices, numpy.roll(self.vertices, -1, axis=0)
+
+    def pack(self) -> tuple:
+        return self.center[0], self.center[1], self.radius
+
+    def draw(self, *, color=arcade.color.MAGENTA, thickness=3):
+        arcade.draw_polygon_outline(self.vertices.tolist(), color, line_width=thickness)
 
 
 class Arc(Geometry):
+    __slots__ = ("_start_angle", "_end_angle", "center", "radius")
+    PACKED_WIDTH = 5  # center x, center y, radius, start angle, end angle
+
     def __init__(
         self,
         parent_object,
@@ -111,8 +176,8 @@ class Arc(Geometry):
         is_enemy: bool = False
     ):
         super().__init__(parent_object, is_reflective, is_refractive, is_receiver, is_enemy)
-        if angular_width > numpy.pi:
-            raise ValueError("Arc angle cannot be greater than PI")
+        if angular_width >= 2 * numpy.pi:
+            raise ValueError("Arc angle must be less than 2 PI, use a Circle for a full circle")
         self._start_angle = rotation_angle - angular_width / 2
         self._end_angle = rotation_angle + angular_width / 2
         self._constrain_angles()
@@ -131,14 +196,8 @@ class Arc(Geometry):
         elif self._end_angle < -numpy.pi:
             self._end_angle += 2 * numpy.pi
 
-    def move(self, world_object_center, move_distance, rotate_angle=0):
-        self.center = (
-            util.rotate_around_point(world_object_center, self.center, rotate_angle)
-            + move_distance
-        )
-        self._start_angle += rotate_angle
-        self._end_angle += rotate_angle
-        self._constrain_angles()
+    def pack(self) -> tuple:
+        return self.center[0], self.center[1], self.radius, self._start_angle, self._end_angle
 
     def draw(self, *, color=arcade.color.MAGENTA, thickness=3):
         if self._start_angle < self._end_angle:
@@ -162,22 +221,168 @@ class Arc(Geometry):
                 num_segments=256,
             )
 
+    def get_normal(self, point: numpy.ndarray) -> numpy.ndarray:
+        return (point - self.center) / self.radius
+
     def get_refracted_direction(self, ray):
-        # Determine normal
-        normal = (ray._end - self.center) / self.radius
-        # Determine whether coming into or out of shape
-        dot_product = normal @ ray.direction
-
-        if dot_product < 0:  # Ray is coming into the shape
-            # Determine refraction angle with respect to normal
-            angle = (numpy.pi - math.acos(dot_product)) / util.INDEX_OF_REFRACTION
-            if util.two_d_cross_product(ray.direction, normal) < 0:
-                angle = -angle
-            # Create vector with new angle from normal
-            return -util.rotate(normal, angle)
-
-        else:  # Ray is going out of shape
-            angle = (numpy.pi - math.acos(-dot_product)) * util.INDEX_OF_REFRACTION
-            if util.two_d_cross_product(ray.direction, normal) > 0:
-                angle = -angle
-            return util.rotate(normal, angle)
+        return refract(ray.direction, self.get_normal(ray._end))
+
+
+def _get_runs(mask: numpy.ndarray) -> tuple[numpy.ndarray, numpy.ndarray]:
+    # Start and end (exclusive) of every run of True values
+    changes = numpy.flatnonzero(numpy.diff(numpy.concatenate(([False], mask, [False])).astype(int)))
+    return changes[0::2], changes[1::2]
+
+
+def get_box_groups(boxes: numpy.ndarray) -> list[numpy.ndarray]:
+    # Indices of the boxes in each group of boxes that touch or overlap one another
+    touching = ((boxes[:, None, 0] <= boxes[None, :, 2]) & (boxes[None, :, 0] <= boxes[:, None, 2])
+                & (boxes[:, None, 1] <= boxes[None, :, 3]) & (boxes[None, :, 1] <= boxes[:, None, 3]))
+    labels = numpy.arange(len(boxes))
+    while True:  # Every box takes the lowest label it touches until nothing changes
+        new_labels = numpy.where(touching, labels[None, :], len(boxes)).min(axis=1)
+        if numpy.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+    return [numpy.flatnonzero(labels == label) for label in numpy.unique(labels)]
+
+
+def get_union_outline(boxes: numpy.ndarray) -> tuple[numpy.ndarray, numpy.ndarray]:
+    # Outline of the union of axis-aligned boxes (x0, y0, x1, y1) as the longest possible straight segments.
+    # Edges between boxes that touch or overlap are left out, they can only be reached from inside a box.
+    xs = numpy.unique(boxes[:, [0, 2]])
+    ys = numpy.unique(boxes[:, [1, 3]])
+    x0, x1 = numpy.searchsorted(xs, boxes[:, 0]), numpy.searchsorted(xs, boxes[:, 2])
+    y0, y1 = numpy.searchsorted(ys, boxes[:, 1]), numpy.searchsorted(ys, boxes[:, 3])
+
+    # Which cells of the grid spanned by the box edges are covered, through a 2D difference array
+    coverage = numpy.zeros((len(xs), len(ys)), dtype=int)
+    numpy.add.at(coverage, (x0, y0), 1)
+    numpy.add.at(coverage, (x1, y0), -1)
+    numpy.add.at(coverage, (x0, y1), -1)
+    numpy.add.at(coverage, (x1, y1), 1)
+    filled = numpy.pad(coverage.cumsum(axis=0).cumsum(axis=1)[:-1, :-1] > 0, 1)
+
+    point1, point2 = [], []
+    vertical_edges = filled[:-1, 1:-1] != filled[1:, 1:-1]  # At xs[i], between ys[j] and ys[j + 1]
+    for i, edges in enumerate(vertical_edges):
+        for start, end in zip(*_get_runs(edges)):
+            point1.append((xs[i], ys[start]))
+            point2.append((xs[i], ys[end]))
+    horizontal_edges = filled[1:-1, :-1] != filled[1:-1, 1:]  # At ys[j], between xs[i] and xs[i + 1]
+    for j, edges in enumerate(horizontal_edges.T):
+        for start, end in zip(*_get_runs(edges)):
+            point1.append((xs[start], ys[j]))
+            point2.append((xs[end], ys[j]))
+    return numpy.array(point1, dtype=float).reshape(-1, 2), numpy.array(point2, dtype=float).reshape(-1, 2)
+
+
+def reflect(direction: numpy.ndarray, normal: numpy.ndarray) -> numpy.ndarray:
+    return direction - (2 * normal * (normal @ direction))
+
+
+def refract(direction: numpy.ndarray, normal: numpy.ndarray) -> numpy.ndarray:
+    # Normal points out of the shape, so its sign tells whether the ray is coming into or out of it
+    dot_product = normal @ direction
+
+    if dot_product < 0:  # Ray is coming into the shape
+        # Determine refraction angle with respect to normal
+        angle = (numpy.pi - math.acos(dot_product)) / util.INDEX_OF_REFRACTION
+        if util.two_d_cross_product(direction, normal) < 0:
+            angle = -angle
+        # Create vector with new angle from normal
+        return -util.rotate(normal, angle)
+
+    else:  # Ray is going out of shape
+        angle = (numpy.pi - math.acos(-dot_product)) * util.INDEX_OF_REFRACTION
+        if util.two_d_cross_product(direction, normal) > 0:
+            angle = -angle
+        return util.rotate(normal, angle)
+
+
+class GeometryRegistry:
+    """
+    Geometry store for a level that hands out stable handles, so segments can be removed without searching for them
+    """
+
+    def __init__(self, width: int, segments=()):
+        self._segments: list[Geometry] = []
+        self._handles: list[int] = []  # Handle of the segment at each index
+        self._indices: dict[int, int] = {}  # Index of the segment behind each handle
+        self._next_handle = 0
+        # Packed rows of all segments in index order, read by the raycast kernels as they are
+        self._data = numpy.empty((16, width))
+        self.extend(segments)
+
+    def __len__(self):
+        return len(self._segments)
+
+    def __getitem__(self, index: int) -> Geometry:
+        return self._segments[index]
+
+    def __iter__(self):
+        return iter(self._segments)
+
+    @property
+    def data(self) -> numpy.ndarray:
+        return self._data[:len(self._segments)]
+
+    def add(self, segment: Geometry) -> int:
+        handle = self._next_handle
+        self._next_handle += 1
+        if len(self._segments) == len(self._data):
+            self._data = numpy.concatenate([self._data, numpy.empty_like(self._data)])
+        self._data[len(self._segments)] = segment.pack()
+        self._indices[handle] = len(self._segments)
+        self._segments.append(segment)
+        self._handles.append(handle)
+        return handle
+
+    def extend(self, segments) -> list[int]:
+        return [self.add(segment) for segment in segments]
+
+    def get(self, handle: int) -> Geometry:
+        return self._segments[self._indices[handle]]
+
+    def get_index(self, handle: int) -> int:
+        return self._indices[handle]
+
+    def replace(self, handle: int, segment: Geometry):
+        index = self._indices[handle]
+        self._segments[index] = segment
+        self._data[index] = segment.pack()
+
+    def remove(self, handle: int):
+        # Swap-remove: the last segment takes the freed slot, so the order of segments is not preserved
+        index = self._indices.pop(handle)
+        last_segment = self._segments.pop()
+        last_handle = self._handles.pop()
+        if index < len(self._segments):
+            self._segments[index] = last_segment
+            self._handles[index] = last_handle
+            self._indices[last_handle] = index
+            self._data[index] = self._data[len(self._segments)]
+
+    def write(self, handles: list[int], rows: numpy.ndarray):
+        self._data[[self._indices[handle] for handle in handles]] = rows
+
+    def attach(self, world_object):
+        world_object.geometry_handles = self.extend(world_object.geometry_segments)
+        world_object.geometry_registry = self
+
+    def detach(self, world_object):
+        for handle in world_object.geometry_handles:
+            self.remove(handle)
+        world_object.geometry_handles = []
+        world_object.geometry_registry = None
+
+    def transfer(self, old_world_object, new_world_object):
+        # The new object must have as many segments as the old one, it takes over the old handles in place
+        if len(old_world_object.geometry_handles) != len(new_world_object.geometry_segments):
+            raise ValueError("transfer needs the same number of segments on both objects")
+        for handle, segment in zip(old_world_object.geometry_handles, new_world_object.geometry_segments):
+            self.replace(handle, segment)
+        new_world_object.geometry_handles = old_world_object.geometry_handles
+        new_world_object.geometry_registry = self
+        old_world_object.geometry_handles = []
+        old_world_object.geometry_registry = None
@@ -1,7 +1,12 @@
 import math
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import arcade
 import numpy
 
-from illumigator import worldobjects, entity, util, light
+from illumigator import worldobjects, entity, util, light, geometry, level_solver, spatial_index, visibility, beam_tracing, raycast_governor
 
 class Level:
     def __init__(
@@ -14,10 +19,14 @@ class Level:
             lens_coordinate_list = (),
             gator_coordinates = (640, 360),
             enemy_coordinates = (),
+            curved_mirror_coordinate_list = (),
+            prism_coordinate_list = (),
+            ball_lens_coordinate_list = (),
             name="default",
             background="space",
             planet="moon",
-            walking_volume=1
+            walking_volume=1,
+            merge_walls=False
     ):
 
         if name == "Level 1":
@@ -53,6 +62,15 @@ class Level:
             ) for mirror_coordinates in mirror_coordinate_list
         ]
 
+        self.curved_mirror_list = [
+            worldobjects.CurvedMirror(
+                numpy.array([
+                    curved_mirror_coordinates[0], curved_mirror_coordinates[1]
+                ]),
+                *curved_mirror_coordinates[2:4],
+            ) for curved_mirror_coordinates in curved_mirror_coordinate_list
+        ]
+
         self.lens_list = [
             worldobjects.Lens(
                 numpy.array([
@@ -63,6 +81,24 @@ class Level:
             ) for lens_coordinates in lens_coordinate_list
         ]
 
+        self.prism_list = [
+            worldobjects.Prism(
+                numpy.array([
+                    prism_coordinates[0], prism_coordinates[1]
+                ]),
+                *prism_coordinates[2:4],
+            ) for prism_coordinates in prism_coordinate_list
+        ]
+
+        self.ball_lens_list = [
+            worldobjects.BallLens(
+                numpy.array([
+                    ball_lens_coordinates[0], ball_lens_coordinates[1]
+                ]),
+                *ball_lens_coordinates[2:3],
+            ) for ball_lens_coordinates in ball_lens_coordinate_list
+        ]
+
         self.light_receiver_list = [
             worldobjects.LightReceiver(
                 numpy.array([
@@ -114,13 +150,31 @@ class Level:
                 numpy.array([animated_wall_coordinates[5], animated_wall_coordinates[6]]),
                 animated_wall_coordinates[7], animated_wall_coordinates[8])
 
-        # Append line segments and arcs to geometry lists
-        self.line_segments = []
-        self.arcs = []
-        for world_object in self.wall_list + self.mirror_list + self.light_receiver_list:
-            self.line_segments.extend(world_object.geometry_segments)
-        for world_object in self.lens_list:
-            self.arcs.extend(world_object.geometry_segments)
+        # Register the geometry of every world object in the registry for its kind of geometry
+        self.line_segments = geometry.GeometryRegistry(geometry.Line.PACKED_WIDTH)
+        self.arcs = geometry.GeometryRegistry(geometry.Arc.PACKED_WIDTH)
+        self.circles = geometry.GeometryRegistry(geometry.Circle.PACKED_WIDTH)
+        self.polygons = geometry.GeometryRegistry(geometry.Polygon.PACKED_WIDTH)
+        for world_object in self.wall_list + self.mirror_list + self.curved_mirror_list + self.lens_list + self.prism_list + self.ball_lens_list + self.light_receiver_list:
+            self.get_geometry_registry(world_object).attach(world_object)
+        self.merged_wall_segments: list[geometry.Line] = []
+        if merge_walls:
+            self.merge_wall_geometry()
+
+        # Index of object bounds for picking objects in the level creator
+        self.world_object_index = spatial_index.SpatialIndex(util.PICKING_CELL_SIZE)
+        for world_object in self.light_source_list + self.wall_list + self.mirror_list + self.curved_mirror_list + self.lens_list + self.prism_list + self.ball_lens_list + self.light_receiver_list:
+            self.world_object_index.insert(world_object, self.get_draw_layer(world_object))
+        # What each light source sees of the still line segments, with the state it was swept for
+        self.visibility_cache: dict[worldobjects.LightSource, tuple[tuple, numpy.ndarray, visibility.SegmentSweep]] = {}
+        # Light may need to bounce off every mirror and pass through both sides of every piece of glass on its way
+        min_generations = len(self.mirror_list + self.curved_mirror_list) + 2 * len(self.lens_list + self.prism_list + self.ball_lens_list) + 1
+        self.raycast_governor = raycast_governor.RaycastGovernor(min_generations=min_generations)
+        self.max_generations = util.MAX_GENERATIONS
+        # Effects of light on the level are collected here while it is raycast off the main thread, see simulation.py
+        self.defer_effects = False
+        self.charge_gains: dict[worldobjects.LightReceiver, float] = {}
+        self.enemy_alerted = False
 
         # Create entities
         self.entity_world_object_list: list[worldobjects.WorldObject] = []
@@ -130,9 +184,11 @@ class Level:
             self.create_enemy(enemy_coordinates)
         self.gator = entity.Gator(gator_coordinates, walking_volume)
         self.entity_world_object_list.append(self.gator.world_object)
-        self.line_segments.extend(self.gator.world_object.geometry_segments)
+        self.line_segments.attach(self.gator.world_object)
 
-    def update(self, walking_volume, ignore_checks=False):
+        self.initial_state = self.snapshot()
+
+    def update(self, walking_volume, ignore_checks=False, raycast=True):
         if not ignore_checks:
             if self.enemy is not None:
                 self.enemy.update(self, self.gator)
@@ -149,163 +205,511 @@ class Level:
             for light_receiver in self.light_receiver_list:
                 light_receiver.charge *= util.CHARGE_DECAY
 
-        self.raycast(ignore_checks)
+        if raycast:  # Otherwise the caller runs it, see simulation.py
+            self.run_raycast(ignore_checks)
+
+    def run_raycast(self, ignore_checks: bool, defer_effects: bool = False):
+        start = time.perf_counter()
+        self.defer_effects = defer_effects
+        try:
+            self.raycast(ignore_checks)
+        finally:
+            self.defer_effects = False
+        # The level creator raycasts without checks, it always shows the full light
+        if util.RAYCAST_GOVERNOR and not ignore_checks and self.raycast_governor.update(time.perf_counter() - start):
+            self.max_generations = self.raycast_governor.max_generations
+            for light_source in self.light_source_list:
+                light_source.set_ray_count(self.raycast_governor.ray_count)
 
     def raycast(self, ignore_checks: bool):
         #  ==================== Raycasting and update rays ====================
-        line_p1 = numpy.ndarray((len(self.line_segments), 2))
-        line_p2 = numpy.ndarray((len(self.line_segments), 2))
-        for line_i in range(len(self.line_segments)):
-            line_p1[line_i], line_p2[line_i] = self.line_segments[line_i]._point1, self.line_segments[line_i]._point2
-        arc_center = numpy.ndarray((len(self.arcs), 2))
-        arc_radius = numpy.ndarray((len(self.arcs),))
-        arc_angles = numpy.ndarray((len(self.arcs), 2))
-        for arc_i in range(len(self.arcs)):
-            arc_center[arc_i], arc_radius[arc_i], arc_angles[arc_i][0], arc_angles[arc_i][1] = self.arcs[arc_i].center, self.arcs[arc_i].radius, self.arcs[arc_i]._start_angle, self.arcs[arc_i]._end_angle
-
+        # Beam tracing and adaptive rays charge the receivers on their own. Otherwise, every source has the power of
+        # NUM_LIGHT_RAYS rays however many it sends.
         for light_source in self.light_source_list:
-            ray_queue = light_source.light_rays[:]
-            queue_length = len(ray_queue)
-            while queue_length > 0:
-                ray_origin = numpy.ndarray((queue_length, 2))
-                ray_dir = numpy.ndarray((queue_length, 2))
-                for ray_i in range(queue_length):
-                    ray_origin[ray_i], ray_dir[ray_i] = ray_queue[ray_i].origin, ray_queue[ray_i].direction
-
-                nearest_line_distances, nearest_line_indices = light.get_line_raycast_results(ray_origin, ray_dir, line_p1, line_p2)
-
-                if len(self.arcs) > 0:
-                    nearest_arc_distance, nearest_arc_indices = light.get_arc_raycast_results(
-                        ray_origin[:, 0], ray_origin[:, 1], ray_dir[:, 0], ray_dir[:, 1], arc_center[:, 0], arc_center[:, 1],
-                        arc_radius, arc_angles[:, 0], arc_angles[:, 1])
-                else:
-                    nearest_arc_distance, nearest_arc_indices = numpy.full_like(nearest_line_distances, float('inf')), numpy.full_like(nearest_line_distances, -1)
-
-                for i in range(queue_length):
-                    ray = ray_queue[i]
-                    if nearest_line_distances[i] <= nearest_arc_distance[i]:
-                        ray._end = ray.origin + ray.direction * nearest_line_distances[i]
-                        nearest_line = self.line_segments[int(nearest_line_indices[i])]
-                        if nearest_line.is_reflective and ray.generation < util.MAX_GENERATIONS:  # if the ray hit a mirror, create child and cast it
-                            ray._generate_child_ray(
-                                ray.direction - (2 * nearest_line._normal * (nearest_line._normal @ ray.direction))
-                            )
-                            ray_queue.append(ray.child_ray)
-                        elif not ignore_checks and nearest_line.is_receiver:  # Charge receiver when a light ray hits it
-                            nearest_line.parent_object.charge += util.LIGHT_INCREMENT
-                            ray.child_ray = None
-                        elif not ignore_checks and nearest_line.is_enemy and self.enemy.status != "aggro":
-                            self.enemy.status = "aggro"
-                            self.enemy.update_geometry_shape()
-                            ray.child_ray = None
-                        else:
-                            ray.child_ray = None
+            weight = 0.0 if util.BEAM_TRACING or util.ADAPTIVE_RAYS else util.NUM_LIGHT_RAYS / len(light_source.light_rays)
+            for light_ray in light_source.light_rays:
+                light_ray.weight = weight
+            self.trace_rays(light_source.light_rays[:], ignore_checks, light_source)
+            if util.ADAPTIVE_RAYS and not util.BEAM_TRACING:
+                self.refine_light_rays(light_source, ignore_checks)
+        if util.BEAM_TRACING and not ignore_checks:
+            self.trace_beams()
+
+    def refine_light_rays(self, light_source: worldobjects.LightSource, ignore_checks: bool) -> int:  # Rays added
+        # Neighboring rays that take different paths get a ray between them, until the paths agree, the rays are
+        # MAX_REFINEMENT_DEPTH halvings apart or MAX_REFINED_RAYS have been added. Every ray then charges the receiver
+        # it ends on with the part of the source it stands for, up to the next ray.
+        positions = light_source.get_ray_positions().tolist()
+        spacing = positions[1] - positions[0] if len(positions) > 1 else 1.0
+        min_spacing = spacing / 2 ** util.MAX_REFINEMENT_DEPTH
+        rays = light_source.light_rays[:]
+        paths = [ray.get_path() for ray in rays]
+        refined_count = 0
+        while refined_count < util.MAX_REFINED_RAYS:
+            splits = [
+                i for i in range(len(rays) - 1)
+                if paths[i] != paths[i + 1] and positions[i + 1] - positions[i] > min_spacing
+            ][:util.MAX_REFINED_RAYS - refined_count]
+            if len(splits) == 0:
+                break
+            new_rays = []
+            for i in splits:
+                if refined_count == len(light_source.refined_rays):
+                    light_source.refined_rays.append(light.LightRay(numpy.zeros(2), numpy.zeros(2)))
+                ray = light_source.refined_rays[refined_count]
+                light_source.aim_light_ray(ray, (positions[i] + positions[i + 1]) / 2)
+                ray.weight = 0.0
+                new_rays.append(ray)
+                refined_count += 1
+            self.trace_rays(new_rays[:], ignore_checks, light_source)
+            for i, ray in reversed(list(zip(splits, new_rays))):
+                positions.insert(i + 1, (positions[i] + positions[i + 1]) / 2)
+                rays.insert(i + 1, ray)
+                paths.insert(i + 1, ray.get_path())
+
+        if ignore_checks:
+            return refined_count
+        positions.append(positions[-1] + spacing)
+        weight = util.NUM_LIGHT_RAYS / len(light_source.light_rays) / spacing
+        for i, path in enumerate(paths):
+            if path[-1].flags & geometry.RECEIVER:
+                self.charge_receiver(path[-1].parent_object, util.LIGHT_INCREMENT * (positions[i + 1] - positions[i]) * weight)
+        return refined_count
+
+    def charge_receiver(self, light_receiver: worldobjects.LightReceiver, charge: float):
+        if self.defer_effects:
+            self.charge_gains[light_receiver] = self.charge_gains.get(light_receiver, 0.0) + charge
+        else:
+            light_receiver.charge += charge
+
+    def alert_enemy(self):
+        if self.defer_effects:
+            self.enemy_alerted = True
+        else:
+            self.apply_effects({}, True)
+
+    def take_effects(self) -> tuple[dict, bool]:
+        # Hands over the effects collected by a deferred raycast and starts collecting anew
+        effects = self.charge_gains, self.enemy_alerted
+        self.charge_gains, self.enemy_alerted = {}, False
+        return effects
+
+    def apply_effects(self, charge_gains: dict, enemy_alerted: bool):
+        for light_receiver, charge in charge_gains.items():
+            light_receiver.charge += charge
+        if enemy_alerted and self.enemy is not None and self.enemy.status != "aggro":
+            self.enemy.status = "aggro"
+            self.enemy.update_geometry_shape()
+
+    def get_polygon_edges(self) -> tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+        # Polygons differ in their number of edges, so the edges are gathered here
+        if len(self.polygons) == 0:
+            return numpy.empty((0, 2)), numpy.empty((0, 2)), numpy.empty((0, 2)), numpy.empty(0, dtype=int)
+        edge_p1, edge_p2 = (numpy.concatenate(edges) for edges in zip(*(polygon.get_edges() for polygon in self.polygons)))
+        edge_normals = numpy.concatenate([polygon.normals for polygon in self.polygons])
+        edge_polygon = numpy.repeat(numpy.arange(len(self.polygons)), [len(polygon.vertices) for polygon in self.polygons])
+        return edge_p1, edge_p2, edge_normals, edge_polygon
+
+    def trace_rays(self, ray_queue: list[light.LightRay], ignore_checks: bool, light_source: worldobjects.LightSource | None = None):
+        # Rays are traced in waves of one generation, the first rays of a light source can be cast through its sweep
+        # World objects keep the packed geometry arrays up to date as they move
+        line_data = self.line_segments.data
+        line_p1, line_p2 = line_data[:, 0:2], line_data[:, 2:4]
+        arc_data = self.arcs.data
+        arc_center, arc_radius, arc_angles = arc_data[:, 0:2], arc_data[:, 2], arc_data[:, 3:5]
+        circle_data = self.circles.data
+        edge_p1, edge_p2, edge_normals, edge_polygon = self.get_polygon_edges()
+
+        first_generation = light_source is not None
+        queue_length = len(ray_queue)
+        while queue_length > 0:
+            ray_origin = numpy.ndarray((queue_length, 2))
+            ray_dir = numpy.ndarray((queue_length, 2))
+            for ray_i in range(queue_length):
+                ray_origin[ray_i], ray_dir[ray_i] = ray_queue[ray_i].origin, ray_queue[ray_i].direction
+
+            # Nearest hit of every ray per kind of geometry: lines, arcs, circles and polygons
+            nearest_distances = numpy.full((4, queue_length), float('inf'))
+            nearest_indices = numpy.zeros((4, queue_length), dtype=int)
+            if first_generation and len(line_data) >= util.VISIBILITY_MIN_SEGMENTS:
+                # The first rays of a source all belong to one family, so they share one sweep. On small levels
+                # testing every segment is cheaper than looking the rays up in it.
+                nearest_distances[0], nearest_indices[0] = self.cast_first_generation(light_source, ray_origin, ray_dir)
+            else:
+                nearest_distances[0], nearest_indices[0] = light.get_line_raycast_results(ray_origin, ray_dir, line_p1, line_p2)
+            first_generation = False
+            if len(self.arcs) > 0:
+                nearest_distances[1], nearest_indices[1] = light.get_arc_raycast_results(
+                    ray_origin[:, 0], ray_origin[:, 1], ray_dir[:, 0], ray_dir[:, 1], arc_center[:, 0], arc_center[:, 1],
+                    arc_radius, arc_angles[:, 0], arc_angles[:, 1])
+            if len(self.circles) > 0:
+                nearest_distances[2], nearest_indices[2] = light.get_circle_raycast_results(
+                    ray_origin, ray_dir, circle_data[:, 0:2], circle_data[:, 2])
+            if len(self.polygons) > 0:
+                nearest_distances[3], nearest_indices[3], nearest_edges = light.get_polygon_raycast_results(
+                    ray_origin, ray_dir, edge_p1, edge_p2, edge_polygon)
+            nearest_kinds = numpy.argmin(nearest_distances, axis=0)  # Ties go to the kind listed first
+            ray_indices = numpy.arange(queue_length)
+            hit_distances = nearest_distances[nearest_kinds, ray_indices]
+            hit_indices = nearest_indices[nearest_kinds, ray_indices]
+            hit_ends = ray_origin + ray_dir * hit_distances[:, None]
+
+            # Analytic normals of curved and polygon surfaces, and the reflections off them, for all rays at once
+            hit_normals = numpy.zeros((queue_length, 2))
+            on_arc, on_circle, on_polygon = nearest_kinds == 1, nearest_kinds == 2, nearest_kinds == 3
+            if on_arc.any():
+                hit_normals[on_arc] = (hit_ends[on_arc] - arc_center[hit_indices[on_arc]]) / arc_radius[hit_indices[on_arc], None]
+            if on_circle.any():
+                hit_normals[on_circle] = (hit_ends[on_circle] - circle_data[hit_indices[on_circle], 0:2]) / circle_data[hit_indices[on_circle], 2:3]
+            if on_polygon.any():
+                hit_normals[on_polygon] = edge_normals[nearest_edges[on_polygon]]
+            reflected_dirs = ray_dir - 2 * hit_normals * numpy.sum(hit_normals * ray_dir, axis=1)[:, None]
+
+            hit_indices = hit_indices.tolist()
+            for i, kind in enumerate(nearest_kinds.tolist()):
+                ray = ray_queue[i]
+                ray._end = hit_ends[i]
+                match kind:
+                    case 0:
+                        nearest = self.line_segments[hit_indices[i]]
+                    case 1:
+                        nearest = self.arcs[hit_indices[i]]
+                    case 2:
+                        nearest = self.circles[hit_indices[i]]
+                    case _:
+                        nearest = self.polygons[hit_indices[i]]
+                ray.hit = nearest
+
+                if nearest.flags & geometry.REFLECTIVE and ray.generation < self.max_generations:  # if the ray hit a mirror, create child and cast it
+                    if kind == 0:
+                        ray._generate_child_ray(geometry.reflect(ray.direction, nearest._normal))
                     else:
-                        ray._end = ray.origin + ray.direction * nearest_arc_distance[i]
-                        nearest_arc = self.arcs[int(nearest_arc_indices[i])]
-                        if nearest_arc.is_refractive and ray.generation < util.MAX_GENERATIONS:  # if the ray hit a lens, create child and cast it
-                            try:
-                                ray._generate_child_ray(nearest_arc.get_refracted_direction(ray))
-                                ray_queue.append(ray.child_ray)
-                            except:
-                                ray.child_ray = None
-                        else:
-                            ray.child_ray = None
-
-                ray_queue = ray_queue[queue_length:]
-                queue_length = len(ray_queue)
-
-    def draw(self):
+                        ray._generate_child_ray(reflected_dirs[i])
+                    ray_queue.append(ray.child_ray)
+                elif nearest.flags & geometry.REFRACTIVE and ray.generation < self.max_generations:  # if the ray hit a lens, create child and cast it
+                    try:
+                        ray._generate_child_ray(geometry.refract(ray.direction, hit_normals[i]))
+                        ray_queue.append(ray.child_ray)
+                    except:
+                        ray.child_ray = None
+                elif not ignore_checks and nearest.flags & geometry.RECEIVER:  # Charge receiver when a light ray hits it
+                    self.charge_receiver(nearest.parent_object, util.LIGHT_INCREMENT * ray.weight)
+                    ray.child_ray = None
+                elif not ignore_checks and nearest.flags & geometry.ENEMY and self.enemy.status != "aggro":
+                    self.alert_enemy()
+                    ray.child_ray = None
+                else:
+                    ray.child_ray = None
+
+            ray_queue = ray_queue[queue_length:]
+            queue_length = len(ray_queue)
+
+    def cast_first_generation(self, light_source: worldobjects.LightSource, ray_origin: numpy.ndarray, ray_dir: numpy.ndarray) -> tuple[numpy.ndarray, numpy.ndarray]:  # distances, line indices
+        # What a source sees of the still line segments is swept once and reused until one of them changes.
+        # The gator, the enemy and animated walls move most frames, so they are tested on their own instead of
+        # starting a new sweep.
+        line_data = self.line_segments.data
+        is_moving = numpy.zeros(len(line_data), dtype=bool)
+        for world_object in self.entity_world_object_list + [wall for wall in self.wall_list if wall.obj_animation is not None]:
+            is_moving[[self.line_segments.get_index(handle) for handle in world_object.geometry_handles]] = True
+        still_data = line_data[~is_moving]
+
+        state = (*light_source.position, light_source.rotation_angle)
+        cached = self.visibility_cache.get(light_source)
+        if cached is None or cached[0] != state or not numpy.array_equal(cached[1], still_data):
+            match light_source:
+                case worldobjects.RadialLightSource():
+                    spread = light_source._angular_spread
+                    sweep = visibility.Visibility(light_source.position, still_data[:, 0:2], still_data[:, 2:4],
+                                                  light_source.rotation_angle - spread / 2,
+                                                  light_source.rotation_angle + spread / 2)
+                case _:
+                    direction = numpy.array([math.cos(light_source.rotation_angle), math.sin(light_source.rotation_angle)])
+                    sweep = visibility.BeamVisibility(light_source.position, direction, light_source.width / 2,
+                                                      still_data[:, 0:2], still_data[:, 2:4])
+            cached = state, still_data, sweep
+            self.visibility_cache[light_source] = cached
+        distances, indices = cached[2].cast(ray_origin, ray_dir)
+        indices = numpy.flatnonzero(~is_moving)[indices]
+
+        if is_moving.any():
+            moving_distances, moving_indices = light.get_line_raycast_results(
+                ray_origin, ray_dir, line_data[is_moving, 0:2], line_data[is_moving, 2:4])
+            closer = moving_distances < distances
+            distances = numpy.where(closer, moving_distances, distances)
+            indices = numpy.where(closer, numpy.flatnonzero(is_moving)[moving_indices], indices)
+        return distances, indices
+
+    def trace_beams(self):
+        # Receivers take the exact share of each source's power that reaches them, worth NUM_LIGHT_RAYS rays in all
+        line_data = self.line_segments.data
+        edge_p1, edge_p2, _, _ = self.get_polygon_edges()
+        tracer = beam_tracing.BeamTracer(line_data[:, 0:2], line_data[:, 2:4], [segment.flags for segment in self.line_segments],
+                                         self.arcs.data, self.circles.data, edge_p1, edge_p2,
+                                         max_generations=self.max_generations)
+        sampled_rays = []
+        for light_source in self.light_source_list:
+            match light_source:
+                case worldobjects.RadialLightSource():
+                    spread = light_source._angular_spread
+                    power, rays = tracer.trace_radial(light_source.position, light_source.rotation_angle - spread / 2,
+                                                      light_source.rotation_angle + spread / 2, len(light_source.light_rays))
+                case _:
+                    direction = numpy.array([math.cos(light_source.rotation_angle), math.sin(light_source.rotation_angle)])
+                    power, rays = tracer.trace_parallel(light_source.position, direction, light_source.width, len(light_source.light_rays))
+            for segment in numpy.flatnonzero(power).tolist():
+                if self.line_segments[segment].flags & geometry.RECEIVER:
+                    self.charge_receiver(self.line_segments[segment].parent_object, util.LIGHT_INCREMENT * util.NUM_LIGHT_RAYS * power[segment])
+            sampled_rays.extend(
+                light.LightRay(origin, direction, generation, share * util.NUM_LIGHT_RAYS)
+                for ray_origin, ray_dir, share, generation in rays
+                for origin, direction in zip(ray_origin.copy(), ray_dir.copy())
+            )
+        # Light that beams could not follow, like into curved mirrors and lenses, is traced as weighted rays
+        self.trace_rays(sampled_rays, False)
+
+    def snapshot(self) -> dict:
+        world_objects = self.wall_list + self.mirror_list + self.curved_mirror_list + self.lens_list + self.prism_list + self.ball_lens_list + self.light_receiver_list + self.light_source_list
+        return {
+            "world_objects": [(wo, wo.position.copy(), wo.rotation_angle) for wo in world_objects],
+            "animations": [(wall.obj_animation, wall.obj_animation.t, wall.obj_animation.dt)
+                           for wall in self.wall_list if wall.obj_animation is not None],
+            "receivers": [(receiver, receiver.charge, [sprite.visible for sprite in receiver._sprite_list])
+                          for receiver in self.light_receiver_list],
+            "gator": self.gator.get_position(),
+            "enemy": (self.enemy, self.enemy.get_position()) if self.enemy is not None else None,
+        }
+
+    def restore(self, state: dict | None = None):
+        # Put every object back in place instead of rebuilding the level from its file
+        if state is None:
+            state = self.initial_state
+        for wo, position, rotation_angle in state["world_objects"]:
+            self.place_world_object(wo, position, rotation_angle)
+        for obj_animation, t, dt in state["animations"]:
+            obj_animation.t, obj_animation.dt = t, dt
+        for receiver, charge, visibilities in state["receivers"]:
+            receiver.charge = charge
+            for sprite, visible in zip(receiver._sprite_list, visibilities):
+                sprite.visible = visible
+        self.gator.reset(state["gator"])
+        if state["enemy"] is not None:
+            self.enemy, enemy_position = state["enemy"]
+            self.enemy.reset(enemy_position)
+
+    def place_world_object(self, wo: worldobjects.WorldObject, position: numpy.ndarray, rotation_angle: float):
+        move_distance = position - wo.position
+        rotate_angle = rotation_angle - wo.rotation_angle
+        if move_distance.any() or rotate_angle != 0:
+            if isinstance(wo, worldobjects.LightSource):
+                wo.move(move_distance, rotate_angle)
+            else:
+                wo.move_if_safe(None, None, move_distance, rotate_angle, ignore_checks=True)
+        wo.position = position.copy()
+        wo.rotation_angle = rotation_angle
+        self.world_object_index.update(wo)
+
+    @staticmethod
+    def get_draw_layer(wo: worldobjects.WorldObject) -> int:
+        # Follows the order of draw, objects on a higher layer are drawn on top
+        match wo:
+            case worldobjects.LightSource():
+                return 0
+            case worldobjects.Wall():
+                return 1
+            case worldobjects.Mirror() | worldobjects.CurvedMirror():
+                return 2
+            case worldobjects.Lens() | worldobjects.Prism() | worldobjects.BallLens():
+                return 3
+            case worldobjects.LightReceiver():
+                return 4
+
+    def draw(self, render_state=None):
+        # Rays and charges come from render_state when the next raycast may already be running, see simulation.py
         self.background_sprite.draw(pixelated=True)
         for light_source in self.light_source_list:
-            light_source.draw()
+            light_source.draw(None if render_state is None else render_state.ray_segments.get(light_source))
         for wall in self.wall_list:
             wall.draw()
         for mirror in self.mirror_list:
             mirror.draw()
-        for lens in self.lens_list:
+        for curved_mirror in self.curved_mirror_list:
+            curved_mirror.draw()
+        for lens in self.lens_list + self.prism_list + self.ball_lens_list:
             lens.draw()
         for light_receiver in self.light_receiver_list:
-            light_receiver.draw()
+            light_receiver.draw(None if render_state is None else render_state.charges.get(light_receiver))
         self.gator.draw()
         if self.enemy is not None:
             self.enemy.draw()
+        if util.DEBUG_GEOMETRY is True:
+            for segment in self.merged_wall_segments:
+                segment.draw(thickness=2)
 
     def check_collisions(self, character: entity.Gator):
-        for wo in self.wall_list + self.mirror_list + self.lens_list + self.light_receiver_list + self.light_source_list:
+        for wo in self.wall_list + self.mirror_list + self.curved_mirror_list + self.lens_list + self.prism_list + self.ball_lens_list + self.light_receiver_list + self.light_source_list:
             if wo.check_collision_with_sprite(character.sprite):
                 return True
         else:
             return False
 
     def add_world_object(self, world_object):
+        self.world_object_index.insert(world_object, self.get_draw_layer(world_object))
         match world_object:
             case worldobjects.Lens():  # Lens
                 self.lens_list.append(world_object)
-                self.arcs.extend(world_object.geometry_segments)
-                return
             case worldobjects.Wall():  # Wall
                 self.wall_list.append(world_object)
             case worldobjects.Mirror():  # Mirror
                 self.mirror_list.append(world_object)
-            case worldobjects.ParallelLightSource():  # Source
+            case worldobjects.CurvedMirror():  # Curved mirror
+                self.curved_mirror_list.append(world_object)
+            case worldobjects.Prism():  # Prism
+                self.prism_list.append(world_object)
+            case worldobjects.BallLens():  # Ball lens
+                self.ball_lens_list.append(world_object)
+            case worldobjects.LightSource():  # Source
                 self.light_source_list.append(world_object)
             case worldobjects.LightReceiver():  # Receiver
                 self.light_receiver_list.append(world_object)
-        self.line_segments.extend(world_object.geometry_segments)
+        self.get_geometry_registry(world_object).attach(world_object)
 
     def remove_world_object(self, world_object):
+        self.world_object_index.remove(world_object)
         match world_object:
             case worldobjects.Lens():  # Lens
                 self.lens_list.remove(world_object)
-                for geometry_segment in world_object.geometry_segments:
-                    self.arcs.remove(geometry_segment)
-                return
             case worldobjects.Wall():  # Wall
                 self.wall_list.remove(world_object)
             case worldobjects.Mirror():  # Mirror
                 self.mirror_list.remove(world_object)
-            case worldobjects.ParallelLightSource():  # Source
+            case worldobjects.CurvedMirror():  # Curved mirror
+                self.curved_mirror_list.remove(world_object)
+            case worldobjects.Prism():  # Prism
+                self.prism_list.remove(world_object)
+            case worldobjects.BallLens():  # Ball lens
+                self.ball_lens_list.remove(world_object)
+            case worldobjects.LightSource():  # Source
                 self.light_source_list.remove(world_object)
+                self.visibility_cache.pop(world_object, None)
             case worldobjects.LightReceiver():  # Receiver
                 self.light_receiver_list.remove(world_object)
-        for geometry_segment in world_object.geometry_segments:
-            self.line_segments.remove(geometry_segment)
+        self.get_geometry_registry(world_object).detach(world_object)
+
+    def get_geometry_registry(self, world_object) -> geometry.GeometryRegistry:
+        match world_object.geometry_segments[0] if len(world_object.geometry_segments) > 0 else None:
+            case geometry.Arc():
+                return self.arcs
+            case geometry.Circle():
+                return self.circles
+            case geometry.Polygon():
+                return self.polygons
+            case _:
+                return self.line_segments
 
     def create_enemy(self, position):
         self.enemy = entity.Enemy(position)
         self.entity_world_object_list.append(self.enemy.world_object)
-        self.line_segments.extend(self.enemy.world_object.geometry_segments)
+        self.line_segments.attach(self.enemy.world_object)
 
     def delete_enemy(self):
-        for geometry_segment in self.enemy.world_object.geometry_segments:
-            self.line_segments.remove(geometry_segment)
+        self.line_segments.detach(self.enemy.world_object)
         self.enemy = None
 
+    def merge_wall_geometry(self):
+        # Static, axis-aligned walls only block light, so the outline of their union stands in for their own geometry.
+        # Rays from outside are stopped by the same wall box, on its edge rather than on the diagonal a lone box has.
+        walls = [wall for wall in self.wall_list
+                 if wall.obj_animation is None and abs(math.sin(2 * wall.rotation_angle)) < 1e-9]
+        if len(walls) == 0:
+            return
+        boxes = []
+        for wall in walls:
+            corners = numpy.array([(line._point1, line._point2) for line in wall.geometry_segments]).reshape(-1, 2)
+            boxes.append((*corners.min(axis=0), *corners.max(axis=0)))
+        boxes = numpy.array(boxes)
+
+        for group in geometry.get_box_groups(boxes):
+            point1, point2 = geometry.get_union_outline(boxes[group])
+            # A lone box is cheaper as its two diagonals than as its four sides
+            if len(point1) >= sum(len(walls[index].geometry_segments) for index in group):
+                continue
+            for index in group:
+                self.line_segments.detach(walls[index])
+                walls[index].geometry_segments = []
+                walls[index].capture_geometry()
+            self.merged_wall_segments.extend(geometry.Line(None, p1, p2) for p1, p2 in zip(point1, point2))
+        self.line_segments.extend(self.merged_wall_segments)
+
     def create_border_walls(self):
-        self.wall_list.append(worldobjects.Wall(
-            numpy.array([util.WALL_SIZE / 2, 720 / 2]),
-            numpy.array([1, 720 / util.WALL_SIZE]),
-            0
-        ))
-        self.wall_list.append(worldobjects.Wall(
-            numpy.array([1280 - util.WALL_SIZE / 2, 720 / 2]),
-            numpy.array([1, 720 / util.WALL_SIZE]),
-            0
-        ))
-        self.wall_list.append(worldobjects.Wall(
-            numpy.array([1280 / 2, util.WALL_SIZE / 2]),
-            numpy.array([1280 / util.WALL_SIZE - 2, 1]),
-            0
-        ))
-        self.wall_list.append(worldobjects.Wall(
-            numpy.array([1280 / 2, 720 - util.WALL_SIZE / 2]),
-            numpy.array([1280 / util.WALL_SIZE - 2, 1]),
-            0
-        ))
-
-
-def load_level(level: dict, walking_volume) -> Level:
+        # Every level gets these, so they are kept apart from the walls that come from the level file
+        self.border_wall_list = [
+            worldobjects.Wall(
+                numpy.array([util.WALL_SIZE / 2, 720 / 2]),
+                numpy.array([1, 720 / util.WALL_SIZE]),
+                0
+            ),
+            worldobjects.Wall(
+                numpy.array([1280 - util.WALL_SIZE / 2, 720 / 2]),
+                numpy.array([1, 720 / util.WALL_SIZE]),
+                0
+            ),
+            worldobjects.Wall(
+                numpy.array([1280 / 2, util.WALL_SIZE / 2]),
+                numpy.array([1280 / util.WALL_SIZE - 2, 1]),
+                0
+            ),
+            worldobjects.Wall(
+                numpy.array([1280 / 2, 720 - util.WALL_SIZE / 2]),
+                numpy.array([1280 / util.WALL_SIZE - 2, 1]),
+                0
+            ),
+        ]
+        self.wall_list.extend(self.border_wall_list)
+
+    def to_dict(self, level_name: str | None = None) -> dict:
+        # Inverse of load_level, every parameter Level.__init__ takes is written back out
+        border_walls = set(map(id, self.border_wall_list))
+        walls = [wall for wall in self.wall_list if id(wall) not in border_walls and wall.obj_animation is None]
+        animated_walls = [wall for wall in self.wall_list if wall.obj_animation is not None]
+        light_source_coordinates = []
+        for light_source in self.light_source_list:
+            match light_source:
+                case worldobjects.RadialLightSource():
+                    light_source_coordinates.append(
+                        [*light_source.position, light_source.rotation_angle, light_source._angular_spread])
+                case _:
+                    light_source_coordinates.append([*light_source.position, light_source.rotation_angle])
+
+        def rows(coordinates) -> list:
+            return [numpy.asarray(row, dtype=float).tolist() for row in coordinates]
+
+        return {
+            "level_name": self.name if level_name is None else level_name,
+            "planet": self.planet,
+            "level_data": {
+                "wall_coordinate_list": rows([*wall.position, *wall.dimensions, wall.rotation_angle] for wall in walls),
+                "mirror_coordinate_list": rows([*wo.position, wo.rotation_angle] for wo in self.mirror_list),
+                "light_receiver_coordinate_list":
+                    rows([*wo.position, wo.rotation_angle] for wo in self.light_receiver_list),
+                "light_source_coordinate_list": rows(light_source_coordinates),
+                "animated_wall_coordinate_list": rows(
+                    [*wall.position, *wall.dimensions, wall.rotation_angle, *wall.animation_parameters[0],
+                     wall.animation_parameters[1], wall.animation_parameters[2]] for wall in animated_walls
+                ),
+                "lens_coordinate_list": rows([*wo.position, wo.rotation_angle] for wo in self.lens_list),
+                "gator_coordinates": self.gator.get_position().astype(float).tolist(),
+                "enemy_coordinates": self.enemy.get_position().astype(float).tolist() if self.enemy is not None else [],
+                "curved_mirror_coordinate_list":
+                    rows([*wo.position, wo.rotation_angle, wo.radius] for wo in self.curved_mirror_list),
+                "prism_coordinate_list":
+                    rows([*wo.position, wo.rotation_angle, wo.side_length] for wo in self.prism_list),
+                "ball_lens_coordinate_list": rows([*wo.position, wo.radius] for wo in self.ball_lens_list),
+            }
+        }
+
+
+def load_level(level: dict, walking_volume, merge_walls=True) -> Level:
     level_data = level["level_data"]
     return Level(
         level_data["wall_coordinate_list"],
@@ -316,12 +720,62 @@ def load_level(level: dict, walking_volume) -> Level:
         level_data["lens_coordinate_list"],
         level_data["gator_coordinates"],
         level_data["enemy_coordinates"],
+        level_data.get("curved_mirror_coordinate_list", []),  # Not in levels made before curved mirrors
+        level_data.get("prism_coordinate_list", []),  # Not in levels made before prisms and ball lenses
+        level_data.get("ball_lens_coordinate_list", []),
         level["level_name"],
         planet=level["planet"],
-        walking_volume=walking_volume
+        walking_volume=walking_volume,
+        merge_walls=merge_walls
     )
 
 
+class LevelLoader:
+    """
+    Parses level files and builds their geometry on a worker thread
+    """
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._pending: dict[tuple[str, bool], Future] = {}
+
+    @staticmethod
+    def _build(filename: str, is_system_level: bool, walking_volume) -> Level:
+        # Sprite lists are lazy, their OpenGL buffers are only created once they are drawn on the main thread. Sprites
+        # only hold textures decoded under util's texture lock, and the gator's audio player is made once it walks.
+        return load_level(util.load_data(filename, True, is_system_level), walking_volume)
+
+    def preload(self, filename: str, is_system_level: bool, walking_volume):
+        key = (filename, is_system_level)
+        if key in self._pending:
+            return
+        # Only keep the level that is about to be needed
+        for future in self._pending.values():
+            future.cancel()
+        self._pending = {key: self._executor.submit(self._build, filename, is_system_level, walking_volume)}
+
+    def get_pending(self, filename: str, is_system_level: bool) -> Future | None:
+        return self._pending.get((filename, is_system_level))
+
+    def submit(self, fn, *args) -> Future:
+        # Other startup work shares the worker, it runs after any level that was queued before it
+        return self._executor.submit(fn, *args)
+
+    def invalidate(self):
+        for future in self._pending.values():
+            future.cancel()
+        self._pending = {}
+
+    def load(self, filename: str, is_system_level: bool, walking_volume) -> Level:
+        future = self._pending.pop((filename, is_system_level), None)
+        if future is not None and not future.cancelled():
+            return future.result()
+        return self._build(filename, is_system_level, walking_volume)
+
+    def shutdown(self):
+        self.invalidate()
+        self._executor.shutdown(cancel_futures=True)
+
 
 class LevelCreator:
     def __init__(self, level):
@@ -338,6 +792,16 @@ class LevelCreator:
         self.queued_type_selection = -1
         self.queued_rotation = 0
 
+        # Edit records reference the world objects themselves, so the history never copies level geometry
+        self.undo_stack: deque[tuple] = deque(maxlen=util.EDIT_HISTORY_LIMIT)
+        self.redo_stack: deque[tuple] = deque(maxlen=util.EDIT_HISTORY_LIMIT)
+        self._picked_up_object: tuple | None = None  # (world object, position, rotation angle) before it was picked up
+        self._picked_up_entity_position: numpy.ndarray | None = None
+
+        # Solvability is checked on a worker process once the edits settle
+        self.solver = level_solver.LevelSolver()
+        self.solver.request()
+
     def get_position(self, mouse_position: numpy.ndarray):
         if self.snap_to_grid:
             grid_pos = numpy.array([
@@ -354,69 +818,78 @@ class LevelCreator:
             return mouse_position
 
     def resize_wall(self, mouse_position, dx, dy):
-        if 1 <= self.wall_dimensions[0]+dx <= 34:
-            self.wall_dimensions[0] += dx
-        else:
-            return
-        if 1 <= self.wall_dimensions[1]+dy <= 20:
-            self.wall_dimensions[1] += dy
-        else:
+        # A new array every time, the previous wall keeps the dimensions array it was built with
+        wall_dimensions = self.wall_dimensions + numpy.array([dx, dy])
+        if not (1 <= wall_dimensions[0] <= 34 and 1 <= wall_dimensions[1] <= 20):
             return
+        self.wall_dimensions = wall_dimensions
+        # A wall always has its two diagonal segments, so the new ones take over the old handles in place
+        resized_wall = worldobjects.Wall(self.get_position(mouse_position), self.wall_dimensions, self.selected_world_object.rotation_angle)
+        self.level.line_segments.transfer(self.selected_world_object, resized_wall)
         self.level.wall_list.remove(self.selected_world_object)
-        for geometry_segment in self.selected_world_object.geometry_segments:
-            self.level.line_segments.remove(geometry_segment)
-        self.selected_world_object = worldobjects.Wall(self.get_position(mouse_position), self.wall_dimensions, self.selected_world_object.rotation_angle)
-        self.level.wall_list.append(self.selected_world_object)
-        self.level.line_segments.extend(self.selected_world_object.geometry_segments)
+        self.level.wall_list.append(resized_wall)
+        self.level.world_object_index.remove(self.selected_world_object)
+        self.level.world_object_index.insert(resized_wall, self.level.get_draw_layer(resized_wall))
+        self.selected_world_object = resized_wall
 
     def on_click(self, mouse_position: numpy.ndarray, button):
         if button == 1:
             if self.selected_entity is None and self.selected_world_object is None:
                 # Check for click on entities
                 if self.level.gator.sprite.collides_with_point(mouse_position):
-                    self.selected_entity = self.level.gator
+                    self.select_entity(self.level.gator)
                     return
                 if self.level.enemy is not None and self.level.enemy.sprite.collides_with_point(mouse_position):
-                    self.selected_entity = self.level.enemy
+                    self.select_entity(self.level.enemy)
                     return
 
-                # Check for click on world objects
-                for wo in self.level.wall_list + self.level.mirror_list + self.level.lens_list + self.level.light_receiver_list + self.level.light_source_list:
-                    if wo.check_collision_with_point(mouse_position):
-                        self.selected_world_object = wo
-                        match self.selected_world_object:
-                            case worldobjects.Wall():  # Wall
-                                self.selected_world_object_list = self.level.wall_list
-                                self.selected_geometry_list = self.level.line_segments
-                            case worldobjects.Mirror():  # Mirror
-                                self.selected_world_object_list = self.level.mirror_list
-                                self.selected_geometry_list = self.level.line_segments
-                            case worldobjects.Lens():  # Lens
-                                self.selected_world_object_list = self.level.lens_list
-                                self.selected_geometry_list = self.level.line_segments
-                            case worldobjects.ParallelLightSource():  # Source
-                                self.selected_world_object_list = self.level.light_source_list
-                                self.selected_geometry_list = self.level.line_segments
-                            case worldobjects.LightReceiver():  # Receiver
-                                self.selected_world_object_list = self.level.light_receiver_list
-                                self.selected_geometry_list = self.level.line_segments
-                        self.wall_dimensions = wo.dimensions if type(wo) == worldobjects.Wall else numpy.ones(2)
-                        return
+                # Check for click on world objects, the topmost one is picked up
+                wo = self.level.world_object_index.query_point(mouse_position)
+                if wo is not None:
+                    self.selected_world_object = wo
+                    self._picked_up_object = (wo, wo.position.copy(), wo.rotation_angle)
+                    match self.selected_world_object:
+                        case worldobjects.Wall():  # Wall
+                            self.selected_world_object_list = self.level.wall_list
+                            self.selected_geometry_list = self.level.line_segments
+                        case worldobjects.Mirror():  # Mirror
+                            self.selected_world_object_list = self.level.mirror_list
+                            self.selected_geometry_list = self.level.line_segments
+                        case worldobjects.CurvedMirror():  # Curved mirror
+                            self.selected_world_object_list = self.level.curved_mirror_list
+                            self.selected_geometry_list = self.level.arcs
+                        case worldobjects.Prism():  # Prism
+                            self.selected_world_object_list = self.level.prism_list
+                            self.selected_geometry_list = self.level.polygons
+                        case worldobjects.BallLens():  # Ball lens
+                            self.selected_world_object_list = self.level.ball_lens_list
+                            self.selected_geometry_list = self.level.circles
+                        case worldobjects.Lens():  # Lens
+                            self.selected_world_object_list = self.level.lens_list
+                            self.selected_geometry_list = self.level.arcs
+                        case worldobjects.LightSource():  # Parallel or radial source
+                            self.selected_world_object_list = self.level.light_source_list
+                            self.selected_geometry_list = self.level.line_segments
+                        case worldobjects.LightReceiver():  # Receiver
+                            self.selected_world_object_list = self.level.light_receiver_list
+                            self.selected_geometry_list = self.level.line_segments
+                    self.wall_dimensions = wo.dimensions if type(wo) == worldobjects.Wall else numpy.ones(2)
+                    return
             else:
-                self.selected_world_object = None
-                self.selected_entity = None
+                self.drop_selection()
 
         if button == 4:
             if self.selected_world_object is not None:
-                self.level.remove_world_object(self.selected_world_object)
-                self.selected_world_object = None
+                self.remove_selected_world_object()
             elif self.selected_entity is not None:
                 if self.selected_entity is self.level.enemy:
-                    self.level.delete_enemy()
-                self.selected_entity = None
+                    self.remove_selected_enemy()
+                else:
+                    self.drop_selection()
 
 
     def update(self, mouse_position):
+        self.solver.update(self.level)
         cursor_position = self.get_position(mouse_position)
 
         # MOVE OBJECT TO MOUSE
@@ -440,69 +913,172 @@ class LevelCreator:
 
         self.queued_rotation = 0
         # GENERATE OBJECT
+        if self.queued_type_selection not in range(1, 10):
+            return
+        if self.selected_world_object is not None:
+            self.remove_selected_world_object()
+        elif self.selected_entity is not None and self.selected_entity is self.level.enemy and self.queued_type_selection != 6:
+            self.remove_selected_enemy()
+        else:
+            self.drop_selection()
+
         match self.queued_type_selection:
             case 6:  # Enemy
-                if self.selected_world_object is not None:
-                    self.level.remove_world_object(self.selected_world_object)
-                    self.selected_world_object = None
                 if not self.enemy_exists:
                     self.enemy_exists = True
                     self.level.create_enemy(cursor_position)
-                self.selected_entity = self.level.enemy
-                self.selected_world_object = None
+                    self.push_edit(("add_enemy", self.level.enemy.get_position()))
+                self.select_entity(self.level.enemy)
                 self.queued_type_selection = -1
                 return
             case 1:  # Wall
-                if self.selected_world_object is not None:
-                    self.level.remove_world_object(self.selected_world_object)
-                elif self.selected_entity is not None and self.selected_entity is self.level.enemy:
-                    self.level.delete_enemy()
                 self.wall_dimensions = numpy.ones(2)
                 self.selected_world_object = worldobjects.Wall(cursor_position, self.wall_dimensions, 0)
             case 2:  # Mirror
-                if self.selected_world_object is not None:
-                    self.level.remove_world_object(self.selected_world_object)
-                elif self.selected_entity is not None and self.selected_entity is self.level.enemy:
-                    self.level.delete_enemy()
                 self.selected_world_object = worldobjects.Mirror(cursor_position, 0)
             case 3:  # Lens
-                if self.selected_world_object is not None:
-                    self.level.remove_world_object(self.selected_world_object)
-                elif self.selected_entity is not None and self.selected_entity is self.level.enemy:
-                    self.level.delete_enemy()
                 self.selected_world_object = worldobjects.Lens(cursor_position, 0)
             case 4:  # Source
-                if self.selected_world_object is not None:
-                    self.level.remove_world_object(self.selected_world_object)
-                elif self.selected_entity is not None and self.selected_entity is self.level.enemy:
-                    self.level.delete_enemy()
                 self.selected_world_object = worldobjects.ParallelLightSource(cursor_position, 0)
             case 5:  # Receiver
-                if self.selected_world_object is not None:
-                    self.level.remove_world_object(self.selected_world_object)
-                elif self.selected_entity is not None and self.selected_entity is self.level.enemy:
-                    self.level.delete_enemy()
                 self.selected_world_object = worldobjects.LightReceiver(cursor_position, 0)
-            case _:  # No Selection
-                return
+            case 7:  # Curved mirror
+                self.selected_world_object = worldobjects.CurvedMirror(cursor_position, 0)
+            case 8:  # Prism
+                self.selected_world_object = worldobjects.Prism(cursor_position, 0)
+            case 9:  # Ball lens
+                self.selected_world_object = worldobjects.BallLens(cursor_position)
         self.level.add_world_object(self.selected_world_object)
-        self.selected_entity = None
+        self._picked_up_object = None  # New objects are only recorded once they are placed
         self.queued_type_selection = -1
 
+    # ========================= Edit History =========================
+    def select_entity(self, selected_entity):
+        self.selected_entity = selected_entity
+        self._picked_up_entity_position = selected_entity.get_position()
+
+    def drop_selection(self):
+        # Record where the carried object or entity ended up
+        wo = self.selected_world_object
+        if wo is not None:
+            self.level.world_object_index.update(wo)
+            placement = (wo.position.copy(), wo.rotation_angle)
+            if self._picked_up_object is None:
+                self.push_edit(("add", wo, placement))
+            else:
+                original, position, rotation_angle = self._picked_up_object
+                if original is not wo:  # Resized walls are new objects
+                    self.push_edit(("replace", original, (position, rotation_angle), wo, placement))
+                elif (position != placement[0]).any() or rotation_angle != placement[1]:
+                    self.push_edit(("move", wo, (position, rotation_angle), placement))
+        elif self.selected_entity is not None:
+            role = "gator" if self.selected_entity is self.level.gator else "enemy"
+            position = self.selected_entity.get_position()
+            if (position != self._picked_up_entity_position).any():
+                self.push_edit(("move_entity", role, self._picked_up_entity_position, position))
+        self.selected_world_object = None
+        self.selected_entity = None
+        self._picked_up_object = None
+        self._picked_up_entity_position = None
+
+    def remove_selected_world_object(self):
+        self.level.remove_world_object(self.selected_world_object)
+        if self._picked_up_object is not None:  # Objects that were never placed leave no trace in the history
+            original, position, rotation_angle = self._picked_up_object
+            self.push_edit(("remove", original, (position, rotation_angle)))
+        self.selected_world_object = None
+        self._picked_up_object = None
+
+    def remove_selected_enemy(self):
+        self.push_edit(("remove_enemy", self._picked_up_entity_position))
+        self.level.delete_enemy()
+        self.enemy_exists = False
+        self.selected_entity = None
+        self._picked_up_entity_position = None
+
+    def push_edit(self, record: tuple):
+        self.undo_stack.append(record)
+        self.redo_stack.clear()
+        self.solver.request()
+
+    def undo(self) -> bool:
+        # Only placed objects are part of the history, so nothing can be carried while it is replayed
+        if not self.undo_stack or self.selected_world_object is not None or self.selected_entity is not None:
+            return False
+        record = self.undo_stack.pop()
+        self._apply_edit(record, reverse=True)
+        self.redo_stack.append(record)
+        self.solver.request()
+        return True
+
+    def redo(self) -> bool:
+        if not self.redo_stack or self.selected_world_object is not None or self.selected_entity is not None:
+            return False
+        record = self.redo_stack.pop()
+        self._apply_edit(record, reverse=False)
+        self.undo_stack.append(record)
+        self.solver.request()
+        return True
+
+    def _add_at(self, wo: worldobjects.WorldObject, placement: tuple[numpy.ndarray, float]):
+        self.level.place_world_object(wo, *placement)
+        self.level.add_world_object(wo)
+
+    def _apply_edit(self, record: tuple, reverse: bool):
+        match record:
+            case ("add", wo, placement):
+                if reverse:
+                    self.level.remove_world_object(wo)
+                else:
+                    self._add_at(wo, placement)
+            case ("remove", wo, placement):
+                if reverse:
+                    self._add_at(wo, placement)
+                else:
+                    self.level.remove_world_object(wo)
+            case ("move", wo, before, after):
+                self.level.place_world_object(wo, *(before if reverse else after))
+            case ("replace", old_wo, old_placement, new_wo, new_placement):
+                if reverse:
+                    self.level.remove_world_object(new_wo)
+                    self._add_at(old_wo, old_placement)
+                else:
+                    self.level.remove_world_object(old_wo)
+                    self._add_at(new_wo, new_placement)
+            case ("move_entity", role, before, after):
+                selected_entity = self.level.gator if role == "gator" else self.level.enemy
+                selected_entity.move_to(before if reverse else after)
+            case ("add_enemy", position) | ("remove_enemy", position):
+                if (record[0] == "add_enemy") == reverse:
+                    self.level.delete_enemy()
+                else:
+                    self.level.create_enemy(position)
+                self.enemy_exists = self.level.enemy is not None
+
+    def draw_overlay(self):
+        result = self.solver.result
+        if self.solver.busy or result is None:
+            text, color = "CHECKING LEVEL...", arcade.color.GRAY
+        elif result["solvable"]:
+            text, color = "SOLVABLE", arcade.color.GREEN
+        elif result["solvable_at_some_phases"]:
+            text, color = "SOLVABLE ONLY WHILE WALLS STAND STILL", arcade.color.ORANGE
+        else:
+            text, color = "NO SOLUTION FOUND", arcade.color.RED
+        if not self.solver.busy and result is not None:
+            text += f"  BEST CHARGE: {min(result['steady_charge'] / util.RECEIVER_THRESHOLD, 9.99):.0%}"
+
+            # Preview of the best light path and the mirror angles that produce it
+            if len(result["segments"]) > 0:
+                arcade.draw_lines(result["segments"].reshape(-1, 2), (255, 255, 0, 40), line_width=2)
+            half_length = 0.5 * util.MIRROR_SPRITE_INFO[1] * util.MIRROR_SPRITE_INFO[3]
+            for mirror, angle in zip(self.level.mirror_list + self.level.curved_mirror_list, result["mirror_angles"]):
+                face = half_length * numpy.array([-math.sin(angle), math.cos(angle)])
+                arcade.draw_line(*(mirror.position - face), *(mirror.position + face), (255, 255, 0, 120), 2)
+
+        arcade.draw_text(text, util.WALL_SIZE + 10, util.WORLD_HEIGHT - util.WALL_SIZE - 10,
+                         color=color, font_size=util.BODY_FONT_SIZE, font_name=util.MENU_FONT, anchor_y="top")
+
     def export_level_as_file(self, level_name: str = "My Level", file_name: str = "my_level.json"):
-        level_obj = {
-            "level_name": level_name,
-            "planet": "moon",
-            "level_data": {
-                "mirror_coordinate_list": [[*wo.position, wo.rotation_angle] for wo in self.level.mirror_list],
-                "wall_coordinate_list": [[*wo.position, *wo.dimensions, wo.rotation_angle] for wo in self.level.wall_list],
-                "light_receiver_coordinate_list": [[*wo.position, wo.rotation_angle] for wo in self.level.light_receiver_list],
-                "light_source_coordinate_list": [[*wo.position, wo.rotation_angle] for wo in self.level.light_source_list],
-                "animated_wall_coordinate_list": [],
-                "lens_coordinate_list": [[*wo.position, wo.rotation_angle] for wo in self.level.lens_list],
-                "gator_coordinates": [self.level.gator.sprite.center_x, self.level.gator.sprite.center_y],
-                "enemy_coordinates":
-                    [self.level.enemy.sprite.center_x, self.level.enemy.sprite.center_y] if self.level.enemy is not None else []
-            }
-        }
-        util.write_data(f'levels/community/{file_name}', level_obj)
+        # A .ilvl file name writes the compact binary format instead of JSON
+        util.write_level(f'levels/community/{file_name}', self.level.to_dict(level_name))
@@ -0,0 +1,91 @@
+import sqlite3
+import threading
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS levels (
+    filename TEXT PRIMARY KEY,
+    date_modified REAL NOT NULL,
+    size INTEGER NOT NULL,
+    level_name TEXT NOT NULL,
+    planet_name TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS levels_by_date ON levels (date_modified DESC, filename);
+CREATE INDEX IF NOT EXISTS levels_by_name ON levels (level_name COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS levels_by_planet ON levels (planet_name);
+"""
+
+
+def _like_pattern(search: str) -> str:
+    escaped = search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+class LevelCatalog:
+    """
+    SQLite-backed catalog of community levels, sorted newest first
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        # The selector prefetches pages from a worker thread, so share one connection behind a lock
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            self._connection.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def get_stats(self, filenames=None) -> dict[str, tuple[float, int]]:
+        # Only the rows of the given files when filenames is given, so a few changed files do not read the whole catalog
+        with self._lock:
+            if filenames is None:
+                rows = self._connection.execute("SELECT filename, date_modified, size FROM levels").fetchall()
+            else:
+                filenames = list(filenames)
+                rows = self._connection.execute(
+                    f"SELECT filename, date_modified, size FROM levels WHERE filename IN ({', '.join('?' * len(filenames))})",
+                    filenames
+                ).fetchall()
+        return {filename: (date_modified, size) for filename, date_modified, size in rows}
+
+    def upsert(self, entries: list[tuple[str, float, int, str, str]]):
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO levels (filename, date_modified, size, level_name, planet_name) "
+                "VALUES (?, ?, ?, ?, ?)",
+                entries
+            )
+
+    def remove(self, filenames: list[str]):
+        with self._lock, self._connection:
+            self._connection.executemany("DELETE FROM levels WHERE filename = ?", [(f,) for f in filenames])
+
+    def count(self, search: str = "") -> int:
+        with self._lock:
+            if search:
+                query = self._connection.execute(
+                    "SELECT COUNT(*) FROM levels WHERE level_name LIKE ? ESCAPE '\\'", (_like_pattern(search),)
+                )
+            else:
+                query = self._connection.execute("SELECT COUNT(*) FROM levels")
+            return query.fetchone()[0]
+
+    def get_page(self, page: int, page_size: int, search: str = "") -> list[tuple[str, str, str]]:
+        offset = (page - 1) * page_size
+        with self._lock:
+            if search:
+                query = self._connection.execute(
+                    "SELECT filename, level_name, planet_name FROM levels WHERE level_name LIKE ? ESCAPE '\\' "
+                    "ORDER BY date_modified DESC, filename LIMIT ? OFFSET ?",
+                    (_like_pattern(search), page_size, offset)
+                )
+            else:
+                query = self._connection.execute(
+                    "SELECT filename, level_name, planet_name FROM levels "
+                    "ORDER BY date_modified DESC, filename LIMIT ? OFFSET ?",
+                    (page_size, offset)
+                )
+            return query.fetchall()
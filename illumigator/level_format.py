@@ -0,0 +1,174 @@
+import json
+import os
+import re
+import struct
+import sys
+
+import numpy
+
+
+# Binary level layout (all little-endian):
+#   MAGIC (8 bytes) | header length (uint32) | JSON header | padding to 8 bytes | packed float64 arrays
+# The JSON header holds the level name, planet and, for every coordinate list, its offset and shape
+# in the data section. Rows of ragged lists (e.g. light sources with and without an angular spread)
+# are padded with NaN and trimmed again on load.
+MAGIC = b"ILVL\x00\x01\x00\x00"
+BINARY_EXTENSION = ".ilvl"
+JSON_EXTENSION = ".json"
+_HEADER_LENGTH = struct.Struct("<I")
+_ALIGNMENT = 8
+_HEADER_FIELD_PATTERN = re.compile(r'"(level_name|planet)"\s*:\s*("(?:[^"\\]|\\.)*")')
+_READ_CHUNK_SIZE = 4096
+
+
+def is_binary_level(path: str) -> bool:
+    return path.endswith(BINARY_EXTENSION)
+
+
+def binary_path_for(json_path: str) -> str:
+    return os.path.splitext(json_path)[0] + BINARY_EXTENSION
+
+
+def _pack_coordinates(coordinates) -> numpy.ndarray:
+    if len(coordinates) == 0:
+        return numpy.zeros((0, 0))
+    if not isinstance(coordinates[0], (list, tuple, numpy.ndarray)):  # Single point (gator/enemy coordinates)
+        return numpy.asarray(coordinates, dtype="<f8")
+    width = max(len(row) for row in coordinates)
+    packed = numpy.full((len(coordinates), width), numpy.nan, dtype="<f8")
+    for i, row in enumerate(coordinates):
+        packed[i, :len(row)] = row
+    return packed
+
+
+def _unpack_coordinates(array: numpy.ndarray):
+    if array.ndim == 1:
+        return array
+    padding = numpy.isnan(array)
+    if not padding.any():  # Rectangular list, rows can be consumed straight from the mapped array
+        return array
+    widths = array.shape[1] - padding.sum(axis=1)
+    return [row[:width] for row, width in zip(array, widths)]
+
+
+def write_binary_level(level: dict, file) -> None:
+    arrays = {key: _pack_coordinates(value) for key, value in level["level_data"].items()}
+    header = {
+        "level_name": level["level_name"],
+        "planet": level["planet"],
+        "arrays": {},
+    }
+    offset = 0
+    for key, array in arrays.items():
+        header["arrays"][key] = [offset, list(array.shape)]
+        offset += array.nbytes
+
+    header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    data_start = len(MAGIC) + _HEADER_LENGTH.size + len(header_bytes)
+    padding = -data_start % _ALIGNMENT
+
+    file.write(MAGIC)
+    file.write(_HEADER_LENGTH.pack(len(header_bytes) + padding))
+    file.write(header_bytes + b" " * padding)
+    for array in arrays.values():
+        file.write(array.tobytes())
+
+
+def write_json_level(level: dict, file) -> None:
+    # Streams one coordinate row per line with the header fields first, which is what _read_json_header expects
+    # and far cheaper than json.dump with an indent putting every number on its own line
+    file.write("{\n")
+    file.write(f'  "level_name": {json.dumps(level["level_name"], ensure_ascii=False)},\n')
+    file.write(f'  "planet": {json.dumps(level["planet"], ensure_ascii=False)},\n')
+    file.write('  "level_data": {')
+    for index, (key, coordinates) in enumerate(level["level_data"].items()):
+        file.write(",\n" if index > 0 else "\n")
+        file.write(f"    {json.dumps(key)}: ")
+        if len(coordinates) == 0 or not isinstance(coordinates[0], (list, tuple, numpy.ndarray)):
+            file.write(json.dumps(numpy.asarray(coordinates, dtype=float).tolist()))
+            continue
+        file.write("[")
+        for row_index, row in enumerate(coordinates):
+            file.write(",\n      " if row_index > 0 else "\n      ")
+            file.write(json.dumps(numpy.asarray(row, dtype=float).tolist()))
+        file.write("\n    ]")
+    file.write("\n  }\n}\n")
+
+
+def _read_header(file) -> tuple[dict, int]:
+    if file.read(len(MAGIC)) != MAGIC:
+        raise ValueError(f"{getattr(file, 'name', file)} is not a binary IllumiGator level")
+    (header_length,) = _HEADER_LENGTH.unpack(file.read(_HEADER_LENGTH.size))
+    header = json.loads(file.read(header_length).decode("utf-8"))
+    return header, len(MAGIC) + _HEADER_LENGTH.size + header_length
+
+
+def load_binary_level(path: str) -> dict:
+    with open(path, "rb") as file:
+        header, data_start = _read_header(file)
+
+    level_data = {}
+    if os.path.getsize(path) > data_start:
+        data = numpy.memmap(path, dtype="<f8", mode="r", offset=data_start).view(numpy.ndarray)
+    else:  # Nothing but empty lists, mmap refuses zero-length maps
+        data = numpy.zeros(0)
+    for key, (offset, shape) in header["arrays"].items():
+        start = offset // data.itemsize
+        size = int(numpy.prod(shape))
+        level_data[key] = _unpack_coordinates(data[start:start + size].reshape(shape))
+
+    return {
+        "level_name": header["level_name"],
+        "planet": header["planet"],
+        "level_data": level_data,
+    }
+
+
+def _read_json_header(path: str) -> dict:
+    # Read only up to the coordinate lists when the header fields come first (as every exported level does)
+    prefix = ""
+    with open(path) as file:
+        while '"level_data"' not in prefix:
+            chunk = file.read(_READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            prefix += chunk
+    header = {}
+    for match in _HEADER_FIELD_PATTERN.finditer(prefix.split('"level_data"', 1)[0]):
+        header.setdefault(match.group(1), json.loads(match.group(2)))
+    if "level_name" not in header or "planet" not in header:
+        with open(path) as file:
+            level = json.load(file)
+        header = {"level_name": level["level_name"], "planet": level["planet"]}
+    return header
+
+
+def read_level_header(path: str) -> dict:
+    if is_binary_level(path):
+        with open(path, "rb") as file:
+            header, _ = _read_header(file)
+        return {"level_name": header["level_name"], "planet": header["planet"]}
+    return _read_json_header(path)
+
+
+def convert_level(json_path: str, binary_path: str | None = None) -> str:
+    if binary_path is None:
+        binary_path = binary_path_for(json_path)
+    with open(json_path) as file:
+        level = json.load(file)
+    with open(binary_path, "wb") as file:
+        write_binary_level(level, file)
+    return binary_path
+
+
+def main(argv: list[str] | None = None) -> None:
+    paths = sys.argv[1:] if argv is None else argv
+    if len(paths) == 0:
+        print("usage: illumigator-compile-level LEVEL.json [LEVEL.json ...]")
+        return
+    for path in paths:
+        print(f"{path} -> {convert_level(path)}")
+
+
+if __name__ == "__main__":
+    main()
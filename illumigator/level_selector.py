@@ -1,87 +1,125 @@
+import math
+from concurrent.futures import Future, ThreadPoolExecutor
+
 import arcade
 
 from illumigator import util
 
 
+PAGE_SIZE = 15
+COLUMNS = 5
+
+
 class LevelSelector:
-    def __init__(self, selection=0, is_community=False):
+    def __init__(self, selection=0, is_community=False, catalog_sync: Future | None = None):
         self._selection = selection
         self.is_community = is_community
         self.title = "COMMUNITY LEVELS" if is_community else "OFFICIAL LEVELS"
-
-        if is_community:
+        self.search = ""
+        self.searching = False
+
+        # Page metadata is fetched on a worker thread so neighboring pages are ready before they are needed
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._page_cache: dict[tuple[int, str], tuple[int, list, list]] = {}
+        self._prefetches: dict[tuple[int, str], Future] = {}
+
+        # The community catalog is synced in the background at startup, it only has to be finished here
+        if is_community and catalog_sync is not None:
+            catalog_sync.result()
+        elif is_community:
             util.update_community_metadata()
-            metadata = util.get_level_metadata(is_community=True)
-        else:
-            metadata = util.get_level_metadata()
-
-        self.page_count = metadata[0]
-        self.levels = metadata[1]
-        self.filenames = metadata[2]
 
+        self.page_count = 1
+        self.levels = []
+        self.filenames = []
+        self.level_names = []
         self.current_page = 1
 
-        self.level_names = []
-        self.planet_filenames = []
-        self.planets = []
         self.keys = []
         self.key_text = [("ESC", "RETURN TO MENU"), ("ENTER", "LOAD UP LEVEL")]
         if is_community:
             self.key_text.append(("R", "REFRESH LEVELS"))
             self.key_text.append(("F", "OPEN FOLDER"))
+            self.key_text.append(("TAB", "SEARCH"))
 
         for index in range(0, len(self.key_text)):
             starting_point = 50
             self.keys.append(util.load_sprite("key.png",
                              1,
-                             center_x=starting_point + index * util.WORLD_WIDTH // 4,
+                             center_x=starting_point + index * util.WORLD_WIDTH // len(self.key_text),
                              center_y=util.WORLD_HEIGHT - 120))
 
-        for i in range(0, len(self.levels)):
-            self.level_names.append(self.levels[i]["level_name"])
-
-        for i in range(0, len(self.levels)):
-            self.planet_filenames.append(self.levels[i]["planet_name"] + ".png")
-
-        for index in range(0, len(self.levels)):
-            column = index % 5
-            row = index // 5
+        # Fixed pool of tiles, only their textures and labels change between pages
+        self.planets = arcade.SpriteList()
+        self.labels = []
+        for index in range(PAGE_SIZE):
+            column = index % COLUMNS
+            row = index // COLUMNS
             y_start_point = util.WORLD_HEIGHT - util.WORLD_HEIGHT // 4 - 96
-            self.planets.append(util.load_sprite(
-                self.planet_filenames[index],
+            planet = util.load_sprite(
+                "moon.png",
                 scale=2,
-                center_x=column * util.WORLD_WIDTH // 5 + 96,
-                center_y=y_start_point - row * util.WORLD_HEIGHT // 4))
+                center_x=column * util.WORLD_WIDTH // COLUMNS + 96,
+                center_y=y_start_point - row * util.WORLD_HEIGHT // 4)
+            planet.visible = False
+            self.planets.append(planet)
+            self.labels.append(arcade.Text("",
+                                           planet.center_x,
+                                           planet.center_y + 64,
+                                           font_size=util.BODY_FONT_SIZE,
+                                           font_name=util.MENU_FONT,
+                                           anchor_x="center"))
+
+        self.update()
+
+    def _fetch_page(self, page: int, search: str) -> tuple[int, list, list]:
+        metadata = util.get_level_metadata(PAGE_SIZE, page, self.is_community, search)
+        for level in metadata[1]:
+            util.load_texture(level["planet_name"] + ".png")
+        return metadata
+
+    def _get_page(self, page: int) -> tuple[int, list, list]:
+        key = (page, self.search)
+        if key not in self._page_cache:
+            future = self._prefetches.pop(key, None)
+            self._page_cache[key] = future.result() if future is not None else self._fetch_page(page, self.search)
+        return self._page_cache[key]
+
+    def _prefetch_page(self, page: int):
+        key = (page, self.search)
+        if 1 <= page <= self.page_count and key not in self._page_cache and key not in self._prefetches:
+            self._prefetches[key] = self._executor.submit(self._fetch_page, page, self.search)
+
+    def shutdown(self):
+        # Called when the selector is discarded, queued prefetches are dropped and a running one is not waited on
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._prefetches.clear()
+
+    def refresh(self, rescan=True):
+        if self.is_community and rescan:
+            util.update_community_metadata()
+        self._page_cache.clear()
+        self._prefetches.clear()
+        self.update()
 
     def update(self):
-        self.level_names = []
-        self.planets = []
-        self.planet_filenames = []
-        self.filenames = []
-
-        if self.is_community:
-            metadata = util.get_level_metadata(page=self.current_page, is_community=True)
-        else:
-            metadata = util.get_level_metadata(page=self.current_page)
-
-        self.levels = metadata[1]
-        self.filenames = metadata[2]
-
-        for i in range(0, len(self.levels)):
-            self.level_names.append(self.levels[i]["level_name"])
-
-        for i in range(0, len(self.levels)):
-            self.planet_filenames.append(self.levels[i]["planet_name"] + ".png")
+        level_count, self.levels, self.filenames = self._get_page(self.current_page)
+        self.page_count = max(math.ceil(level_count / PAGE_SIZE), 1)
+        self.level_names = [level["level_name"] for level in self.levels]
+        self._selection = min(self._selection, max(len(self.levels) - 1, 0))
+
+        for index, planet in enumerate(self.planets):
+            if index < len(self.levels):
+                planet.texture = util.load_texture(self.levels[index]["planet_name"] + ".png")
+                planet.visible = True
+                name = self.level_names[index]
+                self.labels[index].text = name if len(name) < 9 else name[:8] + "..."
+            else:
+                planet.visible = False
+                self.labels[index].text = ""
 
-        for index in range(0, len(self.levels)):
-            column = index % 5
-            row = index // 5
-            y_start_point = util.WORLD_HEIGHT - util.WORLD_HEIGHT // 4 - 96
-            self.planets.append(util.load_sprite(
-                self.planet_filenames[index],
-                scale=2,
-                center_x=column * util.WORLD_WIDTH // 5 + 96,
-                center_y=y_start_point - row * util.WORLD_HEIGHT // 4))
+        self._prefetch_page(self.current_page + 1)
+        self._prefetch_page(self.current_page - 1)
 
     def draw(self):
         arcade.draw_text(self.title,
@@ -94,6 +132,17 @@ class LevelSelector:
                          font_name=util.MENU_FONT
                          )
 
+        if self.searching or self.search:
+            arcade.draw_text("SEARCH: " + self.search + ("_" if self.searching else ""),
+                             util.WORLD_WIDTH // 2,
+                             util.WORLD_HEIGHT - util.H3_FONT_SIZE - 40,
+                             font_size=util.BODY_FONT_SIZE,
+                             anchor_x="center",
+                             anchor_y="top",
+                             color=arcade.color.YELLOW if self.searching else arcade.color.GRAY,
+                             font_name=util.MENU_FONT
+                             )
+
         for index, key in enumerate(self.keys):
             key.draw(pixelated=True)
             arcade.draw_text(self.key_text[index][0],
@@ -113,20 +162,11 @@ class LevelSelector:
                              font_name=util.MENU_FONT,
                              font_size=util.BODY_FONT_SIZE)
 
-        for index, name in enumerate(self.level_names):
-            color = arcade.color.WHITE
-            if index == self.selection:
-                color = arcade.color.RED
-            arcade.draw_text(name if len(name) < 9 else name[:8] + "...",
-                             self.planets[index].center_x,
-                             self.planets[index].center_y + 64,
-                             font_size=util.BODY_FONT_SIZE,
-                             font_name=util.MENU_FONT,
-                             color=color,
-                             anchor_x="center")
+        for index in range(len(self.levels)):
+            self.labels[index].color = arcade.color.RED if index == self.selection else arcade.color.WHITE
+            self.labels[index].draw()
 
-        for planet in self.planets:
-            planet.draw(pixelated=True)
+        self.planets.draw(pixelated=True)
 
     @property
     def selection(self):
@@ -134,22 +174,28 @@ class LevelSelector:
 
     @selection.setter
     def selection(self, selection):
-        if selection > 14:
+        if selection > PAGE_SIZE - 1:
             if self.current_page < self.page_count:
                 self.current_page += 1
                 self.selection = 0
                 self.update()
             else:
-                self._selection = 14
+                self._selection = min(PAGE_SIZE, len(self.levels)) - 1
         elif selection < 0:
             if self.current_page > 1:
                 self.current_page -= 1
                 self.update()
-                self.selection = 14
+                self.selection = PAGE_SIZE - 1
             else:
                 self._selection = 0
         else:
             self._selection = selection if selection < len(self.levels) - 1 else len(self.levels) - 1
 
+    def set_search(self, search: str):
+        self.search = search
+        self.current_page = 1
+        self._selection = 0
+        self.update()
+
     def get_selection(self) -> str:
         return self.filenames[self.selection]
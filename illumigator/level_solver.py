@@ -0,0 +1,427 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy
+
+from illumigator import geometry, light, util, worldobjects
+
+
+# Set in the worker process, bumped by the editor whenever a newer level state makes the running search pointless
+_generation = None
+
+
+def _init_worker(generation):
+    global _generation
+    _generation = generation
+
+
+def extract_state(level) -> dict:
+    # Everything the search needs as plain arrays, the worker never builds sprites or world objects
+    receiver_indices = {id(receiver): i for i, receiver in enumerate(level.light_receiver_list)}
+    # Flat and curved mirrors can both be turned by the player
+    mirrors = level.mirror_list + level.curved_mirror_list
+    mirror_indices = {id(mirror): i for i, mirror in enumerate(mirrors)}
+    animated_walls = [wall for wall in level.wall_list if wall.obj_animation is not None]
+    animation_indices = {id(wall): i for i, wall in enumerate(animated_walls)}
+    lines = list(level.line_segments)
+    arcs = list(level.arcs)
+    circles = list(level.circles)
+    edge_p1, edge_p2, edge_normals, edge_polygon = level.get_polygon_edges()
+    edge_flags = numpy.array([polygon.flags for polygon in level.polygons], dtype=int)[edge_polygon]
+    rays = [ray for light_source in level.light_source_list for ray in light_source.light_rays]
+    return {
+        "line_p1": numpy.array([line._point1 for line in lines], dtype=float).reshape(-1, 2),
+        "line_p2": numpy.array([line._point2 for line in lines], dtype=float).reshape(-1, 2),
+        "line_reflective": numpy.array([line.is_reflective for line in lines], dtype=bool),
+        "line_receiver": numpy.array([receiver_indices.get(id(line.parent_object), -1) if line.is_receiver else -1
+                                      for line in lines], dtype=int),
+        "line_mirror": numpy.array([mirror_indices.get(id(line.parent_object), -1) for line in lines], dtype=int),
+        "line_animation": numpy.array([animation_indices.get(id(line.parent_object), -1) for line in lines], dtype=int),
+        # Current position and angle, both ends of the travel, then the point of travel and its change per frame,
+        # per animated wall
+        "animations": numpy.array([
+            [*wall.position, wall.rotation_angle, *wall.obj_animation.endpoint1, *wall.obj_animation.endpoint2,
+             wall.obj_animation.angle1, wall.obj_animation.angle2, wall.obj_animation.t, wall.obj_animation.dt]
+            for wall in animated_walls
+        ], dtype=float).reshape(-1, 11),
+        "arc_center": numpy.array([arc.center for arc in arcs], dtype=float).reshape(-1, 2),
+        "arc_radius": numpy.array([arc.radius for arc in arcs], dtype=float),
+        "arc_angles": numpy.array([(arc._start_angle, arc._end_angle) for arc in arcs], dtype=float).reshape(-1, 2),
+        "arc_reflective": numpy.array([arc.is_reflective for arc in arcs], dtype=bool),
+        "arc_refractive": numpy.array([arc.is_refractive for arc in arcs], dtype=bool),
+        "arc_mirror": numpy.array([mirror_indices.get(id(arc.parent_object), -1) for arc in arcs], dtype=int),
+        "circle_center": numpy.array([circle.center for circle in circles], dtype=float).reshape(-1, 2),
+        "circle_radius": numpy.array([circle.radius for circle in circles], dtype=float),
+        "circle_reflective": numpy.array([circle.is_reflective for circle in circles], dtype=bool),
+        "circle_refractive": numpy.array([circle.is_refractive for circle in circles], dtype=bool),
+        # Polygons as their edges, with the outward normal and the flags of the polygon each edge belongs to
+        "edge_p1": edge_p1,
+        "edge_p2": edge_p2,
+        "edge_normals": edge_normals,
+        "edge_reflective": edge_flags & geometry.REFLECTIVE != 0,
+        "edge_refractive": edge_flags & geometry.REFRACTIVE != 0,
+        "mirror_positions": numpy.array([mirror.position for mirror in mirrors], dtype=float).reshape(-1, 2),
+        "mirror_angles": numpy.array([mirror.rotation_angle for mirror in mirrors], dtype=float),
+        "mirror_curved": numpy.array([isinstance(mirror, worldobjects.CurvedMirror) for mirror in mirrors], dtype=bool),
+        "ray_origin": numpy.array([ray.origin for ray in rays], dtype=float).reshape(-1, 2),
+        "ray_dir": numpy.array([ray.direction for ray in rays], dtype=float).reshape(-1, 2),
+        "receiver_count": len(level.light_receiver_list),
+        "receiver_positions": numpy.array([receiver.position for receiver in level.light_receiver_list],
+                                          dtype=float).reshape(-1, 2),
+        "lens_positions": numpy.array([lens.position for lens in level.lens_list], dtype=float).reshape(-1, 2),
+    }
+
+
+def _rotate_points(points: numpy.ndarray, centers: numpy.ndarray, angles: numpy.ndarray) -> numpy.ndarray:
+    cosine, sine = numpy.cos(angles), numpy.sin(angles)
+    relative = points - centers
+    return numpy.stack((
+        relative[:, 0] * cosine - relative[:, 1] * sine,
+        relative[:, 0] * sine + relative[:, 1] * cosine,
+    ), axis=1) + centers
+
+
+def _refract(directions, normals) -> numpy.ndarray:
+    # Vectorized geometry.refract, NaN where the game would drop the ray
+    dot_products = numpy.sum(normals * directions, axis=1)
+    crosses = directions[:, 0] * normals[:, 1] - directions[:, 1] * normals[:, 0]
+    with numpy.errstate(invalid="ignore"):
+        entering = dot_products < 0
+        angles = numpy.where(
+            entering,
+            (numpy.pi - numpy.arccos(dot_products)) / util.INDEX_OF_REFRACTION,
+            (numpy.pi - numpy.arccos(-dot_products)) * util.INDEX_OF_REFRACTION,
+        )
+    angles = numpy.where((entering & (crosses < 0)) | (~entering & (crosses > 0)), -angles, angles)
+    cosine, sine = numpy.cos(angles), numpy.sin(angles)
+    rotated = numpy.stack((
+        normals[:, 0] * cosine - normals[:, 1] * sine,
+        normals[:, 0] * sine + normals[:, 1] * cosine,
+    ), axis=1)
+    return numpy.where(entering[:, None], -rotated, rotated)
+
+
+def _get_phases(state: dict, frames: numpy.ndarray) -> numpy.ndarray:
+    # Point of travel of every animated wall after each number of frames, walls bounce between both ends
+    animations = state["animations"]
+    travel = numpy.mod(animations[:, 9] + numpy.outer(frames, animations[:, 10]), 2)
+    return numpy.where(travel > 1, 2 - travel, travel)
+
+
+def trace(state: dict, mirror_angles: numpy.ndarray, phases: numpy.ndarray | None = None) \
+        -> tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+    # Same propagation rules as Level.raycast. Returns the hits per receiver, the traced segments and, for every
+    # mirror, the average point and direction of the light hitting it and the first ray generation that got
+    # there as [x, y, dx, dy, generation] (NaN for mirrors left in the dark)
+    line_p1, line_p2 = state["line_p1"], state["line_p2"]
+    line_mirror = state["line_mirror"]
+    in_mirror = line_mirror >= 0
+    if in_mirror.any():
+        line_p1, line_p2 = line_p1.copy(), line_p2.copy()
+        centers = state["mirror_positions"][line_mirror[in_mirror]]
+        rotations = (mirror_angles - state["mirror_angles"])[line_mirror[in_mirror]]
+        line_p1[in_mirror] = _rotate_points(line_p1[in_mirror], centers, rotations)
+        line_p2[in_mirror] = _rotate_points(line_p2[in_mirror], centers, rotations)
+    line_animation = state["line_animation"]
+    animated = line_animation >= 0
+    if phases is not None and animated.any():  # Move animated walls to the given points of their travel
+        line_p1, line_p2 = line_p1.copy(), line_p2.copy()
+        animations = state["animations"][line_animation[animated]]
+        phase = phases[line_animation[animated]]
+        centers = animations[:, 0:2]
+        offsets = animations[:, 3:5] + phase[:, None] * (animations[:, 5:7] - animations[:, 3:5]) - centers
+        rotations = animations[:, 7] + phase * (animations[:, 8] - animations[:, 7]) - animations[:, 2]
+        line_p1[animated] = _rotate_points(line_p1[animated], centers, rotations) + offsets
+        line_p2[animated] = _rotate_points(line_p2[animated], centers, rotations) + offsets
+    normals = numpy.stack((line_p1[:, 1] - line_p2[:, 1], line_p2[:, 0] - line_p1[:, 0]), axis=1)
+    normals /= numpy.maximum(numpy.linalg.norm(normals, axis=1), 1e-12)[:, None]
+
+    arc_center, arc_angles = state["arc_center"], state["arc_angles"]
+    arc_mirror = state["arc_mirror"]
+    arc_in_mirror = arc_mirror >= 0
+    if arc_in_mirror.any():  # Curved mirrors turn around their position like flat ones
+        arc_center, arc_angles = arc_center.copy(), arc_angles.copy()
+        rotations = (mirror_angles - state["mirror_angles"])[arc_mirror[arc_in_mirror]]
+        arc_center[arc_in_mirror] = _rotate_points(
+            arc_center[arc_in_mirror], state["mirror_positions"][arc_mirror[arc_in_mirror]], rotations)
+        # Kept within (-PI, PI] like WorldObject.update_geometry does
+        arc_angles[arc_in_mirror] = numpy.pi - (numpy.pi - arc_angles[arc_in_mirror] - rotations[:, None]) % (2 * numpy.pi)
+    circle_center, edge_p1, edge_p2 = state["circle_center"], state["edge_p1"], state["edge_p2"]
+    # Flags of the surfaces other than lines, in the order of the kinds after lines: arcs, circles, polygon edges
+    surface_reflective = numpy.concatenate((state["arc_reflective"], state["circle_reflective"], state["edge_reflective"]))
+    surface_refractive = numpy.concatenate((state["arc_refractive"], state["circle_refractive"],
+                                            state["edge_refractive"]))
+    surface_offsets = numpy.cumsum((0, len(arc_center), len(circle_center)))
+    hits = numpy.zeros(state["receiver_count"], dtype=int)
+    mirror_light = numpy.zeros((len(mirror_angles), 4))
+    mirror_rays = numpy.zeros(len(mirror_angles))
+    mirror_generations = numpy.full(len(mirror_angles), numpy.inf)
+    segments = []
+    origins, directions = state["ray_origin"], state["ray_dir"]
+    generation = 0
+    while len(origins) > 0 and len(line_p1) > 0:
+        # Nearest hit per kind of geometry like Level.trace_rays, ties go to the kind listed first
+        kind_distances = numpy.full((4, len(origins)), numpy.inf)
+        kind_indices = numpy.zeros((4, len(origins)), dtype=int)
+        kind_distances[0], kind_indices[0] = light.get_line_raycast_results(origins, directions, line_p1, line_p2)
+        if len(arc_center) > 0:
+            kind_distances[1], kind_indices[1] = light.get_arc_raycast_results(
+                origins[:, 0], origins[:, 1], directions[:, 0], directions[:, 1], arc_center[:, 0], arc_center[:, 1],
+                state["arc_radius"], arc_angles[:, 0], arc_angles[:, 1])
+        if len(circle_center) > 0:
+            kind_distances[2], kind_indices[2] = light.get_circle_raycast_results(
+                origins, directions, circle_center, state["circle_radius"])
+        if len(edge_p1) > 0:
+            kind_distances[3], kind_indices[3] = light.get_line_raycast_results(origins, directions, edge_p1, edge_p2)
+        kinds = numpy.argmin(kind_distances, axis=0)
+        ray_indices = numpy.arange(len(origins))
+        distances = kind_distances[kinds, ray_indices]
+        line_indices = kind_indices[0]
+        hits_line = kinds == 0
+        hit_anything = numpy.isfinite(distances)
+        ends = origins + directions * numpy.where(hit_anything, distances, util.MAX_RAY_DISTANCE)[:, None]
+        segments.append(numpy.hstack((origins, ends)))
+
+        can_continue = hit_anything & (generation < util.MAX_GENERATIONS)
+        reflected = can_continue & hits_line & state["line_reflective"][line_indices]
+        received = hit_anything & hits_line & ~state["line_reflective"][line_indices] \
+            & (state["line_receiver"][line_indices] >= 0)
+        numpy.add.at(hits, state["line_receiver"][line_indices[received]], 1)
+        # Light on the back or the edges of a mirror counts too, turning the mirror could still catch it
+        hit_mirrors = numpy.where(hits_line, line_mirror[line_indices], -1)
+        if len(arc_center) > 0:
+            hit_mirrors = numpy.where(kinds == 1, arc_mirror[kind_indices[1]], hit_mirrors)
+        reaches_mirror = hit_anything & (hit_mirrors >= 0)
+        lit_mirrors = hit_mirrors[reaches_mirror]
+        numpy.add.at(mirror_light, lit_mirrors, numpy.hstack((ends[reaches_mirror], directions[reaches_mirror])))
+        numpy.add.at(mirror_rays, lit_mirrors, 1)
+        mirror_generations[lit_mirrors] = numpy.minimum(mirror_generations[lit_mirrors], generation)
+
+        # Arcs, circles and polygons have their normal at the hit point, they reflect before they refract
+        on_surface = can_continue & ~hits_line
+        surface_indices = surface_offsets[numpy.maximum(kinds, 1) - 1] + kind_indices[kinds, ray_indices]
+        surface_normals = numpy.zeros((len(origins), 2))
+        for kind, centers, radii in ((1, arc_center, state["arc_radius"]), (2, circle_center, state["circle_radius"])):
+            on_kind = on_surface & (kinds == kind)
+            surface_normals[on_kind] = (ends[on_kind] - centers[kind_indices[kind, on_kind]]) \
+                / radii[kind_indices[kind, on_kind], None]
+        on_edge = on_surface & (kinds == 3)
+        surface_normals[on_edge] = state["edge_normals"][kind_indices[3, on_edge]]
+        if len(surface_reflective) > 0:
+            surface_reflected = on_surface & surface_reflective[numpy.where(on_surface, surface_indices, 0)]
+            refracted = on_surface & ~surface_reflected & surface_refractive[numpy.where(on_surface, surface_indices, 0)]
+        else:
+            surface_reflected = refracted = numpy.zeros_like(hits_line)
+
+        reflected_normals = numpy.vstack((normals[line_indices[reflected]], surface_normals[surface_reflected]))
+        incoming = numpy.vstack((directions[reflected], directions[surface_reflected]))
+        reflected_directions = incoming - 2 * reflected_normals \
+            * numpy.sum(reflected_normals * incoming, axis=1)[:, None]
+        refracted_directions = _refract(directions[refracted], surface_normals[refracted])
+        valid = ~numpy.isnan(refracted_directions).any(axis=1)
+
+        directions = numpy.vstack((reflected_directions, refracted_directions[valid]))
+        origins = numpy.vstack((ends[reflected], ends[surface_reflected], ends[refracted][valid])) + directions * 0.001
+        generation += 1
+
+    with numpy.errstate(invalid="ignore"):
+        mirror_light /= mirror_rays[:, None]
+    mirror_light = numpy.hstack((mirror_light, numpy.where(mirror_rays > 0, mirror_generations, numpy.nan)[:, None]))
+    return hits, numpy.vstack(segments) if segments else numpy.zeros((0, 4)), mirror_light
+
+
+def _distance_to_receivers(segments: numpy.ndarray, receiver_positions: numpy.ndarray) -> float:
+    if len(segments) == 0 or len(receiver_positions) == 0:
+        return float("inf")
+    starts, offsets = segments[:, :2], segments[:, 2:] - segments[:, :2]
+    relative = receiver_positions[:, None, :] - starts[None, :, :]
+    lengths_squared = numpy.maximum(numpy.sum(offsets * offsets, axis=1), 1e-12)
+    t = numpy.clip(numpy.sum(relative * offsets, axis=2) / lengths_squared, 0, 1)
+    return float(numpy.min(numpy.linalg.norm(relative - t[:, :, None] * offsets, axis=2)))
+
+
+def _score(state: dict, hits: numpy.ndarray, segments: numpy.ndarray, mirror_light: numpy.ndarray) -> tuple:
+    # The fullest receiver decides the win. Chains of mirrors only pay off once the last one is aimed, so
+    # getting light onto more mirrors and closer to a receiver also counts as progress
+    return (
+        int(hits.max()) if len(hits) > 0 else 0,
+        int(hits.sum()),
+        int((~numpy.isnan(mirror_light[:, 0])).sum()),
+        -_distance_to_receivers(segments, state["receiver_positions"]),
+    )
+
+
+def _aim_angles(state: dict, mirror_index: int, mirror_light: numpy.ndarray) -> numpy.ndarray:
+    # Mirror angles that send the light reaching this mirror straight at another mirror, a lens or a receiver
+    hit_point, incoming = mirror_light[mirror_index, :2], mirror_light[mirror_index, 2:4]
+    if numpy.isnan(hit_point).any():
+        return numpy.zeros(0)
+    targets = numpy.vstack((
+        numpy.delete(state["mirror_positions"], mirror_index, axis=0),
+        state["lens_positions"],
+        state["receiver_positions"],
+    ))
+    outgoing = targets - hit_point
+    outgoing /= numpy.maximum(numpy.linalg.norm(outgoing, axis=1), 1e-12)[:, None]
+    normals = outgoing - incoming / max(numpy.linalg.norm(incoming), 1e-12)
+    return numpy.arctan2(normals[:, 1], normals[:, 0])  # The reflective faces are perpendicular to the mirror angle
+
+
+def _evaluate(state: dict, mirror_angles: numpy.ndarray) -> tuple:
+    # Animated walls are sampled at a few frames and the best one counts, so the search also follows light that
+    # only gets through while a wall is out of the way. solve checks the result over the whole travel afterwards.
+    if len(state["animations"]) == 0:
+        sampled_phases = [None]
+    else:
+        sampled_phases = _get_phases(state, numpy.linspace(0, util.SOLVER_CHECK_FRAMES, util.SOLVER_ANIMATION_PHASES))
+    best = None
+    for phases in sampled_phases:
+        hits, segments, mirror_light = trace(state, mirror_angles, phases)
+        score = _score(state, hits, segments, mirror_light)
+        if best is None or score > best[0]:
+            best = (score, hits, segments, mirror_light)
+    return best
+
+
+def _get_peak_charge(state: dict, mirror_angles: numpy.ndarray, generation: int) -> float | None:
+    # Charge of the fullest receiver as the game builds it up from nothing while the animated walls move. Every
+    # frame the charge decays and gains LIGHT_INCREMENT per hit, hits are taken as constant over each stride.
+    if len(state["animations"]) == 0:
+        hits, _, _ = trace(state, mirror_angles)
+        return (int(hits.max()) if len(hits) > 0 else 0) * util.LIGHT_INCREMENT / (1 - util.CHARGE_DECAY)
+    decay = util.CHARGE_DECAY ** util.SOLVER_CHECK_STRIDE
+    gain = util.LIGHT_INCREMENT * (1 - decay) / (1 - util.CHARGE_DECAY)
+    charges = numpy.zeros(state["receiver_count"])
+    peak_charge = 0.0
+    for phases in _get_phases(state, numpy.arange(0, util.SOLVER_CHECK_FRAMES, util.SOLVER_CHECK_STRIDE)):
+        if _is_stale(generation):
+            return None
+        hits, _, _ = trace(state, mirror_angles, phases)
+        charges = charges * decay + hits * gain
+        peak_charge = max(peak_charge, float(charges.max()) if len(charges) > 0 else 0.0)
+    return peak_charge
+
+
+def _is_stale(generation: int) -> bool:
+    return _generation is not None and _generation.value != generation
+
+
+def _aim_chains(state: dict, generation: int) -> tuple | None:
+    # Beam search that follows the light: the first lit mirror that has not been aimed yet is pointed at every
+    # possible target in turn, keeping the most promising configurations for the next mirror down the chain
+    mirror_angles = state["mirror_angles"].copy()
+    score, hits, segments, mirror_light = _evaluate(state, mirror_angles)
+    beam = [(score, mirror_angles, frozenset(), hits, segments, mirror_light)]
+    for _ in range(len(mirror_angles)):
+        expansions = []
+        for entry in beam:
+            score, angles, aimed, _, _, light_reached = entry
+            lit = [m for m in range(len(angles)) if m not in aimed and not numpy.isnan(light_reached[m, 0])]
+            if not lit:
+                expansions.append(entry)
+                continue
+            mirror_index = min(lit, key=lambda m: light_reached[m, 4])
+            for angle in numpy.append(_aim_angles(state, mirror_index, light_reached), angles[mirror_index]):
+                if _is_stale(generation):
+                    return None
+                trial_angles = angles.copy()
+                trial_angles[mirror_index] = angle
+                score, hits, segments, trial_light = _evaluate(state, trial_angles)
+                expansions.append((score, trial_angles, aimed | {mirror_index}, hits, segments, trial_light))
+        expansions.sort(key=lambda expansion: expansion[0], reverse=True)
+        beam = expansions[:util.SOLVER_BEAM_WIDTH]
+    return beam[0]
+
+
+def solve(state: dict, generation: int) -> dict | None:
+    best = _aim_chains(state, generation)
+    if best is None:
+        return None
+    best_score, mirror_angles, _, best_hits, best_segments, best_light = best
+
+    # Then coordinate descent over the mirror angles to polish the chain (the player can only rotate mirrors)
+    angle_step = numpy.pi / util.SOLVER_ANGLE_STEPS
+    coarse_angles = numpy.arange(util.SOLVER_ANGLE_STEPS) * angle_step  # Flat mirrors reflect the same on both sides
+    curved_coarse_angles = numpy.arange(2 * util.SOLVER_ANGLE_STEPS) * angle_step
+    for _ in range(util.SOLVER_MAX_PASSES):
+        improved = False
+        for mirror_index in range(len(mirror_angles)):
+            # Aimed and coarse angles first, then a finer sweep around the best angle found so far
+            coarse = curved_coarse_angles if state["mirror_curved"][mirror_index] else coarse_angles
+            for candidate_angles in (_aim_angles(state, mirror_index, best_light), coarse, None):
+                if candidate_angles is None:
+                    candidate_angles = mirror_angles[mirror_index] + numpy.linspace(-angle_step, angle_step, 9)
+                for angle in candidate_angles:
+                    if _is_stale(generation):
+                        return None
+                    trial_angles = mirror_angles.copy()
+                    trial_angles[mirror_index] = angle
+                    score, hits, segments, light_reached = _evaluate(state, trial_angles)
+                    if score > best_score:
+                        mirror_angles, best_hits, best_segments, best_light = trial_angles, hits, segments, light_reached
+                        best_score = score
+                        improved = True
+        if not improved:
+            break
+
+    # The search took the best frame of the animated walls, what counts is the charge reached while they move.
+    # At a fixed frame the charge would settle at hits * increment / (1 - decay).
+    steady_charge = _get_peak_charge(state, mirror_angles, generation)
+    if steady_charge is None:
+        return None
+    charge_rate = best_score[0] * util.LIGHT_INCREMENT
+    best_phase_charge = charge_rate / (1 - util.CHARGE_DECAY)
+    return {
+        "generation": generation,
+        "solvable": state["receiver_count"] > 0 and steady_charge >= util.RECEIVER_THRESHOLD,
+        # Would be solvable if the animated walls stopped at the best frame found, but not while they move
+        "solvable_at_some_phases": state["receiver_count"] > 0 and best_phase_charge >= util.RECEIVER_THRESHOLD,
+        "charge_rate": charge_rate,
+        "steady_charge": steady_charge,
+        "mirror_angles": mirror_angles,
+        "segments": best_segments,
+    }
+
+
+class LevelSolver:
+    """
+    Checks whether the level being edited can be won, on a worker process so the editor never waits for it
+    """
+
+    def __init__(self):
+        context = multiprocessing.get_context("spawn")
+        self._generation = context.Value("i", 0)
+        self._executor = ProcessPoolExecutor(
+            max_workers=1, mp_context=context, initializer=_init_worker, initargs=(self._generation,)
+        )
+        self._future = None
+        self._requested_at: float | None = None
+        self.result: dict | None = None
+
+    @property
+    def busy(self) -> bool:
+        return self._requested_at is not None or self._future is not None
+
+    def request(self):
+        # Called after every edit, the search only starts once the edits have settled
+        self._requested_at = time.monotonic()
+        with self._generation.get_lock():
+            self._generation.value += 1
+
+    def update(self, level):
+        if self._requested_at is not None and time.monotonic() - self._requested_at >= util.SOLVER_DEBOUNCE_TIME:
+            self._requested_at = None
+            self._future = self._executor.submit(solve, extract_state(level), self._generation.value)
+
+        if self._future is not None and self._future.done():
+            future, self._future = self._future, None
+            if future.cancelled() or future.exception() is not None:
+                self.result = None
+            elif future.result() is not None and future.result()["generation"] == self._generation.value:
+                self.result = future.result()
+
+    def shutdown(self):
+        with self._generation.get_lock():
+            self._generation.value += 1
+        self._executor.shutdown(cancel_futures=True)  # The running search sees the new generation and stops
@@ -0,0 +1,117 @@
+import ctypes
+import ctypes.util
+import os
+import struct
+import sys
+import time
+
+
+# inotify constants from <sys/inotify.h>
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ISDIR = 0x40000000
+_IN_NONBLOCK = os.O_NONBLOCK
+_IN_CLOEXEC = os.O_CLOEXEC if hasattr(os, "O_CLOEXEC") else 0
+# Files are only reported once they are complete (closed after writing or renamed into place), never mid-write
+_WATCH_MASK = _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_DELETE | _IN_DELETE_SELF | _IN_MOVE_SELF
+_EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, name length
+_READ_SIZE = 64 * 1024
+
+POLL_INTERVAL = 1.0  # Seconds between directory scans when inotify is not available
+
+
+class _InotifyBackend:
+    def __init__(self, path: str):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+        if libc.inotify_add_watch(self._fd, os.fsencode(path), _WATCH_MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(errno, os.strerror(errno), path)
+
+    def close(self):
+        os.close(self._fd)
+
+    def poll(self) -> set[str] | None:
+        changed = set()
+        while True:
+            try:
+                buffer = os.read(self._fd, _READ_SIZE)
+            except BlockingIOError:
+                return changed
+            offset = 0
+            while offset < len(buffer):
+                _, mask, _, length = _EVENT_HEADER.unpack_from(buffer, offset)
+                offset += _EVENT_HEADER.size
+                name = buffer[offset:offset + length].rstrip(b"\0")
+                offset += length
+                if mask & (_IN_Q_OVERFLOW | _IN_DELETE_SELF | _IN_MOVE_SELF | _IN_IGNORED):
+                    return None  # Events were lost or the directory itself went away
+                if name and not mask & _IN_ISDIR:
+                    changed.add(os.fsdecode(name))
+
+
+class _PollingBackend:
+    def __init__(self, path: str, interval: float):
+        self.path = path
+        self.interval = interval
+        self._next_scan = time.monotonic() + interval
+        self._stats = self._scan()
+
+    def close(self):
+        pass
+
+    def _scan(self) -> dict[str, tuple[int, int]]:
+        stats = {}
+        try:
+            with os.scandir(self.path) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        stats[entry.name] = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            pass
+        return stats
+
+    def poll(self) -> set[str] | None:
+        now = time.monotonic()
+        if now < self._next_scan:
+            return set()
+        self._next_scan = now + self.interval
+        stats = self._scan()
+        changed = {name for name, stat in stats.items() if self._stats.get(name) != stat}
+        changed.update(name for name in self._stats if name not in stats)
+        self._stats = stats
+        return changed
+
+
+class LevelWatcher:
+    """
+    Reports files that were added, changed or removed in a level directory without rescanning it every frame
+    """
+
+    def __init__(self, path: str, poll_interval: float = POLL_INTERVAL):
+        self.path = path
+        self.backend = None
+        if sys.platform.startswith("linux"):
+            try:
+                self.backend = _InotifyBackend(path)
+            except (OSError, AttributeError):  # No inotify in this libc or the watch limit was reached
+                self.backend = None
+        if self.backend is None:
+            self.backend = _PollingBackend(path, poll_interval)
+
+    def close(self):
+        self.backend.close()
+
+    def poll(self) -> set[str] | None:
+        # Returns the names of changed files, or None when changes may have been missed and a full rescan is needed
+        return self.backend.poll()
@@ -3,12 +3,16 @@ import numpy
 
 
 class LightRay:
-    def __init__(self, origin, direction, generation=0):
+    __slots__ = ("origin", "direction", "_end", "child_ray", "generation", "weight", "hit")
+
+    def __init__(self, origin, direction, generation=0, weight=1.0):
         self.origin = origin
         self.direction = direction
         self._end = numpy.zeros(2)
         self.child_ray: LightRay | None = None
         self.generation = generation
+        self.weight = weight  # How many rays of a light source worth of power this ray carries
+        self.hit = None  # Geometry the ray ended on, set when it is traced
 
     def _generate_child_ray(self, direction):
         if self.child_ray is None:
@@ -16,10 +20,21 @@ class LightRay:
                 self._end + direction * 0.001,
                 direction,
                 generation=self.generation + 1,
+                weight=self.weight,
             )
         else:
             self.child_ray.origin = self._end + direction * 0.001
             self.child_ray.direction = direction
+            self.child_ray.weight = self.weight
+
+    def get_path(self) -> tuple:
+        # Geometry hit by this ray and then by each of its children
+        path = []
+        ray = self
+        while ray is not None:
+            path.append(ray.hit)
+            ray = ray.child_ray
+        return tuple(path)
 
     def draw(self, alpha):
         color = (255, 255, 255, alpha)
@@ -72,10 +87,8 @@ def get_arc_raycast_results(ray_ori_x, ray_ori_y, ray_dir_x, ray_dir_y, arc_x, a
         ((nabla >= 0) & (point1_dst_x*ray_dir_x + point1_dst_y*ray_dir_y >= 0)).T &
         (
             ((arc_angle1 < point1_rel_angle) & (point1_rel_angle < arc_angle2)) | (
-                (arc_angle2 < arc_angle1) & (
-                    ((0 <= arc_angle1) & (arc_angle1 <= point1_rel_angle)) |
-                    ((point1_rel_angle <= arc_angle2) & (arc_angle2 <= 0))
-                )
+                # Arcs across the negative x axis wrap around, they cover everything past either end angle
+                (arc_angle2 < arc_angle1) & ((arc_angle1 <= point1_rel_angle) | (point1_rel_angle <= arc_angle2))
             )
         ),
         numpy.sqrt(point1_dst_x*point1_dst_x + point1_dst_y*point1_dst_y).T,
@@ -93,10 +106,7 @@ def get_arc_raycast_results(ray_ori_x, ray_ori_y, ray_dir_x, ray_dir_y, arc_x, a
         ((nabla >= 0) & (point2_dst_x*ray_dir_x + point2_dst_y*ray_dir_y >= 0)).T &
         (
             ((arc_angle1 < point2_rel_angle) & (point2_rel_angle < arc_angle2)) | (
-                (arc_angle2 < arc_angle1) & (
-                    ((0 <= arc_angle1) & (arc_angle1 <= point2_rel_angle)) |
-                    ((point2_rel_angle <= arc_angle2) & (arc_angle2 <= 0))
-                )
+                (arc_angle2 < arc_angle1) & ((arc_angle1 <= point2_rel_angle) | (point2_rel_angle <= arc_angle2))
             )
         ),
         numpy.sqrt(point2_dst_x*point2_dst_x + point2_dst_y*point2_dst_y).T,
@@ -110,3 +120,23 @@ def get_arc_raycast_results(ray_ori_x, ray_ori_y, ray_dir_x, ray_dir_y, arc_x, a
         [intersection_distance1, intersection_arc_index1],
         [intersection_distance2, intersection_arc_index2]
     )
+
+def get_circle_raycast_results(ray_origin, ray_dir, circle_center, circle_radius) -> tuple[numpy.ndarray, numpy.ndarray]:  # distances, circle indices
+    # Nearest t >= 0 with |origin + t * dir - center| = radius, rays starting inside a circle hit it on the way out
+    offset_x = numpy.subtract.outer(ray_origin[:, 0], circle_center[:, 0])
+    offset_y = numpy.subtract.outer(ray_origin[:, 1], circle_center[:, 1])
+    a = (ray_dir[:, 0] * ray_dir[:, 0] + ray_dir[:, 1] * ray_dir[:, 1])[:, None]
+    b = offset_x * ray_dir[:, 0:1] + offset_y * ray_dir[:, 1:2]
+    c = offset_x * offset_x + offset_y * offset_y - circle_radius * circle_radius
+    discriminant = b * b - a * c
+    root = numpy.sqrt(numpy.maximum(discriminant, 0))
+
+    t = numpy.where(-b - root >= 0, -b - root, -b + root) / a
+    t[(discriminant < 0) | (t < 0)] = float('inf')
+
+    return numpy.min(t, axis=1), numpy.argmin(t, axis=1)
+
+def get_polygon_raycast_results(ray_origin, ray_dir, edge_p1, edge_p2, edge_polygon) -> tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:  # distances, polygon indices, edge indices
+    # A polygon is hit where the ray first crosses one of its edges, the edge gives the normal at the hit
+    distances, edge_indices = get_line_raycast_results(ray_origin, ray_dir, edge_p1, edge_p2)
+    return distances, edge_polygon[edge_indices], edge_indices
@@ -1,19 +1,26 @@
+import argparse
+import functools
+import os
 import time
+from concurrent.futures import Future
+
+_IMPORT_START = time.perf_counter()  # Taken before the heavy imports so --profile-startup can report them
 
 import arcade
 import numpy
 
-from illumigator import level, menus, util, level_selector, worldobjects
+from illumigator import level, menus, util, level_selector, level_watcher, worldobjects, simulation
 
 
 class GameObject(arcade.Window):
-    def __init__(self):
+    def __init__(self, startup_profile: util.StartupProfile | None = None, watcher: level_watcher.LevelWatcher | None = None):
+        self.startup_profile = startup_profile
+        self.level_watcher = watcher
         super().__init__(util.WORLD_WIDTH, util.WORLD_HEIGHT, util.WINDOW_TITLE, resizable=True, antialiasing=True)
         self.set_mouse_visible(False)
-        self.current_level: level.Level | None = None
+        self._current_level: level.Level | None = None
         self.current_level_creator: level.LevelCreator | None = None
         self.menu_sound = None
-        self.background_music = None
         self.menu_music = None
         self.menu_player = None
         self.bgm_player = None
@@ -22,19 +29,10 @@ class GameObject(arcade.Window):
         # ========================= Window =========================
         arcade.set_background_color(arcade.color.BLACK)
         self.set_update_rate(1 / util.FRAME_RATE)
+        self.mark_startup_phase("window")
 
         # ========================= Menus =========================
         self.main_menu = None
-        self.win_menu = None
-        self.lose_menu = None
-        self.options_menu = None
-        self.game_menu = None
-        self.controls_menu = None
-        self.audio_menu = None
-        self.official_selector_menu = None
-        self.community_selector_menu = None
-        self.final_win_menu = None
-        self.community_win_menu = None
 
         # ========================= Settings =========================
         self.settings = util.load_data("config.json")
@@ -44,46 +42,153 @@ class GameObject(arcade.Window):
 
         # ========================= State =========================
         self.game_state = None
-        self.official_level_count = util.load_data("levels.json", True, True)["level_count"]
+        self.official_level_count = util.load_data(util.SYSTEM_LEVEL_INDEX)["level_count"]
         self.official_level_index = self.settings["current_level"]
         self.current_level_path = "level_" + str(self.official_level_index) + ".json"
         self.official_level_status = True
+        self.level_loader = level.LevelLoader()
+        self.current_level_source: tuple[str, bool] | None = None
+        self.previous_level: level.Level | None = None
+        self.previous_level_source: tuple[str, bool] | None = None
+        self.level_transition_timer = 0
+        self.texture_preload = None
+        self.community_sync: Future | None = None
+        self.level_selectors: dict[bool, level_selector.LevelSelector] = {}  # By whether they list community levels
+        self.simulation = simulation.Simulation() if util.SIMULATION_THREAD else None
+        self.mark_startup_phase("settings")
 
     def setup(self):
+        # Only what the main menu needs is loaded here, everything else is built in the background or on first use
         self.game_state = "menu"
-        self.current_level = level.load_level(util.load_data(self.current_level_path, True), self.effects_volume * self.master_volume)
+
+        # ========================= Background Work =========================
+        self.load_current_level()
+        self.track_startup_task("first level", self.level_loader.get_pending(*self.current_level_source))
+        self.texture_preload = self.level_loader.submit(util.preload_textures)
+        self.track_startup_task("texture decoding", self.texture_preload)
+        self.community_sync = self.level_loader.submit(util.update_community_metadata)
+        self.track_startup_task("community catalog", self.community_sync)
 
         # ========================= Sounds =========================
         self.menu_sound = util.load_sound("retro_blip.wav")
-        self.background_music = util.load_sound("ocean-of-ice.wav", streaming=True)
         self.menu_music = util.load_sound("Hina_Fallen_leaves.wav", streaming=True)
+        self.mark_startup_phase("menu sounds")
 
         # ========================= Fonts =========================
         arcade.text_pyglet.load_font(util.ENVIRON_ASSETS_PATH + "PressStart2P-Regular.ttf")
+        self.mark_startup_phase("fonts")
 
         # ========================= Menus =========================
         self.main_menu = menus.MainMenu()
-        self.game_menu = menus.GenericMenu("PAUSED", ("RESUME", "RESTART", "OPTIONS", "QUIT TO MENU"), overlay=True)
-        self.win_menu = menus.GenericMenu("LEVEL COMPLETED", ("CONTINUE", "RETRY", "QUIT TO MENU"))
-        self.final_win_menu = menus.GenericMenu("YOU WIN", ("RETRY", "QUIT TO MENU"))
-        self.lose_menu = menus.GenericMenu("YOU DIED", ("RETRY", "QUIT TO MENU"))
-        self.options_menu = menus.GenericMenu("OPTIONS", ("RETURN", "CONTROLS", "AUDIO", "FULLSCREEN"))
-        self.controls_menu = menus.ControlsMenu()
-        self.audio_menu = menus.AudioMenu(("MASTER", "MUSIC", "EFFECTS"),
-                                          (self.master_volume, self.music_volume, self.effects_volume))
-        self.official_selector_menu = level_selector.LevelSelector()
-        self.community_selector_menu = level_selector.LevelSelector(is_community=True)
-        self.community_win_menu = menus.GenericMenu("YOU WIN", ("RETRY", "QUIT TO MENU"))
+        self.mark_startup_phase("main menu")
+
+    def mark_startup_phase(self, phase: str):
+        if self.startup_profile is not None:
+            self.startup_profile.mark(phase)
+
+    def track_startup_task(self, name: str, future):
+        if self.startup_profile is not None and future is not None:
+            self.startup_profile.track(name, future)
+
+    @property
+    def current_level(self) -> level.Level:
+        if self._current_level is None and self.current_level_source is not None:
+            walking_volume = self.effects_volume * self.master_volume
+            self._current_level = self.level_loader.load(*self.current_level_source, walking_volume)
+            self.level_loader.preload(self.next_level_path(), self.official_level_status, walking_volume)
+        return self._current_level
+
+    @current_level.setter
+    def current_level(self, current_level: level.Level):
+        self._current_level = current_level
+
+    # ========================= Lazily Built Assets =========================
+    @functools.cached_property
+    def background_music(self) -> arcade.Sound:
+        return util.load_sound("ocean-of-ice.wav", streaming=True)
+
+    @functools.cached_property
+    def game_menu(self) -> menus.GenericMenu:
+        return menus.GenericMenu("PAUSED", ("RESUME", "RESTART", "OPTIONS", "QUIT TO MENU"), overlay=True)
+
+    @functools.cached_property
+    def win_menu(self) -> menus.GenericMenu:
+        return menus.GenericMenu("LEVEL COMPLETED", ("CONTINUE", "RETRY", "QUIT TO MENU"))
+
+    @functools.cached_property
+    def final_win_menu(self) -> menus.GenericMenu:
+        return menus.GenericMenu("YOU WIN", ("RETRY", "QUIT TO MENU"))
+
+    @functools.cached_property
+    def lose_menu(self) -> menus.GenericMenu:
+        return menus.GenericMenu("YOU DIED", ("RETRY", "QUIT TO MENU"))
+
+    @functools.cached_property
+    def options_menu(self) -> menus.GenericMenu:
+        return menus.GenericMenu("OPTIONS", ("RETURN", "CONTROLS", "AUDIO", "FULLSCREEN"))
+
+    @functools.cached_property
+    def controls_menu(self) -> menus.ControlsMenu:
+        return menus.ControlsMenu()
+
+    @functools.cached_property
+    def audio_menu(self) -> menus.AudioMenu:
+        return menus.AudioMenu(("MASTER", "MUSIC", "EFFECTS"),
+                               (self.master_volume, self.music_volume, self.effects_volume))
+
+    def get_level_selector(self, is_community: bool) -> level_selector.LevelSelector:
+        # Selectors are made on first use and kept in level_selectors, so on_close knows which ones to shut down
+        if is_community not in self.level_selectors:
+            self.level_selectors[is_community] = level_selector.LevelSelector(
+                is_community=is_community, catalog_sync=self.community_sync if is_community else None)
+        return self.level_selectors[is_community]
+
+    @property
+    def official_selector_menu(self) -> level_selector.LevelSelector:
+        return self.get_level_selector(False)
+
+    @property
+    def community_selector_menu(self) -> level_selector.LevelSelector:
+        return self.get_level_selector(True)
+
+    @functools.cached_property
+    def community_win_menu(self) -> menus.GenericMenu:
+        return menus.GenericMenu("YOU WIN", ("RETRY", "QUIT TO MENU"))
 
     def on_update(self, delta_time):
+        if self.texture_preload is not None and self.texture_preload.done():
+            util.pack_textures(self.texture_preload.result(), self.ctx.default_atlas)
+            self.texture_preload = None
+            self.mark_startup_phase("texture atlas")
+        # The profile waits for the atlas as well as the background tasks, the atlas is packed on the main thread
+        if self.startup_profile is not None and not self.startup_profile.reported and self.texture_preload is None \
+                and self.startup_profile.is_complete():
+            self.startup_profile.report()
+
+        if self.level_watcher is not None:
+            self.apply_level_changes(self.level_watcher.poll())
+
         # STATE MACHINE FOR UPDATING LEVEL
         if self.game_state == "game":
-            self.current_level.update(self.effects_volume*self.master_volume)
+            if self.simulation is not None:
+                self.simulation.step(self.current_level, self.effects_volume*self.master_volume)
+            else:
+                self.current_level.update(self.effects_volume*self.master_volume)
             if self.current_level.gator.status == "dead":
                 self.game_state = "game_over"
 
-            if any(light_receiver.charge >= util.RECEIVER_THRESHOLD for light_receiver in self.current_level.light_receiver_list):
-                time.sleep(0.5)
+            if self.simulation is not None:
+                charges = self.simulation.get_charges(self.current_level).values()
+            else:
+                charges = [light_receiver.charge for light_receiver in self.current_level.light_receiver_list]
+            if any(charge >= util.RECEIVER_THRESHOLD for charge in charges):
+                # Hold the exploded planet on screen for a moment while the next level finishes loading
+                self.level_transition_timer = util.LEVEL_TRANSITION_DELAY
+                self.game_state = "level_transition"
+
+        elif self.game_state == "level_transition":
+            self.level_transition_timer -= delta_time
+            if self.level_transition_timer <= 0:
                 if not self.official_level_status:
                     self.game_state = "community_win"
                     self.official_level_status = False
@@ -97,10 +202,7 @@ class GameObject(arcade.Window):
                     self.current_level_path = "level_" + str(self.official_level_index) + ".json"
                     self.game_state = "win"
 
-                self.current_level = level.load_level(
-                    util.load_data(self.current_level_path, True, self.official_level_status),
-                    self.effects_volume * self.master_volume
-                )
+                self.load_current_level()
 
         elif self.game_state == "level_creator":
             self.current_level_creator.update(self.mouse_position)
@@ -133,18 +235,24 @@ class GameObject(arcade.Window):
 
     def on_draw(self):
         self.clear()
+        if self.startup_profile is not None:
+            self.startup_profile.mark_first_frame()
 
         if self.game_state == "menu":
             self.main_menu.draw()
 
         elif self.game_state == "game":
-            self.current_level.draw()
+            self.draw_current_level()
 
         elif self.game_state == "level_creator":
             self.current_level_creator.level.draw()
+            self.current_level_creator.draw_overlay()
+
+        elif self.game_state == "level_transition":
+            self.draw_current_level()
 
         elif self.game_state == "paused":
-            self.current_level.draw()
+            self.draw_current_level()
             self.game_menu.draw()
 
         elif self.game_state == "win":
@@ -180,6 +288,12 @@ class GameObject(arcade.Window):
         elif self.game_state == "community_win":
             self.community_win_menu.draw()
 
+    def draw_current_level(self):
+        if self.simulation is not None:
+            self.simulation.draw(self.current_level)
+        else:
+            self.current_level.draw()
+
     def on_key_press(self, key, key_modifiers):
         if key == arcade.key.G:
             util.DEBUG_GEOMETRY = not util.DEBUG_GEOMETRY
@@ -236,7 +350,7 @@ class GameObject(arcade.Window):
                 self.set_mouse_visible(False)
                 self.game_state = "menu"
 
-            if key in [arcade.key.KEY_1, arcade.key.KEY_2, arcade.key.KEY_3, arcade.key.KEY_4, arcade.key.KEY_5, arcade.key.KEY_6]:
+            if key in [arcade.key.KEY_1, arcade.key.KEY_2, arcade.key.KEY_3, arcade.key.KEY_4, arcade.key.KEY_5, arcade.key.KEY_6, arcade.key.KEY_7, arcade.key.KEY_8, arcade.key.KEY_9]:
                 level_creator.queued_type_selection = key-48  # To be generated in on_update
 
             if type(level_creator.selected_world_object) == worldobjects.Wall:
@@ -249,6 +363,12 @@ class GameObject(arcade.Window):
                 if key == arcade.key.D or key == arcade.key.RIGHT:
                     level_creator.resize_wall(self.mouse_position, 1, 0)
 
+            if key_modifiers & arcade.key.MOD_CTRL:
+                if key == arcade.key.Z and not key_modifiers & arcade.key.MOD_SHIFT:
+                    level_creator.undo()
+                elif key == arcade.key.Y or key == arcade.key.Z:
+                    level_creator.redo()
+
             if key == arcade.key.Q:
                 level_creator.queued_rotation = 1
             if key == arcade.key.E:
@@ -258,12 +378,10 @@ class GameObject(arcade.Window):
                 self.current_level_path = "my_level.json"
                 self.official_level_status = False
                 level_creator.export_level_as_file(level_name="My Level", file_name=self.current_level_path)
+                self.level_loader.invalidate()  # A preloaded copy of the old file may still be waiting
 
                 self.set_mouse_visible(False)
-                self.current_level = level.load_level(
-                    util.load_data(self.current_level_path, True, self.official_level_status),
-                    walking_volume=self.effects_volume * self.master_volume
-                )
+                self.load_current_level()
                 self.game_state = "menu"
 
 
@@ -371,20 +489,31 @@ class GameObject(arcade.Window):
                 self.audio_menu.increment_selection()
 
         if self.game_state == "community_level_select" or self.game_state == "official_level_select":
-            level_selector_menu = {"community_level_select": self.community_selector_menu,
-                                   "official_level_select": self.official_selector_menu}
+            # Only touch the selector that is on screen, the other one may not have been built yet
+            level_selector_menu = self.community_selector_menu if self.game_state == "community_level_select" \
+                else self.official_selector_menu
+
+            if level_selector_menu.searching:
+                if key == arcade.key.BACKSPACE:
+                    search = level_selector_menu.search
+                    level_selector_menu.set_search(search[:-1])
+                if key in [arcade.key.ENTER, arcade.key.TAB, arcade.key.ESCAPE]:
+                    level_selector_menu.searching = False
+                return
+            if key == arcade.key.TAB and self.game_state == "community_level_select":
+                level_selector_menu.searching = True
+                return
 
             if key == arcade.key.D or key == arcade.key.RIGHT:
-                level_selector_menu[self.game_state].selection += 1
+                level_selector_menu.selection += 1
             if key == arcade.key.A or key == arcade.key.LEFT:
-                level_selector_menu[self.game_state].selection -= 1
+                level_selector_menu.selection -= 1
             if key == arcade.key.W or key == arcade.key.UP:
-                level_selector_menu[self.game_state].selection -= 5
+                level_selector_menu.selection -= 5
             if key == arcade.key.S or key == arcade.key.DOWN:
-                level_selector_menu[self.game_state].selection += 5
+                level_selector_menu.selection += 5
             if key == arcade.key.R and self.game_state == "community_level_select":
-                util.update_community_metadata()
-                level_selector_menu[self.game_state].update()
+                level_selector_menu.refresh()
             if key == arcade.key.F and self.game_state == "community_level_select":
                 try:
                     util.opendir(util.ENVIRON_DATA_PATH + "levels/community")
@@ -392,17 +521,18 @@ class GameObject(arcade.Window):
                     util.opendir(util.VENV_DATA_PATH + "levels/community")
             if key == arcade.key.ESCAPE:
                 self.game_state = "menu"
-            if key == arcade.key.ENTER or key == arcade.key.SPACE:
-                self.current_level_path = level_selector_menu[self.game_state].get_selection()
+            if (key == arcade.key.ENTER or key == arcade.key.SPACE) and len(level_selector_menu.filenames) > 0:
+                self.current_level_path = level_selector_menu.get_selection()
                 self.official_level_status = True if self.game_state == "official_level_select" else False
-                self.current_level = level.load_level(
-                    util.load_data(self.current_level_path, True, self.official_level_status),
-                    walking_volume=self.effects_volume*self.master_volume
-                )
                 if self.game_state == "official_level_select":
-                    self.official_level_index = level_selector_menu[self.game_state].selection + 1
+                    self.official_level_index = level_selector_menu.selection + 1
+                self.load_current_level()
                 self.game_state = "game"
 
+    def on_text(self, text: str):
+        if self.game_state == "community_level_select" and self.community_selector_menu.searching and text.isprintable():
+            self.community_selector_menu.set_search(self.community_selector_menu.search + text)
+
     def on_key_release(self, key, key_modifiers):
         if key == arcade.key.W or key == arcade.key.UP:
             self.current_level.gator.up = False
@@ -446,18 +576,95 @@ class GameObject(arcade.Window):
         self.settings["volume"]["effects"] = self.effects_volume
         self.settings["current_level"] = self.official_level_index
         util.write_data("config.json", self.settings)
+        if self.current_level_creator is not None:
+            self.current_level_creator.solver.shutdown()
+        for selector in self.level_selectors.values():
+            selector.shutdown()
+        if self.simulation is not None:
+            self.simulation.shutdown()
+        self.level_loader.shutdown()
+        if self.level_watcher is not None:
+            self.level_watcher.close()
         arcade.close_window()
 
     def reset_level(self):
-        self.current_level = level.load_level(
-            util.load_data(self.current_level_path, True, self.official_level_status),
-            self.effects_volume * self.master_volume
-        )
+        # Restarting a level that is still in memory only restores the state it had right after loading
+        source = (self.current_level_path, self.official_level_status)
+        if source == self.current_level_source:
+            self.restore_current_level()
+        elif source == self.previous_level_source:
+            self.previous_level, self.current_level = self.current_level, self.previous_level
+            self.previous_level_source, self.current_level_source = self.current_level_source, source
+            self.restore_current_level()
+            self.level_loader.preload(self.next_level_path(), self.official_level_status, self.effects_volume * self.master_volume)
+        else:
+            self.load_current_level()
         self.game_state = "game"
 
+    def restore_current_level(self):
+        # The simulation thread may still be raycasting the level, so it is put back once that is done
+        if self.simulation is not None:
+            self.simulation.post(self.current_level, self.current_level.restore)
+        else:
+            self.current_level.restore()
+
+    def apply_level_changes(self, changed_filenames: set[str] | None):
+        if changed_filenames is None:
+            util.update_community_metadata()
+        elif not changed_filenames or not util.update_community_levels(changed_filenames):
+            return
+
+        # Only the pages of a selector that was already opened have to be refetched
+        community_selector = self.level_selectors.get(True)
+        if community_selector is not None:
+            community_selector.refresh(rescan=False)
+
+        if self.current_level_source is None or self.current_level_source[1]:
+            return
+        current_stem = os.path.splitext(self.current_level_source[0])[0]
+        if changed_filenames is None or any(os.path.splitext(f)[0] == current_stem for f in changed_filenames):
+            self.reload_current_level()
+
+    def reload_current_level(self):
+        # Swap in a fresh build of the level being played, the old one stays if the file cannot be read yet
+        self.level_loader.invalidate()
+        walking_volume = self.effects_volume * self.master_volume
+        try:
+            reloaded_level = self.level_loader.load(*self.current_level_source, walking_volume)
+        except (OSError, ValueError, KeyError, IndexError):
+            return
+        self._current_level = reloaded_level
+        if self.previous_level_source == self.current_level_source:
+            self.previous_level, self.previous_level_source = None, None
+        self.level_loader.preload(self.next_level_path(), self.official_level_status, walking_volume)
+
+    def next_level_path(self) -> str:
+        # The level that will be loaded once the current one is won
+        if not self.official_level_status or self.official_level_index == self.official_level_count:
+            return self.current_level_path
+        return "level_" + str(self.official_level_index + 1) + ".json"
+
+    def load_current_level(self):
+        # The level is built in the background and only waited on the first time current_level is used
+        self.previous_level, self.previous_level_source = self._current_level, self.current_level_source
+        self._current_level = None
+        self.current_level_source = (self.current_level_path, self.official_level_status)
+        self.level_loader.preload(*self.current_level_source, self.effects_volume * self.master_volume)
+
 
 def main():
-    window = GameObject()
+    parser = argparse.ArgumentParser(prog="illumigator")
+    parser.add_argument("--profile-startup", action="store_true", help="print how long each startup phase took")
+    parser.add_argument("--watch-levels", action="store_true",
+                        help="pick up changes to community levels automatically and reload the one being played")
+    args = parser.parse_args()
+
+    startup_profile = None
+    if args.profile_startup:
+        startup_profile = util.StartupProfile(_IMPORT_START)
+        startup_profile.mark("imports")
+    watcher = level_watcher.LevelWatcher(util.get_community_path()) if args.watch_levels else None
+    window = GameObject(startup_profile, watcher)
     window.setup()
     arcade.run()
 
@@ -155,50 +155,53 @@ class ControlsMenu:
     def __init__(self):
         self.wasd_row = ("A", "S", "D")
 
-    def draw(self):
         # ========================= Movement Key Sprites =========================
-        util.load_sprite(
+        self.key_sprites = arcade.SpriteList()
+        self.key_sprites.append(util.load_sprite(
             "key.png",
             1,
             center_x=util.WORLD_WIDTH // 4,
             center_y=util.WORLD_HEIGHT // 2,
-        ).draw(pixelated=True)
+        ))
         for index in range(-1, 2):
-            util.load_sprite(
+            self.key_sprites.append(util.load_sprite(
                 "key.png",
                 1,
                 center_x=util.WORLD_WIDTH // 4 + index * 64,
                 center_y=util.WORLD_HEIGHT // 2 - 64,
-            ).draw(pixelated=True)
+            ))
 
-        util.load_sprite(
+        self.key_sprites.append(util.load_sprite(
             "arrow.png",
             1,
             center_x=util.WORLD_WIDTH // 4,
             center_y=util.WORLD_HEIGHT // 2 - 164,
-        ).draw(pixelated=True)
+        ))
         for index in range(-1, 2):
-            util.load_sprite(
+            self.key_sprites.append(util.load_sprite(
                 "arrow.png",
                 1,
                 center_x=util.WORLD_WIDTH // 4 + index * 64,
                 center_y=util.WORLD_HEIGHT // 2 - 228,
                 angle=90 + (index + 1) * 90,
-            ).draw(pixelated=True)
+            ))
 
         # ========================= Rotation Key Sprites =========================
-        util.load_sprite(
+        self.key_sprites.append(util.load_sprite(
             "key.png",
             1,
             center_x=util.WORLD_WIDTH * 3 // 4 - 32,
             center_y=util.WORLD_HEIGHT // 2,
-        ).draw(pixelated=True)
-        util.load_sprite(
+        ))
+        self.key_sprites.append(util.load_sprite(
             "key.png",
             1,
             center_x=util.WORLD_WIDTH * 3 // 4 + 32,
             center_y=util.WORLD_HEIGHT // 2,
-        ).draw(pixelated=True)
+        ))
+
+    def draw(self):
+        self.key_sprites.draw(pixelated=True)
 
         # ========================= Titles =========================
         arcade.draw_text(
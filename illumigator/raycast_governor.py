@@ -0,0 +1,53 @@
+from illumigator import util
+
+
+class RaycastGovernor:
+    """
+    Trades ray count and bounce depth for raycast time, stepping down a level when raycasting runs over its budget and
+    back up once it has stayed well under it
+    """
+    # Shares of NUM_LIGHT_RAYS and MAX_GENERATIONS used at each level
+    LEVELS = ((1.0, 1.0), (0.75, 1.0), (0.5, 0.75), (0.5, 0.5), (0.35, 0.4))
+
+    def __init__(self, budget: float = util.RAYCAST_BUDGET, min_generations: int = 1):
+        self.budget = budget
+        self.min_generations = min(min_generations, util.MAX_GENERATIONS)  # Bounces a level needs to be solved
+        self.level = 0
+        self.average: float | None = None
+        self._frames_at_level = 0
+
+    @property
+    def ray_count(self) -> int:
+        return max(round(util.NUM_LIGHT_RAYS * self.LEVELS[self.level][0]), 2)
+
+    @property
+    def max_generations(self) -> int:
+        return max(round(util.MAX_GENERATIONS * self.LEVELS[self.level][1]), self.min_generations)
+
+    def update(self, elapsed: float) -> bool:
+        # Takes the raycast time of a frame in seconds, returns whether the level changed
+        if self.average is None:
+            self.average = elapsed
+        else:
+            self.average += (elapsed - self.average) * util.GOVERNOR_SMOOTHING
+        self._frames_at_level += 1
+
+        # The average only reflects a new level after a few frames, so no decision is made before then
+        step = 0
+        if self._frames_at_level >= util.GOVERNOR_SETTLE_FRAMES:
+            if self.average > self.budget and self.level < len(self.LEVELS) - 1:
+                step = 1
+            elif self.average < self.budget * util.GOVERNOR_RECOVERY and self.level > 0:
+                step = -1
+        if step != 0:
+            self.level += step
+            self.average = None
+            self._frames_at_level = 0
+            counter = "governor_steps_down" if step > 0 else "governor_steps_up"
+            util.PERF_COUNTERS[counter] = util.PERF_COUNTERS.get(counter, 0) + 1
+
+        util.PERF_COUNTERS["raycast_ms"] = elapsed * 1000
+        util.PERF_COUNTERS["governor_level"] = self.level
+        util.PERF_COUNTERS["active_rays"] = self.ray_count
+        util.PERF_COUNTERS["max_generations"] = self.max_generations
+        return step != 0
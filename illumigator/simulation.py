@@ -0,0 +1,92 @@
+import queue
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy
+
+from illumigator import level
+
+
+class RenderState:
+    """
+    What the renderer needs from one raycast of a level, copied so the next raycast can run while it is drawn
+    """
+    __slots__ = ("level", "ray_segments", "charge_gains", "enemy_alerted", "charges")
+
+    def __init__(self, traced_level: level.Level):
+        self.level = traced_level
+        # Rows of (x1, y1, x2, y2) for every ray and child ray, per light source
+        self.ray_segments: dict = {}
+        for light_source in traced_level.light_source_list:
+            segments = []
+            for ray in light_source.light_rays:
+                while ray is not None:
+                    segments.append((*ray.origin, *ray._end))
+                    ray = ray.child_ray
+            self.ray_segments[light_source] = numpy.array(segments, dtype=float).reshape(-1, 4)
+        # The raycast only collects what light did to the level, it is applied on the main thread
+        self.charge_gains, self.enemy_alerted = traced_level.take_effects()
+        self.charges: dict = {}
+
+    def apply(self):
+        self.level.apply_effects(self.charge_gains, self.enemy_alerted)
+        self.charges = {receiver: receiver.charge for receiver in self.level.light_receiver_list}
+
+
+class Simulation:
+    """
+    Raycasts the level on a worker thread while the previous raycast is drawn. Everything else in a frame stays on
+    the main thread, and the level is only changed once the worker is done with it. The worker leaves the level as it
+    is, charges and an alerted enemy are handed back and applied by wait.
+    """
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._future: Future | None = None
+        self._inputs = queue.SimpleQueue()
+        self.front: RenderState | None = None  # Latest finished raycast, drawn until the next one is collected
+
+    @staticmethod
+    def _raycast(traced_level: level.Level) -> RenderState:
+        traced_level.run_raycast(False, defer_effects=True)
+        return RenderState(traced_level)
+
+    def post(self, posted_level: level.Level, action):
+        # Changes to a level from input handlers, applied between two raycasts while it is still the current level
+        self._inputs.put((posted_level, action))
+
+    def wait(self, current_level: level.Level | None = None):
+        # Effects of a raycast are only applied to the level being played, a level left since then keeps its state
+        if self._future is not None:
+            future, self._future = self._future, None
+            self.front = future.result()
+            if self.front.level is current_level:
+                self.front.apply()
+
+    def step(self, current_level: level.Level, walking_volume):
+        self.wait(current_level)
+        while not self._inputs.empty():
+            posted_level, action = self._inputs.get()
+            if posted_level is current_level:
+                action()
+        current_level.update(walking_volume, raycast=False)
+        self._future = self._executor.submit(self._raycast, current_level)
+
+    def draw(self, current_level: level.Level):
+        if self.front is None or self.front.level is not current_level:
+            self.wait(current_level)
+        if self.front is not None and self.front.level is current_level:
+            current_level.draw(self.front)
+        else:
+            current_level.draw()
+
+    def get_charges(self, current_level: level.Level) -> dict:
+        # Receiver charges as of the latest raycast of the level
+        if self.front is not None and self.front.level is current_level:
+            return self.front.charges
+        return {receiver: receiver.charge for receiver in current_level.light_receiver_list}
+
+    def shutdown(self):
+        self.wait()
+        while not self._inputs.empty():  # Changes that were never applied are dropped with the level
+            self._inputs.get()
+        self._executor.shutdown()
@@ -0,0 +1,78 @@
+import math
+
+import numpy
+
+
+class SpatialIndex:
+    """
+    Uniform grid over the bounding boxes of world objects, used to pick the object under a point
+    """
+
+    def __init__(self, cell_size: float):
+        self.cell_size = cell_size
+        self._cells: dict[tuple[int, int], set[int]] = {}
+        # id(object) -> (object, layer, insertion order, cells, transform the cells were computed for)
+        self._entries: dict[int, tuple] = {}
+        self._next_order = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, obj):
+        return id(obj) in self._entries
+
+    def _cells_for(self, obj) -> list[tuple[int, int]]:
+        # Axis-aligned bounds of the object's oriented box
+        cos, sin = abs(math.cos(obj.rotation_angle)), abs(math.sin(obj.rotation_angle))
+        half_width = cos * obj.half_extents[0] + sin * obj.half_extents[1]
+        half_height = sin * obj.half_extents[0] + cos * obj.half_extents[1]
+        x0 = math.floor((obj.position[0] - half_width) / self.cell_size)
+        x1 = math.floor((obj.position[0] + half_width) / self.cell_size)
+        y0 = math.floor((obj.position[1] - half_height) / self.cell_size)
+        y1 = math.floor((obj.position[1] + half_height) / self.cell_size)
+        return [(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+
+    @staticmethod
+    def _transform(obj) -> tuple:
+        return obj.position[0], obj.position[1], obj.rotation_angle, obj.half_extents[0], obj.half_extents[1]
+
+    def _link(self, obj, layer: int, order: int):
+        cells = self._cells_for(obj)
+        for cell in cells:
+            self._cells.setdefault(cell, set()).add(id(obj))
+        self._entries[id(obj)] = (obj, layer, order, cells, self._transform(obj))
+
+    def _unlink(self, obj) -> tuple | None:
+        entry = self._entries.pop(id(obj), None)
+        if entry is not None:
+            for cell in entry[3]:
+                self._cells[cell].discard(id(obj))
+                if not self._cells[cell]:
+                    del self._cells[cell]
+        return entry
+
+    def insert(self, obj, layer: int = 0):
+        # Objects on a higher layer, then objects inserted later, are considered on top
+        self._unlink(obj)
+        self._link(obj, layer, self._next_order)
+        self._next_order += 1
+
+    def remove(self, obj):
+        self._unlink(obj)
+
+    def update(self, obj):
+        # Must be called after an indexed object moves, objects that are not indexed are ignored
+        entry = self._entries.get(id(obj))
+        if entry is not None and entry[4] != self._transform(obj):
+            self._unlink(obj)
+            self._link(obj, entry[1], entry[2])
+
+    def query_point(self, point: numpy.ndarray):
+        # Topmost object whose oriented box contains the point, or None
+        cell = (math.floor(point[0] / self.cell_size), math.floor(point[1] / self.cell_size))
+        topmost = None
+        for object_id in self._cells.get(cell, ()):
+            obj, layer, order, _, _ = self._entries[object_id]
+            if (topmost is None or (layer, order) > topmost[:2]) and obj.check_collision_with_point(point):
+                topmost = (layer, order, obj)
+        return None if topmost is None else topmost[2]
@@ -1,12 +1,15 @@
-import heapq
 import json
 import math
 import os
 import subprocess
+import threading
+import time
 
 import arcade
 import numpy
-from screeninfo import get_monitors
+import PIL.Image
+
+from illumigator import level_catalog, level_format
 
 
 DEBUG_GEOMETRY = False
@@ -19,14 +22,23 @@ UNIVERSAL_SPEED_MULTIPLIER = 60/FRAME_RATE
 WORLD_WIDTH: int = 1280  # Width of the game for calculating coordinates and positions
 WORLD_HEIGHT: int = 720  # Height of the game
 WINDOW_TITLE: str = "IllumiGator"
+LEVEL_TRANSITION_DELAY: float = 0.5  # Seconds the finished level stays on screen before the win menu
 X_MIDPOINT = WORLD_WIDTH // 2
 Y_MIDPOINT = WORLD_HEIGHT // 2
 
+
 # Monitor
-for m in get_monitors():
-    if m.is_primary:
-        SCREEN_WIDTH = m.width
-        SCREEN_HEIGHT = m.height
+def __getattr__(name):
+    # Querying the monitors is slow, so the screen size is only looked up the first time it is used
+    if name in ("SCREEN_WIDTH", "SCREEN_HEIGHT"):
+        from screeninfo import get_monitors
+        for m in get_monitors():
+            if m.is_primary:
+                globals()["SCREEN_WIDTH"] = m.width
+                globals()["SCREEN_HEIGHT"] = m.height
+        if name in globals():
+            return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 
@@ -54,6 +66,11 @@ ENVIRON_ASSETS_PATH = os.path.join(os.path.split(__file__)[0], "assets/")
 VENV_ASSETS_PATH = os.path.join(os.path.split(__file__)[0], "assets/")
 ENVIRON_DATA_PATH = os.path.join(os.path.split(__file__)[0], "data/")
 VENV_DATA_PATH = "./venv/Lib/site-packages/illumigator/data/"
+COMMUNITY_CATALOG_FILENAME = "levels/community.db"
+SYSTEM_LEVEL_INDEX = "levels/system/levels.json"  # Read as plain data, it is not a level itself
+
+IMAGE_ASSET_EXTENSIONS = (".png", ".jpg")
+ATLAS_MAX_ASSET_SIZE = 2048  # Anything bigger is left out of the shared atlas
 
 # Fonts
 MENU_FONT = "Press Start 2P"
@@ -69,6 +86,29 @@ H1_FONT_SIZE = 48
 MAX_RAY_DISTANCE = math.sqrt(WORLD_WIDTH**2 + WORLD_HEIGHT**2)  # Max distance before ray goes off-screen
 MAX_GENERATIONS: int = 20
 INDEX_OF_REFRACTION: float = 1.5
+BEAM_TRACING: bool = False  # Charge receivers with the exact share of light reaching them instead of counting ray hits
+VISIBILITY_MIN_SEGMENTS: int = 200  # Below this many line segments, the first rays of a source are cast without a sweep
+MAX_BEAM_INTERVALS: int = 256  # Per light source, light beyond this many beam intervals is followed with sampled rays
+BEAM_SAMPLE_DENSITY: int = 16  # Sampled rays per ray of the light source where beams hand light over to rays
+ADAPTIVE_RAYS: bool = False  # Add rays where neighboring rays of a light source take different paths
+MAX_REFINED_RAYS: int = 90  # Per light source and frame
+MAX_REFINEMENT_DEPTH: int = 5  # Times the spacing between two rays of a light source may be halved
+RAYCAST_GOVERNOR: bool = False  # Use fewer rays and bounces while raycasting takes longer than RAYCAST_BUDGET
+RAYCAST_BUDGET: float = 0.4 / FRAME_RATE  # Seconds
+GOVERNOR_SMOOTHING: float = 0.2  # Weight of the latest frame in the average raycast time
+GOVERNOR_SETTLE_FRAMES: int = 10  # Frames at a level before the governor may leave it
+GOVERNOR_RECOVERY: float = 0.5  # Share of the budget the average must drop under to step back up
+SIMULATION_THREAD: bool = False  # Raycast on a worker thread while the previous frame is drawn
+
+# Curved Mirror Constants
+CURVED_MIRROR_RADIUS: float = 110  # Default radius of curvature, same as the lens surfaces
+CURVED_MIRROR_COLOR: tuple = (205, 230, 245)
+
+# Prism and Ball Lens Constants
+PRISM_SIDE_LENGTH: float = 60
+BALL_LENS_RADIUS: float = 30
+GLASS_COLOR: tuple = (170, 220, 255, 70)
+GLASS_OUTLINE_COLOR: tuple = (200, 235, 255, 200)
 
 # Light Source Constants
 NUM_LIGHT_RAYS: int = 30
@@ -86,6 +126,17 @@ OBJECT_ROTATION_AMOUNT: float = 0.01 * UNIVERSAL_SPEED_MULTIPLIER
 # Enemy Constants
 ENEMY_MOVEMENT_SPEED = 4 * UNIVERSAL_SPEED_MULTIPLIER
 
+# Level Creator Constants
+EDIT_HISTORY_LIMIT: int = 1000  # Oldest edits are forgotten first
+SOLVER_DEBOUNCE_TIME: float = 0.5  # Seconds without edits before the level is checked for a solution
+SOLVER_ANGLE_STEPS: int = 48  # Mirror angles tried per mirror and pass
+SOLVER_MAX_PASSES: int = 4
+SOLVER_BEAM_WIDTH: int = 4  # Mirror configurations kept while following the light from mirror to mirror
+SOLVER_ANIMATION_PHASES: int = 5  # Frames of the animated walls' travel the search tries mirror angles at
+SOLVER_CHECK_FRAMES: int = 1200  # Frames of play the final mirror angles are checked over while walls move
+SOLVER_CHECK_STRIDE: int = 4  # Frames between two checked wall positions
+PICKING_CELL_SIZE: float = 4 * WALL_SIZE  # Grid cell size of the index used to find the clicked object
+
 
 
 # ========================= Physics Functions =========================
@@ -121,6 +172,66 @@ def two_d_cross_product(vector1: numpy.ndarray, vector2: numpy.ndarray) -> float
 
 
 # ========================= File Handling Functions =========================
+_community_catalog: level_catalog.LevelCatalog | None = None
+_image_cache: dict[str, PIL.Image.Image] = {}
+_texture_cache: dict[tuple, arcade.Texture] = {}
+_texture_lock = threading.Lock()
+_sound_cache: dict[str, arcade.Sound] = {}
+_sound_lock = threading.Lock()
+
+
+def _load_image(filename: str) -> PIL.Image.Image:
+    image = _image_cache.get(filename)
+    if image is None:
+        try:
+            image = PIL.Image.open(ENVIRON_ASSETS_PATH + filename).convert("RGBA")
+        except FileNotFoundError:
+            image = PIL.Image.open(VENV_ASSETS_PATH + filename).convert("RGBA")
+        _image_cache[filename] = image
+    return image
+
+
+def load_texture(
+        filename: str,
+        image_x: int = 0, image_y: int = 0,
+        image_width: int = 0, image_height: int = 0,
+        flipped_horizontally: bool = False, flipped_vertically: bool = False, flipped_diagonally: bool = False,
+        hit_box_algorithm: str | None = "Simple", hit_box_detail: float = 4.5,
+) -> arcade.Texture:
+    # Every asset is decoded once, every (file, sub-rect) pair becomes one shared texture. Level loading and the
+    # level selector also load textures on worker threads, so the caches are only touched under the lock
+    with _texture_lock:
+        image = _load_image(filename)
+        if image_width == 0:
+            image_width = image.width - image_x
+        if image_height == 0:
+            image_height = image.height - image_y
+        key = (filename, image_x, image_y, image_width, image_height,
+               flipped_horizontally, flipped_vertically, flipped_diagonally, hit_box_algorithm, hit_box_detail)
+        texture = _texture_cache.get(key)
+        if texture is not None:
+            return texture
+
+        if (image_x, image_y, image_width, image_height) != (0, 0, image.width, image.height):
+            image = image.crop((image_x, image_y, image_x + image_width, image_y + image_height))
+        if flipped_diagonally:
+            image = image.transpose(PIL.Image.TRANSPOSE)
+        if flipped_horizontally:
+            image = image.transpose(PIL.Image.FLIP_LEFT_RIGHT)
+        if flipped_vertically:
+            image = image.transpose(PIL.Image.FLIP_TOP_BOTTOM)
+
+        texture = arcade.Texture(
+            f"{filename}-{image_x}-{image_y}-{image_width}-{image_height}-"
+            f"{flipped_horizontally}-{flipped_vertically}-{flipped_diagonally}-{hit_box_algorithm}",
+            image,
+            hit_box_algorithm=hit_box_algorithm,
+            hit_box_detail=hit_box_detail,
+        )
+        _texture_cache[key] = texture
+        return texture
+
+
 def load_sprite(
         filename: str | None = None,
         scale: float = 1,
@@ -133,46 +244,56 @@ def load_sprite(
         texture: arcade.Texture | None = None,
         angle: float = 0,
 ) -> arcade.Sprite:
-    try:
-        return arcade.Sprite(
-            ENVIRON_ASSETS_PATH + filename,
-            scale,
-            image_x, image_y,
-            image_width, image_height,
-            center_x, center_y,
-            repeat_count_x, repeat_count_y,
-            flipped_horizontally, flipped_vertically, flipped_diagonally,
-            hit_box_algorithm, hit_box_detail,
-            texture,
-            angle,
-        )
-    except FileNotFoundError:
-        return arcade.Sprite(
-            VENV_ASSETS_PATH + filename,
-            scale,
-            image_x, image_y,
-            image_width, image_height,
-            center_x, center_y,
-            repeat_count_x, repeat_count_y,
+    if texture is None:
+        texture = load_texture(
+            filename,
+            int(image_x), int(image_y),
+            int(image_width), int(image_height),
             flipped_horizontally, flipped_vertically, flipped_diagonally,
             hit_box_algorithm, hit_box_detail,
-            texture,
-            angle,
         )
+    return arcade.Sprite(
+        None,
+        scale,
+        center_x=center_x, center_y=center_y,
+        repeat_count_x=repeat_count_x, repeat_count_y=repeat_count_y,
+        hit_box_algorithm=hit_box_algorithm, hit_box_detail=hit_box_detail,
+        texture=texture,
+        angle=angle,
+    )
 
 
-def load_sound(filename: str, streaming=False) -> arcade.Sound:
-    try:
-        return arcade.load_sound(ENVIRON_ASSETS_PATH + filename, streaming)
-    except FileNotFoundError:
-        return arcade.load_sound(VENV_ASSETS_PATH + filename, streaming)
+def preload_textures() -> list[arcade.Texture]:
+    # Decoding is thread safe, only packing the textures into an atlas has to happen on the main thread
+    assets_path = ENVIRON_ASSETS_PATH if os.path.exists(ENVIRON_ASSETS_PATH) else VENV_ASSETS_PATH
+    return [load_texture(filename) for filename in sorted(os.listdir(assets_path))
+            if filename.endswith(IMAGE_ASSET_EXTENSIONS)]
 
 
-def load_texture(filename: str) -> arcade.Texture:
-    try:
-        return arcade.load_texture(ENVIRON_ASSETS_PATH + filename)
-    except FileNotFoundError:
-        return arcade.load_texture(VENV_ASSETS_PATH + filename)
+def pack_textures(textures: list[arcade.Texture], atlas: arcade.TextureAtlas) -> None:
+    for texture in textures:
+        if max(texture.width, texture.height) <= ATLAS_MAX_ASSET_SIZE:
+            atlas.add(texture)
+
+
+def load_sound(filename: str, streaming=False) -> arcade.Sound:
+    if streaming:
+        try:
+            return arcade.load_sound(ENVIRON_ASSETS_PATH + filename, streaming)
+        except FileNotFoundError:
+            return arcade.load_sound(VENV_ASSETS_PATH + filename, streaming)
+
+    # Static sounds are decoded once and shared, every level builds a new Gator with its own walking sound. Levels are
+    # built on the level loader's worker thread, so the cache is only touched under the lock
+    with _sound_lock:
+        sound = _sound_cache.get(filename)
+        if sound is None:
+            try:
+                sound = arcade.load_sound(ENVIRON_ASSETS_PATH + filename, streaming)
+            except FileNotFoundError:
+                sound = arcade.load_sound(VENV_ASSETS_PATH + filename, streaming)
+            _sound_cache[filename] = sound
+        return sound
 
 
 def load_data(filename: str, is_level=False, is_system_level=True) -> dict:
@@ -183,117 +304,186 @@ def load_data(filename: str, is_level=False, is_system_level=True) -> dict:
     else:
         addon_path = ""
 
-    try:
-        file = open(ENVIRON_DATA_PATH + addon_path + filename)
-    except FileNotFoundError:
-        file = open(VENV_DATA_PATH + addon_path + filename)
+    path = ENVIRON_DATA_PATH + addon_path + filename
+    if not os.path.exists(path):
+        path = VENV_DATA_PATH + addon_path + filename
 
-    obj = json.load(file)
-    file.close()
-    return obj
+    if is_level:
+        if level_format.is_binary_level(path):
+            return level_format.load_binary_level(path)
+        # Prefer a compiled copy of the level as long as it is not older than its JSON source
+        binary_path = level_format.binary_path_for(path)
+        try:
+            if os.path.getmtime(binary_path) >= os.path.getmtime(path):
+                return level_format.load_binary_level(binary_path)
+        except OSError:
+            pass
 
+    with open(path) as file:
+        return json.load(file)
 
-def write_data(filename: str, obj: dict) -> None:
 
+def _get_data_path(filename: str) -> str:
     if os.path.exists(ENVIRON_DATA_PATH):
-        with open(ENVIRON_DATA_PATH + filename, "w") as outfile:
-            json.dump(obj, outfile, ensure_ascii=False, indent=2)
-    else:
-        with open(VENV_DATA_PATH + filename, "w") as outfile:
-            json.dump(obj, outfile, ensure_ascii=False, indent=2)
+        return ENVIRON_DATA_PATH + filename
+    return VENV_DATA_PATH + filename
 
 
-def update_community_metadata() -> None:
-    last_modified_dict = {}
-    addon_path = "levels/community/"
-
-    # Get file names and modification date from community directory
+def _write_atomically(path: str, mode: str, write) -> None:
+    # Write next to the target and swap it in, so a crash never leaves a half-written file behind
+    temp_path = f"{path}.{os.getpid()}.tmp"
     try:
-        files = os.scandir(ENVIRON_DATA_PATH + addon_path)
-    except FileNotFoundError:
-        files = os.scandir(VENV_DATA_PATH + addon_path)
-
-    for file in files:
-        if not file.name == "levels.json":
-            last_modified_dict[file.name] = os.path.getmtime(file)
-
-    # Get levels.json metadata file from community directory
-    try:
-        metadata_file = open(ENVIRON_DATA_PATH + addon_path + "levels.json")
-    except FileNotFoundError:
-        metadata_file = open(VENV_DATA_PATH + addon_path + "levels.json")
+        with open(temp_path, mode) as outfile:
+            write(outfile)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
 
-    json_obj = json.load(metadata_file)
-    metadata_file.close()
 
-    # Add datapoint (new file) to levels.json if necessary
-    for filename in last_modified_dict:
-        if not (filename in json_obj["levels"]):
-            json_obj["levels"][filename] = {
-                "date_modified": last_modified_dict[filename],
-                "level_name": load_data(filename, True, False)["level_name"],
-                "planet_name": load_data(filename, True, False)["planet"]
-            }
-
-    # Update levels.json with new data if necessary
-    for filename in last_modified_dict:
-        if last_modified_dict[filename] != json_obj["levels"][filename]["date_modified"]:
-            json_obj["levels"][filename] = {
-                "date_modified": last_modified_dict[filename],
-                "level_name": load_data(filename, True, False)["level_name"],
-                "planet_name": load_data(filename, True, False)["planet"]
-            }
+def write_data(filename: str, obj: dict) -> None:
+    _write_atomically(_get_data_path(filename), "w",
+                      lambda outfile: json.dump(obj, outfile, ensure_ascii=False, indent=2))
 
-    # Remove old datapoints (deleted file) in levels.json if necessary
-    list_of_datapoints_to_delete = []
 
-    for filename in json_obj["levels"]:
-        if not (filename in last_modified_dict):
-            list_of_datapoints_to_delete.append(filename)
+def write_level(filename: str, level: dict) -> None:
+    # The extension picks the format, .ilvl writes the binary layout from level_format
+    if level_format.is_binary_level(filename):
+        _write_atomically(_get_data_path(filename), "wb", lambda outfile: level_format.write_binary_level(level, outfile))
+    else:
+        _write_atomically(_get_data_path(filename), "w", lambda outfile: level_format.write_json_level(level, outfile))
 
-    for i in range(0, len(list_of_datapoints_to_delete)):
-        del json_obj["levels"][list_of_datapoints_to_delete[i]]
 
-    write_data("levels/community/levels.json", json_obj)
+def list_community_levels() -> dict[str, tuple[float, int]]:
+    addon_path = "levels/community/"
+    try:
+        entries = os.scandir(ENVIRON_DATA_PATH + addon_path)
+    except FileNotFoundError:
+        entries = os.scandir(VENV_DATA_PATH + addon_path)
+
+    # Get file names, modification dates and sizes from the community directory in one pass
+    stats = {}
+    with entries:
+        for entry in entries:
+            if entry.name == "levels.json" or not entry.is_file():
+                continue
+            if entry.name.endswith(level_format.JSON_EXTENSION) or level_format.is_binary_level(entry.name):
+                stat = entry.stat()
+                stats[entry.name] = (stat.st_mtime, stat.st_size)
+
+    # A binary level next to its JSON source is only a compiled copy of it
+    for filename in [name for name in stats if level_format.is_binary_level(name)]:
+        if filename[:-len(level_format.BINARY_EXTENSION)] + level_format.JSON_EXTENSION in stats:
+            del stats[filename]
+    return stats
+
+
+def get_community_catalog() -> level_catalog.LevelCatalog:
+    global _community_catalog
+    if _community_catalog is None:
+        data_path = ENVIRON_DATA_PATH if os.path.exists(ENVIRON_DATA_PATH) else VENV_DATA_PATH
+        _community_catalog = level_catalog.LevelCatalog(data_path + COMMUNITY_CATALOG_FILENAME)
+    return _community_catalog
+
+
+def get_community_path() -> str:
+    addon_path = "levels/community/"
+    community_path = ENVIRON_DATA_PATH + addon_path
+    if not os.path.exists(community_path):
+        community_path = VENV_DATA_PATH + addon_path
+    return community_path
+
+
+def update_community_metadata() -> bool:
+    community_path = get_community_path()
+    catalog = get_community_catalog()
+    stats = list_community_levels()
+    cataloged_stats = catalog.get_stats()
+
+    # Only read the headers of new or changed files
+    changed_entries = []
+    for filename, (date_modified, size) in stats.items():
+        if cataloged_stats.get(filename) == (date_modified, size):
+            continue
+        header = level_format.read_level_header(community_path + filename)
+        changed_entries.append((filename, date_modified, size, header["level_name"], header["planet"]))
+
+    # Remove old datapoints (deleted files) from the catalog if necessary
+    removed_filenames = [filename for filename in cataloged_stats if filename not in stats]
+
+    if changed_entries:
+        catalog.upsert(changed_entries)
+    if removed_filenames:
+        catalog.remove(removed_filenames)
+    return len(changed_entries) > 0 or len(removed_filenames) > 0
+
+
+def update_community_levels(filenames) -> bool:
+    # Incremental version of update_community_metadata for a few files reported by the level watcher
+    community_path = get_community_path()
+
+    # A change to a level can also hide or reveal its compiled sibling
+    names = set()
+    for filename in filenames:
+        stem, extension = os.path.splitext(filename)
+        if extension in (level_format.JSON_EXTENSION, level_format.BINARY_EXTENSION) and filename != "levels.json":
+            names.update((stem + level_format.JSON_EXTENSION, stem + level_format.BINARY_EXTENSION))
+    if not names:
+        return False
+    catalog = get_community_catalog()
+    cataloged_stats = catalog.get_stats(names)
+
+    changed_entries = []
+    removed_filenames = []
+    for filename in names:
+        path = community_path + filename
+        is_shadowed = level_format.is_binary_level(filename) and \
+            os.path.isfile(path[:-len(level_format.BINARY_EXTENSION)] + level_format.JSON_EXTENSION)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            stat = None
+        if stat is None or is_shadowed:
+            if filename in cataloged_stats:
+                removed_filenames.append(filename)
+            continue
+        if cataloged_stats.get(filename) == (stat.st_mtime, stat.st_size):
+            continue
+        try:
+            header = level_format.read_level_header(path)
+        except (ValueError, KeyError):  # Still being written, the next change event picks it up
+            continue
+        changed_entries.append((filename, stat.st_mtime, stat.st_size, header["level_name"], header["planet"]))
+
+    if changed_entries:
+        catalog.upsert(changed_entries)
+    if removed_filenames:
+        catalog.remove(removed_filenames)
+    return len(changed_entries) > 0 or len(removed_filenames) > 0
 
 
 # Returns the total number of levels and a page of levels
-def get_level_metadata(page_size: int = 15, page: int = 1, is_community=False) -> tuple[int, list, list]:
-    addon_path = "levels/community/" if is_community else "levels/system/"
-    level_list_unsorted = []
-    level_list_sorted = []
-    filenames_unsorted = []
-    filenames_sorted = []
+def get_level_metadata(page_size: int = 15, page: int = 1, is_community=False, search: str = "") -> tuple[int, list, list]:
     min_at_page = (page-1) * page_size
     max_at_page = page * page_size
 
-    try:
-        metadata_file = open(ENVIRON_DATA_PATH + addon_path + "levels.json")
-    except FileNotFoundError:
-        metadata_file = open(VENV_DATA_PATH + addon_path + "levels.json")
-
-    levels = json.load(metadata_file)["levels"]
-
     if is_community:
-        for level in levels:
-            heapq.heappush(filenames_unsorted, (-1 * levels[level]["date_modified"], level))
-
-        for level in levels:
-            heapq.heappush(level_list_unsorted, (-1 * levels[level]["date_modified"], levels[level]))
-
-        for i in range(len(level_list_unsorted)):
-            level_list_sorted.append(heapq.heappop(level_list_unsorted)[1])
-
-        for i in range(len(filenames_unsorted)):
-            filenames_sorted.append(heapq.heappop(filenames_unsorted)[1])
-
-        return len(levels), level_list_sorted[min_at_page:max_at_page], filenames_sorted[min_at_page:max_at_page]
-
-    for level in levels:
-        filenames_sorted.append(level)
-        level_list_sorted.append(levels[level])
-
-    return len(levels), level_list_sorted[min_at_page:max_at_page], filenames_sorted[min_at_page:max_at_page]
+        catalog = get_community_catalog()
+        rows = catalog.get_page(page, page_size, search)
+        levels = [{"level_name": level_name, "planet_name": planet_name} for _, level_name, planet_name in rows]
+        return catalog.count(search), levels, [filename for filename, _, _ in rows]
+
+    levels = load_data(SYSTEM_LEVEL_INDEX)["levels"]
+    filenames = [
+        filename for filename in levels
+        if not search or search.lower() in levels[filename]["level_name"].lower()
+    ]
+    return (
+        len(filenames),
+        [levels[filename] for filename in filenames[min_at_page:max_at_page]],
+        filenames[min_at_page:max_at_page]
+    )
 
 
 def opendir(filename):
@@ -303,3 +493,62 @@ def opendir(filename):
         raise FileNotFoundError
     except:
         subprocess.Popen(['xdg-open', filename])
+
+
+# ========================= Frame Instrumentation =========================
+# Latest values of per-frame measurements and running counts, by name
+PERF_COUNTERS: dict[str, float] = {}
+
+
+# ========================= Startup Profiling =========================
+class StartupProfile:
+    """
+    Records how long each startup phase and background task took, printed once the first frame is drawn and every
+    background task is done
+    """
+
+    def __init__(self, start: float | None = None):
+        self.start = time.perf_counter() if start is None else start
+        self._last_mark = self.start
+        self.phases: list[tuple[str, float]] = []
+        self.tasks: dict[str, float] = {}
+        self._pending_tasks = 0
+        self._lock = threading.Lock()  # Tasks finish on worker threads
+        self.first_frame: float | None = None  # Seconds from start to the first frame
+        self.reported = False
+
+    def mark(self, phase: str):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last_mark))
+        self._last_mark = now
+
+    def mark_first_frame(self):
+        if self.first_frame is None:
+            self.mark("first frame")
+            self.first_frame = self._last_mark - self.start
+
+    def track(self, name: str, future):
+        submitted = time.perf_counter()
+
+        def finish(_):
+            with self._lock:
+                self.tasks[name] = time.perf_counter() - submitted
+                self._pending_tasks -= 1
+
+        with self._lock:
+            self._pending_tasks += 1
+        future.add_done_callback(finish)
+
+    def is_complete(self) -> bool:
+        with self._lock:
+            return self.first_frame is not None and self._pending_tasks == 0
+
+    def report(self):
+        self.reported = True
+        with self._lock:
+            tasks = list(self.tasks.items())
+        print(f"Startup profile ({self.first_frame * 1000:.1f} ms to first frame):")
+        for phase, duration in self.phases:
+            print(f"  {phase:<24}{duration * 1000:8.1f} ms")
+        for name, duration in tasks:
+            print(f"  {name + ' (background)':<24}{duration * 1000:8.1f} ms")
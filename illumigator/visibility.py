@@ -0,0 +1,335 @@
+from abc import ABC, abstractmethod
+
+import numpy
+
+
+MISSED = -1  # Segment index of intervals whose rays hit nothing
+OTHER = -2  # Segment index of intervals whose rays first hit geometry other than the swept segments
+
+START_OFFSET = 0.001  # Rays that start on a line are moved this far along, like reflected light rays
+
+
+def _get_pair_crossings(point1_a, point2_a, point1_b, point2_b) -> tuple[numpy.ndarray, numpy.ndarray]:
+    # Where each segment a crosses the segment b paired with it, and whether it does
+    direction_a, direction_b = point2_a - point1_a, point2_b - point1_b
+    offset = point1_b - point1_a
+    denominators = direction_a[:, 0] * direction_b[:, 1] - direction_a[:, 1] * direction_b[:, 0]
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        t = (offset[:, 0] * direction_b[:, 1] - offset[:, 1] * direction_b[:, 0]) / denominators
+        u = (offset[:, 0] * direction_a[:, 1] - offset[:, 1] * direction_a[:, 0]) / denominators
+        points = point1_a + direction_a * t[:, None]  # Parallel pairs get nan points, they never cross
+    crossing = (denominators != 0) & (t >= 0) & (t <= 1) & (u >= 0) & (u <= 1)
+    return points, crossing
+
+
+def get_crossings(line_p1: numpy.ndarray, line_p2: numpy.ndarray) -> numpy.ndarray:
+    # Points where two segments cross each other, like the diagonals of a wall
+    low, high = numpy.minimum(line_p1, line_p2), numpy.maximum(line_p1, line_p2)
+    overlapping = (numpy.less_equal.outer(low[:, 0], high[:, 0]) & numpy.greater_equal.outer(high[:, 0], low[:, 0])
+                   & numpy.less_equal.outer(low[:, 1], high[:, 1]) & numpy.greater_equal.outer(high[:, 1], low[:, 1]))
+    i, j = numpy.nonzero(numpy.triu(overlapping, 1))  # Only segments whose bounds overlap can cross
+    points, crossing = _get_pair_crossings(line_p1[i], line_p2[i], line_p1[j], line_p2[j])
+    return points[crossing]
+
+
+def get_line_cuts(line_p1: numpy.ndarray, line_p2: numpy.ndarray, point1: numpy.ndarray, point2: numpy.ndarray) -> numpy.ndarray:
+    # Points where segments go through the infinite line through point1 and point2
+    normal = numpy.array([point1[1] - point2[1], point2[0] - point1[0]])
+    side1, side2 = (line_p1 - point1) @ normal, (line_p2 - point1) @ normal
+    cut_off = (side1 < 0) != (side2 < 0)
+    cut = side1[cut_off] / (side1[cut_off] - side2[cut_off])
+    return line_p1[cut_off] + (line_p2 - line_p1)[cut_off] * cut[:, None]
+
+
+def get_circle_cuts(centers: numpy.ndarray, radii: numpy.ndarray, line_p1: numpy.ndarray, line_p2: numpy.ndarray) -> numpy.ndarray:
+    # Points where circles meet segments
+    direction = line_p2 - line_p1
+    offset_x = numpy.subtract.outer(centers[:, 0], line_p1[:, 0])  # [circle, segment]
+    offset_y = numpy.subtract.outer(centers[:, 1], line_p1[:, 1])
+    a = direction[:, 0] * direction[:, 0] + direction[:, 1] * direction[:, 1]
+    b = offset_x * direction[:, 0] + offset_y * direction[:, 1]
+    c = offset_x * offset_x + offset_y * offset_y - (radii * radii)[:, None]
+    discriminant = b * b - a * c
+    root = numpy.sqrt(numpy.maximum(discriminant, 0))
+    points = []
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        for t in ((b - root) / a, (b + root) / a):
+            met = (discriminant >= 0) & (t >= 0) & (t <= 1)
+            _, segment = numpy.nonzero(met)
+            points.append(line_p1[segment] + direction[segment] * t[met][:, None])
+    return numpy.concatenate(points).reshape(-1, 2)
+
+
+def get_circle_crossings(centers: numpy.ndarray, radii: numpy.ndarray) -> numpy.ndarray:
+    # Points where two circles meet
+    i, j = numpy.triu_indices(len(centers), 1)
+    offset = centers[j] - centers[i]
+    distance = numpy.hypot(offset[:, 0], offset[:, 1])
+    met = (distance > 0) & (distance <= radii[i] + radii[j]) & (distance >= numpy.abs(radii[i] - radii[j]))
+    i, j, offset, distance = i[met], j[met], offset[met], distance[met]
+    along = (radii[i] * radii[i] - radii[j] * radii[j] + distance * distance) / (2 * distance)
+    across = numpy.sqrt(numpy.maximum(radii[i] * radii[i] - along * along, 0))
+    unit = offset / distance[:, None]
+    middle = centers[i] + unit * along[:, None]
+    normal = numpy.column_stack([-unit[:, 1], unit[:, 0]])
+    return numpy.concatenate([middle + normal * across[:, None], middle - normal * across[:, None]]).reshape(-1, 2)
+
+
+def _get_distances(ray_origin: numpy.ndarray, ray_dir: numpy.ndarray, point1: numpy.ndarray, point2: numpy.ndarray) -> numpy.ndarray:
+    # Distance of every ray to its own segment, inf where it misses
+    line_dir = point2 - point1
+    offset = point1 - ray_origin
+    denominators = ray_dir[:, 0] * line_dir[:, 1] - ray_dir[:, 1] * line_dir[:, 0]
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        distances = (offset[:, 0] * line_dir[:, 1] - offset[:, 1] * line_dir[:, 0]) / denominators
+        t = (offset[:, 0] * ray_dir[:, 1] - offset[:, 1] * ray_dir[:, 0]) / denominators
+    distances[~((distances >= 0) & (t >= 0) & (t <= 1))] = float('inf')
+    return distances
+
+
+def _get_line_distances(ray_origin: numpy.ndarray, ray_dir: numpy.ndarray, point1: numpy.ndarray, point2: numpy.ndarray) -> numpy.ndarray:
+    # Distance of rays to the infinite line through point1 and point2
+    line_dir = point2 - point1
+    offset = point1 - ray_origin
+    return (offset[:, 0] * line_dir[1] - offset[:, 1] * line_dir[0]) / (ray_dir[:, 0] * line_dir[1] - ray_dir[:, 1] * line_dir[0])
+
+
+class SegmentSweep(ABC):
+    """
+    Line segments sorted across a family of rays, as intervals of the ray parameter that each hit a single segment
+    first (or nothing), so rays are cast by looking up their interval instead of testing every segment
+    """
+
+    def __init__(self, line_p1: numpy.ndarray, line_p2: numpy.ndarray, critical_positions: numpy.ndarray, end: float, cast_other=None):
+        self.line_p1, self.line_p2 = line_p1.copy(), line_p2.copy()
+        self.end = end
+
+        # Sweep across the rays: the segments are sorted by where they start and end, and over each interval
+        # between those positions only the segments active there are compared. The nearest segment can also
+        # change where it crosses another active one, those crossings split their interval and it is swept again.
+        positions = numpy.union1d(critical_positions[(critical_positions >= 0) & (critical_positions <= end)], [0, end])
+        ranges = self._get_ranges()
+        while True:
+            segments, middle_origins, middle_dirs, crossing_positions = self._sweep(positions, *ranges)
+            if len(crossing_positions) == 0:
+                break
+            positions = numpy.union1d(positions, crossing_positions)
+        if cast_other is not None:  # Gives the distances of rays to the nearest other geometry
+            distances = numpy.full(len(segments), float('inf'))
+            hit = segments >= 0
+            distances[hit] = _get_distances(middle_origins[hit], middle_dirs[hit], line_p1[segments[hit]], line_p2[segments[hit]])
+            segments[cast_other(middle_origins, middle_dirs) < distances] = OTHER
+
+        # Neighboring intervals that hit the same segment are joined
+        changes = numpy.flatnonzero(segments[1:] != segments[:-1]) + 1
+        self.boundaries = numpy.concatenate([[0], positions[changes], [end]])
+        self.segments = segments[numpy.concatenate([[0], changes])]  # Segment index per interval, or MISSED or OTHER
+
+    def _get_ranges(self) -> tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+        # Segment index, start and end of the positions of the rays that can reach each segment
+        start, end = self.get_point_positions(self.line_p1), self.get_point_positions(self.line_p2)
+        return numpy.arange(len(start)), numpy.minimum(start, end), numpy.maximum(start, end)
+
+    def _sweep(self, positions, range_segments, range_starts, range_ends):
+        # Pairs of every interval and each segment active over all of it, found by where the segment starts and ends
+        first = numpy.maximum(numpy.searchsorted(positions, range_starts, side='right') - 1, 0)
+        last = numpy.minimum(numpy.searchsorted(positions, range_ends, side='left'), len(positions) - 1)
+        counts = numpy.maximum(last - first, 0)
+        pair_segments = numpy.repeat(range_segments, counts)
+        pair_intervals = numpy.arange(counts.sum()) + numpy.repeat(first - numpy.cumsum(counts) + counts, counts)
+
+        # Nearest active segment along the middle ray of each interval, ties go to the lowest index like
+        # light.get_line_raycast_results
+        middle_origins, middle_dirs = self.get_rays((positions[:-1] + positions[1:]) / 2)
+        distances = _get_distances(middle_origins[pair_intervals], middle_dirs[pair_intervals],
+                                   self.line_p1[pair_segments], self.line_p2[pair_segments])
+        order = numpy.lexsort((pair_segments, distances, pair_intervals))
+        nearest = order[numpy.flatnonzero(numpy.diff(pair_intervals[order], prepend=-1))]
+        nearest = nearest[distances[nearest] < float('inf')]
+        segments = numpy.full(len(positions) - 1, MISSED)
+        segments[pair_intervals[nearest]] = pair_segments[nearest]
+
+        # Crossings of the nearest segment of an interval with the other segments active there
+        owners = segments[pair_intervals]
+        paired = (owners >= 0) & (owners != pair_segments)
+        owners, others, intervals = owners[paired], pair_segments[paired], pair_intervals[paired]
+        points, crossing = _get_pair_crossings(self.line_p1[owners], self.line_p2[owners], self.line_p1[others], self.line_p2[others])
+        crossing_positions = self.get_point_positions(points[crossing])
+        intervals = intervals[crossing]
+        inside = (crossing_positions > positions[intervals]) & (crossing_positions < positions[intervals + 1])
+        return segments, middle_origins, middle_dirs, crossing_positions[inside]
+
+    @abstractmethod
+    def get_point_positions(self, points: numpy.ndarray) -> numpy.ndarray:
+        # Position of the ray of the family that goes through each point
+        pass
+
+    @abstractmethod
+    def get_positions(self, ray_origin: numpy.ndarray, ray_dir: numpy.ndarray) -> numpy.ndarray:
+        pass
+
+    @abstractmethod
+    def get_rays(self, positions: numpy.ndarray) -> tuple[numpy.ndarray, numpy.ndarray]:
+        pass
+
+    def cast(self, ray_origin: numpy.ndarray, ray_dir: numpy.ndarray) -> tuple[numpy.ndarray, numpy.ndarray]:  # distances, line indices
+        # Same results as light.get_line_raycast_results for rays of the family, from one or two segments per ray
+        positions = self.get_positions(ray_origin, ray_dir)
+        last = len(self.segments) - 1
+        after = numpy.clip(numpy.searchsorted(self.boundaries, positions, side='right') - 1, 0, last)
+        segments = self.segments[after]
+        distances = _get_distances(ray_origin, ray_dir, self.line_p1[segments], self.line_p2[segments])
+        distances[segments < 0] = float('inf')
+
+        # A ray right on a boundary could hit the segment before it first
+        tied = numpy.flatnonzero(numpy.clip(numpy.searchsorted(self.boundaries, positions, side='left') - 1, 0, last) != after)
+        if len(tied) > 0:
+            before = self.segments[after[tied] - 1]
+            before_distances = _get_distances(ray_origin[tied], ray_dir[tied], self.line_p1[before], self.line_p2[before])
+            closer = (before >= 0) & (before_distances < distances[tied])
+            distances[tied[closer]], segments[tied[closer]] = before_distances[closer], before[closer]
+        return distances, numpy.maximum(segments, 0)
+
+    def get_coverage(self, segment_indices) -> float:
+        # Length of the parameter range whose rays hit any of the given segments first
+        widths = self.boundaries[1:] - self.boundaries[:-1]
+        return float(widths[numpy.isin(self.segments, list(segment_indices))].sum())
+
+    def get_hits(self, positions: numpy.ndarray, segment: int) -> numpy.ndarray:
+        # Where the rays at the given positions meet the line through a segment
+        ray_origin, ray_dir = self.get_rays(positions)
+        distances = _get_line_distances(ray_origin, ray_dir, self.line_p1[segment], self.line_p2[segment])
+        return ray_origin + ray_dir * distances[:, None]
+
+    def get_outline(self) -> numpy.ndarray:
+        # Where the rays at the ends of each interval stop, in order, intervals that hit no segment are left out
+        points = [self.get_hits(numpy.array([start, end]), segment)
+                  for start, end, segment in zip(self.boundaries[:-1], self.boundaries[1:], self.segments) if segment >= 0]
+        return numpy.concatenate(points) if len(points) > 0 else numpy.empty((0, 2))
+
+
+class Visibility(SegmentSweep):
+    """
+    What a point light sees of a set of line segments within an angular window, rays are told apart by their angle
+    """
+
+    def __init__(
+            self,
+            origin: numpy.ndarray,
+            line_p1: numpy.ndarray,
+            line_p2: numpy.ndarray,
+            start_angle: float,
+            end_angle: float,
+            critical_points=None,
+            circles=None,
+            start_line=None,
+            cast_other=None
+    ):
+        self.origin = numpy.array(origin, dtype=float)
+        self.start_angle = start_angle
+        self.spread = min(end_angle - start_angle, 2 * numpy.pi)
+        self.start_line = start_line  # Rays start where they cross this line instead of at the origin, like behind a mirror
+        # The nearest segment can change where a segment starts or ends, the sweep adds where segments cross
+        if critical_points is None:
+            critical_points = numpy.concatenate([line_p1, line_p2])
+        critical_positions = self.get_relative_angles(critical_points)
+        if circles is not None:  # Curved geometry can also start or stop being the nearest where a ray touches it
+            critical_positions = numpy.concatenate([critical_positions, self.get_tangent_angles(*circles)])
+        super().__init__(line_p1, line_p2, critical_positions, self.spread, cast_other)
+
+    def _wrap(self, angles: numpy.ndarray) -> numpy.ndarray:
+        # Angles just before the start of the window (by rounding) count as being at its start
+        angles = angles % (2 * numpy.pi)
+        return numpy.where(angles > (self.spread + 2 * numpy.pi) / 2, angles - 2 * numpy.pi, angles)
+
+    def get_relative_angles(self, points: numpy.ndarray) -> numpy.ndarray:
+        # Angles of points around the origin, counted from start_angle
+        return self._wrap(numpy.arctan2(points[:, 1] - self.origin[1], points[:, 0] - self.origin[0]) - self.start_angle)
+
+    def get_point_positions(self, points: numpy.ndarray) -> numpy.ndarray:
+        return self.get_relative_angles(points)
+
+    def _get_ranges(self) -> tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+        # A segment seen across the angle where relative angles wrap around covers the ends of the range
+        segment_indices, low, high = super()._get_ranges()
+        wraps = high - low > numpy.pi
+        wrap_end = (self.spread + 2 * numpy.pi) / 2
+        return (
+            numpy.concatenate([segment_indices[~wraps], segment_indices[wraps], segment_indices[wraps]]),
+            numpy.concatenate([low[~wraps], high[wraps], numpy.full(wraps.sum(), wrap_end - 2 * numpy.pi)]),
+            numpy.concatenate([high[~wraps], numpy.full(wraps.sum(), wrap_end), low[wraps]]),
+        )
+
+    def get_tangent_angles(self, centers: numpy.ndarray, radii: numpy.ndarray) -> numpy.ndarray:
+        offset = centers - self.origin
+        distance = numpy.hypot(offset[:, 0], offset[:, 1])
+        outside = distance > radii
+        angle = numpy.arctan2(offset[outside, 1], offset[outside, 0]) - self.start_angle
+        half_width = numpy.arcsin(radii[outside] / distance[outside])
+        return self._wrap(numpy.concatenate([angle - half_width, angle + half_width]))
+
+    def get_positions(self, ray_origin: numpy.ndarray, ray_dir: numpy.ndarray) -> numpy.ndarray:
+        return self.get_relative_angles(self.origin + ray_dir)  # Rays are taken to leave the origin
+
+    def get_rays(self, positions: numpy.ndarray) -> tuple[numpy.ndarray, numpy.ndarray]:
+        angles = self.start_angle + positions
+        ray_dir = numpy.column_stack([numpy.cos(angles), numpy.sin(angles)])
+        ray_origin = numpy.broadcast_to(self.origin, ray_dir.shape)
+        if self.start_line is None:
+            return ray_origin, ray_dir
+        distances = _get_line_distances(ray_origin, ray_dir, *self.start_line) + START_OFFSET
+        return ray_origin + ray_dir * distances[:, None], ray_dir
+
+    def get_outline(self) -> numpy.ndarray:
+        # Corners of the lit region, starting and ending at the origin
+        return numpy.concatenate([[self.origin], super().get_outline(), [self.origin]])
+
+
+class BeamVisibility(SegmentSweep):
+    """
+    What a beam of parallel rays sees of a set of line segments, rays are told apart by their offset across the beam
+    """
+
+    def __init__(
+            self,
+            center: numpy.ndarray,
+            direction: numpy.ndarray,
+            half_width: float,
+            line_p1: numpy.ndarray,
+            line_p2: numpy.ndarray,
+            critical_points=None,
+            circles=None,
+            start_line=None,
+            cast_other=None
+    ):
+        self.center = numpy.array(center, dtype=float)
+        self.direction = numpy.array(direction, dtype=float)
+        self.across = numpy.array([-self.direction[1], self.direction[0]])
+        self.half_width = half_width
+        self.start_line = start_line  # Rays start where they cross this line instead of across the center, like behind a mirror
+
+        if critical_points is None:
+            # Besides segment ends, segments going through the line the rays start from are cut off there
+            critical_points = numpy.concatenate([
+                line_p1, line_p2, get_line_cuts(line_p1, line_p2, self.center, self.center + self.across),
+            ])
+        critical_positions = self.get_point_positions(critical_points)
+        if circles is not None:  # Curved geometry can also start or stop being the nearest where a ray touches it
+            centers, radii = circles
+            offsets = (centers - self.center) @ self.across + half_width
+            critical_positions = numpy.concatenate([critical_positions, offsets - radii, offsets + radii])
+        super().__init__(line_p1, line_p2, critical_positions, 2 * half_width, cast_other)
+
+    def get_point_positions(self, points: numpy.ndarray) -> numpy.ndarray:
+        return (points - self.center) @ self.across + self.half_width
+
+    def get_positions(self, ray_origin: numpy.ndarray, ray_dir: numpy.ndarray) -> numpy.ndarray:
+        return self.get_point_positions(ray_origin)  # Rays are taken to point along the beam
+
+    def get_rays(self, positions: numpy.ndarray) -> tuple[numpy.ndarray, numpy.ndarray]:
+        ray_origin = self.center + numpy.multiply.outer(positions - self.half_width, self.across)
+        ray_dir = numpy.broadcast_to(self.direction, ray_origin.shape)
+        if self.start_line is None:
+            return ray_origin, ray_dir
+        distances = _get_line_distances(ray_origin, ray_dir, *self.start_line) + START_OFFSET
+        return ray_origin + ray_dir * distances[:, None], ray_dir
@@ -20,13 +20,26 @@ class WorldObject:
         self.rotation_angle: float = rotation_angle
         self.is_interactable: bool = is_interactable
         self.geometry_segments: list[geometry.Geometry] = []
+        self.geometry_handles: list[int] = []  # Handles of geometry_segments in the level's geometry registry
+        self.geometry_registry: geometry.GeometryRegistry | None = None
+        # Geometry relative to the object as it was when captured, moves only change the transform applied to it
+        self._local_points: numpy.ndarray = numpy.zeros((0, 2, 2))
+        self._local_angles: numpy.ndarray = numpy.zeros((0, 2))
+        self._local_normals: numpy.ndarray = numpy.zeros((0, 2))
+        self._local_rotation_angle: float = rotation_angle
+        self.geometry_transform: numpy.ndarray = numpy.array([[1.0, 0.0, position[0]], [0.0, 1.0, position[1]]])
         self.obj_animation: object_animation.ObjectAnimation | None = None
+        self.animation_parameters: tuple[numpy.ndarray, float, float] | None = None  # As passed to create_animation
+        self.half_extents: numpy.ndarray = numpy.zeros(2)  # Of the sprite box, along the object's own axes
 
-        self._sprite_list: arcade.SpriteList = arcade.SpriteList()
+        # Lazy so levels can be built off the main thread, the OpenGL side is created on first draw
+        self._sprite_list: arcade.SpriteList = arcade.SpriteList(lazy=True)
 
     def initialize_sprites(self, sprite_info: tuple, *, dimensions: numpy.ndarray | None = None):
         sprite_path, sprite_scale, sprite_width, sprite_height = sprite_info
-        self._sprite_list = arcade.SpriteList()
+        self._sprite_list = arcade.SpriteList(lazy=True)
+        tiles = numpy.ones(2) if dimensions is None else dimensions
+        self.half_extents = 0.5 * sprite_scale * numpy.array([sprite_width * tiles[0], sprite_height * tiles[1]])
         if dimensions is None:
             self._sprite_list.append(
                 util.load_sprite(
@@ -96,7 +109,30 @@ class WorldObject:
                 geometry.Line(self, self.position - axis1 - axis2, self.position + axis1 + axis2, is_reflective, is_refractive, is_receiver, is_enemy),
                 geometry.Line(self, self.position - axis1 + axis2, self.position + axis1 - axis2, is_reflective, is_refractive, is_receiver, is_enemy),
             ]
-
+        self.capture_geometry()
+
+    def capture_geometry(self):
+        # Must be called after geometry_segments are replaced or edited directly
+        match self.geometry_segments[0] if len(self.geometry_segments) > 0 else None:
+            case geometry.Arc():
+                self._local_points = numpy.array([[arc.center] for arc in self.geometry_segments], dtype=float)
+                self._local_angles = numpy.array(
+                    [(arc._start_angle, arc._end_angle) for arc in self.geometry_segments]) - self.rotation_angle
+            case geometry.Circle():
+                self._local_points = numpy.array([[circle.center] for circle in self.geometry_segments], dtype=float)
+            case geometry.Polygon():  # All polygons of one object have the same number of vertices
+                self._local_points = numpy.array([polygon.vertices for polygon in self.geometry_segments], dtype=float)
+            case _:
+                self._local_points = numpy.array(
+                    [(line._point1, line._point2) for line in self.geometry_segments], dtype=float).reshape(-1, 2, 2)
+                # Normals turn with the object, so they are only normalized once here
+                directions = self._local_points[:, 1] - self._local_points[:, 0]
+                lengths = numpy.hypot(directions[:, 0], directions[:, 1])
+                lengths[lengths == 0] = 1
+                self._local_normals = numpy.stack([-directions[:, 1], directions[:, 0]], axis=1) / lengths[:, None]
+        self._local_points -= self.position
+        self._local_rotation_angle = self.rotation_angle
+        self.update_geometry()
 
     def draw(self):
         self._sprite_list.draw(pixelated=True)
@@ -108,20 +144,54 @@ class WorldObject:
         return util.distance_squared(self.position, numpy.array([point_x, point_y]))
 
     def check_collision_with_point(self, point: numpy.ndarray):
-        for sprite in self._sprite_list:
-            if sprite.collides_with_point(point):
-                return True
-        else:
-            return False
+        # Exact test against the oriented box, without going through every sprite of the object
+        dx, dy = point[0] - self.position[0], point[1] - self.position[1]
+        cos, sin = math.cos(self.rotation_angle), math.sin(self.rotation_angle)
+        return abs(dx * cos + dy * sin) <= self.half_extents[0] and abs(dy * cos - dx * sin) <= self.half_extents[1]
 
     def check_collision_with_sprite(self, sprite: arcade.Sprite):
         return sprite.collides_with_list(self._sprite_list)
 
     def move_geometry(self, move_distance: numpy.ndarray = numpy.zeros(2), rotate_angle: float = 0):
-        for segment in self.geometry_segments:
-            segment.move(self.position, move_distance, rotate_angle=rotate_angle)
         self.position = self.position + move_distance
         self.rotation_angle = self.rotation_angle + rotate_angle
+        self.update_geometry()
+
+    def update_geometry(self):
+        # All segments are transformed at once and written straight into the level's geometry registry
+        angle = self.rotation_angle - self._local_rotation_angle
+        cosine, sine = math.cos(angle), math.sin(angle)
+        self.geometry_transform = numpy.array([[cosine, -sine, self.position[0]], [sine, cosine, self.position[1]]])
+        if len(self.geometry_segments) == 0:
+            return
+        rotation = self.geometry_transform[:, :2].T
+        points = self._local_points @ rotation + self.geometry_transform[:, 2]
+
+        match self.geometry_segments[0]:
+            case geometry.Arc():
+                # Keep the angles within (-PI, PI] like Arc._constrain_angles
+                angles = numpy.pi - (numpy.pi - self._local_angles - self.rotation_angle) % (2 * numpy.pi)
+                for arc, center, (start_angle, end_angle) in zip(self.geometry_segments, points[:, 0], angles):
+                    arc.center, arc._start_angle, arc._end_angle = center, start_angle, end_angle
+                rows = numpy.column_stack([points[:, 0], [arc.radius for arc in self.geometry_segments], angles])
+            case geometry.Circle():
+                for circle, center in zip(self.geometry_segments, points[:, 0]):
+                    circle.center = center
+                rows = numpy.column_stack([points[:, 0], [circle.radius for circle in self.geometry_segments]])
+            case geometry.Polygon():
+                for polygon, vertices in zip(self.geometry_segments, points):
+                    polygon.set_vertices(vertices)
+                rows = numpy.array([polygon.pack() for polygon in self.geometry_segments])
+            case _:
+                normals = self._local_normals @ rotation
+                for line, (point1, point2), normal in zip(self.geometry_segments, points, normals):
+                    line._point1, line._point2 = point1, point2
+                    if line.is_reflective:
+                        line._normal = normal
+                rows = points.reshape(-1, 4)
+
+        if self.geometry_registry is not None:
+            self.geometry_registry.write(self.geometry_handles, rows)
 
     def move_if_safe(
         self,
@@ -158,6 +228,7 @@ class WorldObject:
         return True
 
     def create_animation(self, travel: numpy.ndarray, dt: float = 0.01, angle_travel: float = 0):
+        self.animation_parameters = (travel, dt, angle_travel)
         self.obj_animation = object_animation.ObjectAnimation(
             self.position,
             self.position + travel,
@@ -201,6 +272,83 @@ class Mirror(WorldObject):
             segment.draw(thickness=thickness, color=arcade.color.RED)
 
 
+class OutlinedObject(WorldObject):
+    """
+    World object without a sprite, it is drawn and collided from its own geometry
+    """
+
+    @abstractmethod
+    def get_outline(self) -> numpy.ndarray:
+        # Convex polygon around the object, for collisions
+        pass
+
+    def check_collision_with_sprite(self, sprite: arcade.Sprite):
+        return arcade.are_polygons_intersecting(sprite.get_adjusted_hit_box(), self.get_outline().tolist())
+
+    def move_if_safe(
+        self,
+        character,
+        enemy,
+        move_distance: numpy.ndarray = numpy.zeros(2),
+        rotate_angle: float = 0,
+        ignore_checks: bool = False
+    ) -> bool:
+        # The geometry is moved and checked where it ends up, then moved back if it ran into the gator or the enemy
+        self.move_geometry(move_distance, rotate_angle)
+        if not ignore_checks and (
+                self.check_collision_with_sprite(character.sprite) or (enemy is not None and self.check_collision_with_sprite(enemy.sprite))
+        ):
+            self.move_geometry(-move_distance, -rotate_angle)
+            return False
+        return True
+
+
+class CurvedMirror(OutlinedObject):
+    """
+    Mirror bent along an arc, convex on the side it faces (rotation_angle) and concave on the other
+    """
+
+    def __init__(self, position: numpy.ndarray, rotation_angle: float, radius: float = util.CURVED_MIRROR_RADIUS):
+        super().__init__(position, rotation_angle, is_interactable=True)
+        self.radius = radius
+        # The arc spans the length of a flat mirror and bulges through position
+        self.length = util.MIRROR_SPRITE_INFO[1] * util.MIRROR_SPRITE_INFO[3]
+        self.thickness = util.MIRROR_SPRITE_INFO[1] * util.MIRROR_SPRITE_INFO[2]
+        self.angular_width = 2 * math.asin(min(self.length / (2 * radius), 1))
+        self.geometry_segments = [
+            geometry.Arc(
+                self,
+                position - radius * numpy.array([math.cos(rotation_angle), math.sin(rotation_angle)]),
+                radius,
+                rotation_angle,
+                self.angular_width,
+                is_reflective=True,
+                is_refractive=False,
+            )
+        ]
+        sagitta = radius * (1 - math.cos(self.angular_width / 2))
+        self.half_extents = numpy.array([0.5 * self.thickness + sagitta, 0.5 * self.length])
+        self.capture_geometry()
+
+    def get_outline(self) -> numpy.ndarray:
+        # Outer side of the arc, closed by the chord between the ends of its inner side
+        arc = self.geometry_segments[0]
+        angles = self.rotation_angle + numpy.linspace(-self.angular_width / 2, self.angular_width / 2, 9)
+        directions = numpy.column_stack([numpy.cos(angles), numpy.sin(angles)])
+        return numpy.concatenate([
+            arc.center + (self.radius + self.thickness / 2) * directions,
+            arc.center + (self.radius - self.thickness / 2) * directions[[-1, 0]],
+        ])
+
+    def draw(self):
+        # The arc itself is drawn, a flat sprite would hide where the light is reflected
+        self.geometry_segments[0].draw(color=util.CURVED_MIRROR_COLOR, thickness=self.thickness / 2)
+
+    def draw_outline(self):
+        thickness = int(4 + 2 * math.sin(15 * time.time()))
+        self.geometry_segments[0].draw(color=arcade.color.RED, thickness=(self.thickness + thickness) / 2)
+
+
 class Lens(WorldObject):
     def __init__(self, position: numpy.ndarray, rotation_angle: float):
         super().__init__(position, rotation_angle)
@@ -227,9 +375,64 @@ class Lens(WorldObject):
                 coverage_angle,
             ),
         ]
+        self.capture_geometry()
         self.initialize_sprites(util.LENS_SPRITE_INFO)
 
 
+class Prism(OutlinedObject):
+    """
+    Glass triangle with one corner pointing along rotation_angle, light bends at each face like it does at a lens
+    """
+
+    def __init__(self, position: numpy.ndarray, rotation_angle: float, side_length: float = util.PRISM_SIDE_LENGTH):
+        super().__init__(position, rotation_angle)
+        self.side_length = side_length
+        circumradius = side_length / math.sqrt(3)
+        corner_angles = rotation_angle + numpy.arange(3) * 2 * numpy.pi / 3
+        self.geometry_segments = [
+            geometry.Polygon(
+                self,
+                position + circumradius * numpy.column_stack([numpy.cos(corner_angles), numpy.sin(corner_angles)]),
+                is_refractive=True,
+            )
+        ]
+        self.half_extents = numpy.full(2, circumradius)
+        self.capture_geometry()
+
+    def draw(self):
+        # There is no prism sprite, the glass is drawn from its geometry
+        vertices = self.geometry_segments[0].vertices.tolist()
+        arcade.draw_polygon_filled(vertices, util.GLASS_COLOR)
+        arcade.draw_polygon_outline(vertices, util.GLASS_OUTLINE_COLOR, line_width=2)
+
+    def get_outline(self) -> numpy.ndarray:
+        return self.geometry_segments[0].vertices
+
+
+class BallLens(OutlinedObject):
+    """
+    Glass sphere, seen from above as a circle that bends light at its surface
+    """
+
+    def __init__(self, position: numpy.ndarray, radius: float = util.BALL_LENS_RADIUS):
+        super().__init__(position, 0)
+        self.radius = radius
+        self.geometry_segments = [geometry.Circle(self, position, radius, is_refractive=True)]
+        self.half_extents = numpy.full(2, radius)
+        self.capture_geometry()
+
+    def draw(self):
+        # There is no ball lens sprite, the glass is drawn from its geometry
+        center = self.geometry_segments[0].center
+        arcade.draw_circle_filled(center[0], center[1], self.radius, util.GLASS_COLOR, num_segments=64)
+        arcade.draw_circle_outline(center[0], center[1], self.radius, util.GLASS_OUTLINE_COLOR, border_width=2,
+                                   num_segments=64)
+
+    def get_outline(self) -> numpy.ndarray:
+        angles = numpy.linspace(0, 2 * numpy.pi, 16, endpoint=False)
+        return self.geometry_segments[0].center + self.radius * numpy.column_stack([numpy.cos(angles), numpy.sin(angles)])
+
+
 class LightSource(WorldObject):
     def __init__(self, position: numpy.ndarray, rotation_angle: float):
         super().__init__(position, rotation_angle)
@@ -237,6 +440,7 @@ class LightSource(WorldObject):
             light.LightRay(numpy.zeros(2), numpy.zeros(2))
             for _ in range(util.NUM_LIGHT_RAYS)
         ]
+        self.refined_rays: list[light.LightRay] = []  # Reused by Level.refine_light_rays
 
     def move(self, move_distance: numpy.ndarray, rotate_angle: float = 0):
         super().move_geometry(move_distance, rotate_angle)
@@ -244,16 +448,36 @@ class LightSource(WorldObject):
         self._sprite_list[0].center_y = self.position[1]
         self.calculate_light_ray_positions()
 
-    def draw(self):
+    def set_ray_count(self, count: int):
+        # Level.raycast spreads the power of the source over however many rays it has
+        del self.light_rays[count:]
+        self.light_rays.extend(light.LightRay(numpy.zeros(2), numpy.zeros(2)) for _ in range(count - len(self.light_rays)))
+        self.calculate_light_ray_positions()
+
+    def draw(self, ray_segments: numpy.ndarray | None = None):
         alpha = int(25 + 15 * math.sin(4 * time.time()))
-        for ray in self.light_rays:
-            ray.draw(alpha)
+        if ray_segments is None:
+            for ray in self.light_rays:
+                ray.draw(alpha)
+        elif len(ray_segments) > 0:
+            points = ray_segments.reshape(-1, 2)
+            for line_width in (6, 4, 3):
+                arcade.draw_lines(points, (255, 255, 255, alpha), line_width)
         super().draw()
 
     @abstractmethod
     def calculate_light_ray_positions(self):
         pass
 
+    @abstractmethod
+    def get_ray_positions(self) -> numpy.ndarray:
+        # Where the rays of calculate_light_ray_positions leave the source, from 0 to 1 across it
+        pass
+
+    @abstractmethod
+    def aim_light_ray(self, light_ray: light.LightRay, position: float):
+        pass
+
 
 class RadialLightSource(LightSource):
     def __init__(self, position: numpy.ndarray, rotation_angle: float, angular_spread: float):
@@ -272,6 +496,14 @@ class RadialLightSource(LightSource):
             self.light_rays[n].origin = self.position
             self.light_rays[n].direction = ray_direction
 
+    def get_ray_positions(self) -> numpy.ndarray:
+        return numpy.arange(len(self.light_rays)) / len(self.light_rays)
+
+    def aim_light_ray(self, light_ray: light.LightRay, position: float):
+        ray_angle = self.rotation_angle + self._angular_spread * (0.5 - position)
+        light_ray.origin = self.position
+        light_ray.direction = numpy.array([math.cos(ray_angle), math.sin(ray_angle)])
+
 
 class ParallelLightSource(LightSource):
     def __init__(self, position: numpy.ndarray, rotation_angle: float):
@@ -293,10 +525,20 @@ class ParallelLightSource(LightSource):
         for n in range(num_rays):
             self.light_rays[n].origin = (
                 self.position
-                - spread_direction * (self.width * (n / (util.NUM_LIGHT_RAYS - 1) - 0.5))
+                - spread_direction * (self.width * (n / (num_rays - 1) - 0.5))
             )
             self.light_rays[n].direction = ray_direction
 
+    def get_ray_positions(self) -> numpy.ndarray:
+        return numpy.arange(len(self.light_rays)) / max(len(self.light_rays) - 1, 1)
+
+    def aim_light_ray(self, light_ray: light.LightRay, position: float):
+        light_ray.origin = self.position - self.width * (position - 0.5) * numpy.array([
+            math.cos(self.rotation_angle + numpy.pi / 2),
+            math.sin(self.rotation_angle + numpy.pi / 2),
+        ])
+        light_ray.direction = numpy.array([math.cos(self.rotation_angle), math.sin(self.rotation_angle)])
+
 
 class LightReceiver(WorldObject):
     def __init__(self, position: numpy.ndarray, rotation_angle: float, planet: str = "moon"):
@@ -315,11 +557,13 @@ class LightReceiver(WorldObject):
         self.planet = planet
         self.charge = 0
 
-    def draw(self):
-        # color = min(255 * self.charge / util.RECEIVER_THRESHOLD, 255)
-        color = max(255 * (1.0 - self.charge / util.RECEIVER_THRESHOLD), 0)
+    def draw(self, charge: float | None = None):
+        if charge is None:
+            charge = self.charge
+        # color = min(255 * charge / util.RECEIVER_THRESHOLD, 255)
+        color = max(255 * (1.0 - charge / util.RECEIVER_THRESHOLD), 0)
 
-        if self.charge >= util.RECEIVER_THRESHOLD - 0.01:
+        if charge >= util.RECEIVER_THRESHOLD - 0.01:
             self._sprite_list[0].visible = False
             self._sprite_list[1].visible = True
 
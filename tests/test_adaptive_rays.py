@@ -0,0 +1,50 @@
+import math
+
+import pytest
+
+from illumigator import level, util
+
+
+def get_charge(traced_level: level.Level, adaptive_rays: bool, monkeypatch) -> float:
+    monkeypatch.setattr(util, "ADAPTIVE_RAYS", adaptive_rays)
+    light_receiver = traced_level.light_receiver_list[0]
+    light_receiver.charge = 0
+    traced_level.raycast(False)
+    return light_receiver.charge
+
+
+def test_refined_rays_only_go_between_rays_that_take_different_paths():
+    # A radial source half on a receiver, half past it
+    traced_level = level.Level(
+        light_source_coordinate_list=[[300, 360, 0, 0.5]],
+        light_receiver_coordinate_list=[[700, 400, 0]],
+        gator_coordinates=[100, 650],
+    )
+    traced_level.raycast(False)
+    light_source = traced_level.light_source_list[0]
+    positions = light_source.get_ray_positions()
+    paths = [ray.get_path() for ray in light_source.light_rays]
+    differing = [(positions[i], positions[i + 1]) for i in range(len(paths) - 1) if paths[i] != paths[i + 1]]
+    assert len(differing) > 0
+
+    refined_count = traced_level.refine_light_rays(light_source, False)
+    assert refined_count > 0
+    for ray in light_source.refined_rays[:refined_count]:
+        angle = math.atan2(ray.direction[1], ray.direction[0])
+        position = 0.5 - (angle - light_source.rotation_angle) / light_source._angular_spread
+        assert any(start < position < end for start, end in differing)
+
+
+def test_charge_is_unchanged_when_no_rays_are_refined(monkeypatch):
+    # A narrow radial source whose rays all end on the same segment of the receiver
+    traced_level = level.Level(
+        light_source_coordinate_list=[[300, 371, 0, 0.02]],
+        light_receiver_coordinate_list=[[700, 360, 0]],
+        gator_coordinates=[100, 650],
+    )
+    traced_level.raycast(False)
+    assert traced_level.refine_light_rays(traced_level.light_source_list[0], True) == 0
+
+    plain = get_charge(traced_level, False, monkeypatch)
+    assert plain > 0
+    assert get_charge(traced_level, True, monkeypatch) == pytest.approx(plain)
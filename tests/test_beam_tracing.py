@@ -0,0 +1,48 @@
+import math
+
+import pytest
+
+from illumigator import level, util
+
+DENSE_RAY_COUNT = 20000
+
+
+def get_charges(traced_level: level.Level, beam_tracing: bool, ray_count: int, monkeypatch) -> list[float]:
+    # Charges in rays' worth of light, from beams or from rays sampled ray_count per source
+    monkeypatch.setattr(util, "BEAM_TRACING", beam_tracing)
+    for light_receiver in traced_level.light_receiver_list:
+        light_receiver.charge = 0
+    for light_source in traced_level.light_source_list:
+        light_source.set_ray_count(ray_count)
+    traced_level.raycast(False)
+    return [light_receiver.charge / util.LIGHT_INCREMENT for light_receiver in traced_level.light_receiver_list]
+
+
+def make_level(**world_objects) -> level.Level:
+    # A radial source lights a mirror that throws part of the light onto a receiver below it
+    return level.Level(
+        light_source_coordinate_list=[[300, 360, 0, 0.5]],
+        mirror_coordinate_list=[[640, 360, math.pi / 4 + 0.05]],
+        light_receiver_coordinate_list=[[660, 120, 0]],
+        gator_coordinates=[100, 650],
+        **world_objects
+    )
+
+
+def test_beams_give_the_power_of_dense_sampling_through_mirrors(monkeypatch):
+    traced_level = make_level()
+    sampled = get_charges(traced_level, False, util.NUM_LIGHT_RAYS, monkeypatch)
+    dense = get_charges(traced_level, False, DENSE_RAY_COUNT, monkeypatch)
+    beams = get_charges(traced_level, True, util.NUM_LIGHT_RAYS, monkeypatch)
+    assert 0 < dense[0] < util.NUM_LIGHT_RAYS  # The receiver is only partly lit
+    assert abs(sampled[0] - dense[0]) > 0.5
+    assert beams[0] == pytest.approx(dense[0], abs=0.01)
+
+
+def test_light_handed_over_to_rays_is_sampled_densely(monkeypatch):
+    # A lens between the mirror and the receiver, its light is followed by sampled rays
+    traced_level = make_level(lens_coordinate_list=[[640, 200, 0]])
+    sampled = get_charges(traced_level, False, util.NUM_LIGHT_RAYS, monkeypatch)
+    dense = get_charges(traced_level, False, DENSE_RAY_COUNT, monkeypatch)
+    beams = get_charges(traced_level, True, util.NUM_LIGHT_RAYS, monkeypatch)
+    assert abs(beams[0] - dense[0]) < abs(sampled[0] - dense[0]) / 10
@@ -0,0 +1,107 @@
+import types
+
+import numpy
+import pytest
+
+from illumigator import geometry
+
+
+def make_line(x: float) -> geometry.Line:
+    return geometry.Line(None, numpy.array([x, 0.0]), numpy.array([x, 1.0]))
+
+
+def make_object(*xs: float):
+    # Stand-in for a world object, the registry only uses these attributes
+    return types.SimpleNamespace(geometry_segments=[make_line(x) for x in xs], geometry_handles=[], geometry_registry=None)
+
+
+def assert_consistent(registry: geometry.GeometryRegistry):
+    # Every handle leads to its segment, and the packed rows follow the segment order
+    assert len(registry.data) == len(registry)
+    for index, segment in enumerate(registry):
+        numpy.testing.assert_array_equal(registry.data[index], segment.pack())
+    for handle, index in registry._indices.items():
+        assert registry.get(handle) is registry[index]
+        assert registry.get_index(handle) == index
+
+
+def test_add_hands_out_distinct_handles():
+    registry = geometry.GeometryRegistry(geometry.Line.PACKED_WIDTH)
+    lines = [make_line(x) for x in range(40)]  # Past the initial capacity of the packed array
+    handles = registry.extend(lines)
+    assert len(set(handles)) == len(lines)
+    assert [registry.get(handle) for handle in handles] == lines
+    assert_consistent(registry)
+
+
+def test_handles_stay_valid_after_removal():
+    registry = geometry.GeometryRegistry(geometry.Line.PACKED_WIDTH)
+    lines = [make_line(x) for x in range(6)]
+    handles = registry.extend(lines)
+    for removed in (handles[0], handles[3], handles[5]):
+        registry.remove(removed)
+    assert len(registry) == 3
+    for handle, line in zip(handles, lines):
+        if handle in (handles[0], handles[3], handles[5]):
+            with pytest.raises(KeyError):
+                registry.get(handle)
+        else:
+            assert registry.get(handle) is line
+    assert_consistent(registry)
+
+
+def test_remove_last_and_add_again():
+    registry = geometry.GeometryRegistry(geometry.Line.PACKED_WIDTH)
+    first, last = registry.extend([make_line(0), make_line(1)])
+    registry.remove(last)
+    handle = registry.add(make_line(2))
+    assert handle not in (first, last)
+    assert registry.get(handle).pack()[0] == 2
+    assert_consistent(registry)
+
+
+def test_write_updates_packed_rows():
+    registry = geometry.GeometryRegistry(geometry.Line.PACKED_WIDTH)
+    handles = registry.extend([make_line(0), make_line(1), make_line(2)])
+    registry.write([handles[2], handles[0]], numpy.array([[5.0, 5.0, 6.0, 6.0], [7.0, 7.0, 8.0, 8.0]]))
+    numpy.testing.assert_array_equal(registry.data[registry.get_index(handles[2])], [5, 5, 6, 6])
+    numpy.testing.assert_array_equal(registry.data[registry.get_index(handles[0])], [7, 7, 8, 8])
+
+
+def test_attach_and_detach():
+    registry = geometry.GeometryRegistry(geometry.Line.PACKED_WIDTH)
+    other, world_object = make_object(0), make_object(1, 2)
+    registry.attach(other)
+    registry.attach(world_object)
+    assert world_object.geometry_registry is registry
+    assert [registry.get(handle) for handle in world_object.geometry_handles] == world_object.geometry_segments
+
+    registry.detach(world_object)
+    assert world_object.geometry_handles == [] and world_object.geometry_registry is None
+    assert list(registry) == other.geometry_segments
+    assert_consistent(registry)
+
+
+def test_transfer_keeps_handles_and_order():
+    registry = geometry.GeometryRegistry(geometry.Line.PACKED_WIDTH)
+    before, old, after = make_object(0), make_object(1, 2), make_object(3)
+    for world_object in (before, old, after):
+        registry.attach(world_object)
+    handles = old.geometry_handles
+    new = make_object(10, 20)
+
+    registry.transfer(old, new)
+    assert new.geometry_handles == handles and new.geometry_registry is registry
+    assert old.geometry_handles == [] and old.geometry_registry is None
+    assert list(registry) == before.geometry_segments + new.geometry_segments + after.geometry_segments
+    assert_consistent(registry)
+
+
+def test_transfer_rejects_a_different_segment_count():
+    registry = geometry.GeometryRegistry(geometry.Line.PACKED_WIDTH)
+    old = make_object(1, 2)
+    registry.attach(old)
+    with pytest.raises(ValueError):
+        registry.transfer(old, make_object(1, 2, 3))
+    assert old.geometry_registry is registry
+    assert_consistent(registry)
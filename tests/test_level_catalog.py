@@ -0,0 +1,14 @@
+from illumigator import level_catalog
+
+
+def test_stats_of_given_files_only():
+    catalog = level_catalog.LevelCatalog(":memory:")
+    catalog.upsert([
+        ("a.json", 1.0, 10, "A", "moon"),
+        ("b.json", 2.0, 20, "B", "mars"),
+        ("c.ilvl", 3.0, 30, "C", "earth"),
+    ])
+    assert catalog.get_stats(["b.json", "c.ilvl", "missing.json"]) == {"b.json": (2.0, 20), "c.ilvl": (3.0, 30)}
+    assert catalog.get_stats([]) == {}
+    assert len(catalog.get_stats()) == 3
+    catalog.close()
@@ -0,0 +1,128 @@
+import io
+import json
+
+import numpy
+import pytest
+
+from illumigator import level_format
+
+
+LEVEL = {
+    "level_name": "Round \"Trip\" é",
+    "planet": "mars",
+    "level_data": {
+        "mirror_coordinate_list": [[140, 580, -0.785398163397], [340, 180, 1.57079632679]],
+        "wall_coordinate_list": [[340, 540, 1, 7, 0]],
+        "light_receiver_coordinate_list": [[1180, 620, 0]],
+        # Ragged: a parallel source and a radial source with an angular spread
+        "light_source_coordinate_list": [[140, 60, 1.57079632679], [300, 60, 0.5, 1.2]],
+        "animated_wall_coordinate_list": [],
+        "lens_coordinate_list": [],
+        "gator_coordinates": [640, 360],
+        "enemy_coordinates": [],
+    },
+}
+
+
+def assert_same_level(loaded: dict, expected: dict):
+    assert loaded["level_name"] == expected["level_name"]
+    assert loaded["planet"] == expected["planet"]
+    assert loaded["level_data"].keys() == expected["level_data"].keys()
+    for key, coordinates in expected["level_data"].items():
+        rows = loaded["level_data"][key]
+        assert len(rows) == len(coordinates), key
+        if len(coordinates) == 0:
+            continue
+        if isinstance(coordinates[0], list):
+            for row, expected_row in zip(rows, coordinates):
+                numpy.testing.assert_array_equal(numpy.asarray(row), expected_row)
+        else:
+            numpy.testing.assert_array_equal(numpy.asarray(rows), coordinates)
+
+
+def test_binary_round_trip(tmp_path):
+    path = tmp_path / "level.ilvl"
+    with open(path, "wb") as file:
+        level_format.write_binary_level(LEVEL, file)
+    assert_same_level(level_format.load_binary_level(str(path)), LEVEL)
+
+
+def test_binary_round_trip_of_empty_level(tmp_path):
+    level = {"level_name": "Empty", "planet": "moon", "level_data": {"mirror_coordinate_list": []}}
+    path = tmp_path / "empty.ilvl"
+    with open(path, "wb") as file:
+        level_format.write_binary_level(level, file)
+    assert_same_level(level_format.load_binary_level(str(path)), level)
+
+
+def test_binary_data_is_aligned():
+    buffer = io.BytesIO()
+    level_format.write_binary_level(LEVEL, buffer)
+    _, data_start = level_format._read_header(io.BytesIO(buffer.getvalue()))
+    assert data_start % level_format._ALIGNMENT == 0
+
+
+def test_load_rejects_other_files(tmp_path):
+    path = tmp_path / "level.ilvl"
+    path.write_bytes(b"not a level at all")
+    with pytest.raises(ValueError):
+        level_format.load_binary_level(str(path))
+
+
+def test_convert_level(tmp_path):
+    json_path = tmp_path / "level.json"
+    json_path.write_text(json.dumps(LEVEL))
+    binary_path = level_format.convert_level(str(json_path))
+    assert binary_path == str(tmp_path / "level.ilvl")
+    assert level_format.is_binary_level(binary_path)
+    assert_same_level(level_format.load_binary_level(binary_path), LEVEL)
+
+
+def test_convert_level_to_given_path(tmp_path):
+    json_path = tmp_path / "level.json"
+    json_path.write_text(json.dumps(LEVEL))
+    binary_path = tmp_path / "other" / "compiled.ilvl"
+    binary_path.parent.mkdir()
+    assert level_format.convert_level(str(json_path), str(binary_path)) == str(binary_path)
+    assert_same_level(level_format.load_binary_level(str(binary_path)), LEVEL)
+
+
+def test_json_header_is_read_without_level_data(tmp_path):
+    path = tmp_path / "level.json"
+    path.write_text(json.dumps(LEVEL))
+    assert level_format._read_json_header(str(path)) == {"level_name": LEVEL["level_name"], "planet": LEVEL["planet"]}
+
+
+def test_json_header_falls_back_when_fields_come_last(tmp_path):
+    path = tmp_path / "level.json"
+    path.write_text(json.dumps({"level_data": LEVEL["level_data"], "planet": "moon", "level_name": "Last"}))
+    assert level_format._read_json_header(str(path)) == {"level_name": "Last", "planet": "moon"}
+
+
+def test_json_header_ignores_fields_inside_level_data(tmp_path):
+    path = tmp_path / "level.json"
+    path.write_text('{"level_name": "Outer", "planet": "earth", "level_data": {"planet": "inner"}}')
+    assert level_format._read_json_header(str(path)) == {"level_name": "Outer", "planet": "earth"}
+
+
+def test_binary_header_is_read(tmp_path):
+    json_path = tmp_path / "level.json"
+    json_path.write_text(json.dumps(LEVEL))
+    binary_path = level_format.convert_level(str(json_path))
+    assert level_format.read_level_header(binary_path) == {"level_name": LEVEL["level_name"], "planet": LEVEL["planet"]}
+
+
+def test_json_round_trip(tmp_path):
+    path = tmp_path / "level.json"
+    with open(path, "w") as file:
+        level_format.write_json_level(LEVEL, file)
+    with open(path) as file:
+        assert_same_level(json.load(file), LEVEL)
+
+
+def test_json_header_is_read_from_written_level(tmp_path):
+    # The name and planet are written first, so the header is found without parsing the level data
+    path = tmp_path / "level.json"
+    with open(path, "w") as file:
+        level_format.write_json_level(LEVEL, file)
+    assert level_format._read_json_header(str(path)) == {"level_name": LEVEL["level_name"], "planet": LEVEL["planet"]}
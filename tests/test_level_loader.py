@@ -0,0 +1,19 @@
+from illumigator import level
+
+
+def test_preloaded_level_is_built_on_the_worker():
+    loader = level.LevelLoader()
+    loader.preload("level_1.json", True, 0)
+    future = loader.get_pending("level_1.json", True)
+    loaded_level = loader.load("level_1.json", True, 0)
+    assert future.done() and future.result() is loaded_level
+    assert loaded_level.gator.player is None  # The audio player is only made on the main thread once the gator walks
+    loader.shutdown()
+
+
+def test_shutdown_drops_pending_levels():
+    loader = level.LevelLoader()
+    loader.preload("level_1.json", True, 0)
+    loader.preload("level_2.json", True, 0)
+    loader.shutdown()
+    assert loader.get_pending("level_2.json", True) is None
@@ -0,0 +1,14 @@
+import pytest
+
+from illumigator import level, level_solver, util
+
+
+@pytest.mark.parametrize("level_number", [1, 2, 3])
+def test_solver_solves_official_levels(level_number):
+    # Levels 4 and 5 are not found yet: their mirror chains need angles within a few thousandths of a radian
+    official_level = level.load_level(util.load_data(f"level_{level_number}.json", True, True), 0)
+    result = level_solver.solve(level_solver.extract_state(official_level), 0)
+    assert result is not None
+    assert result["solvable"]
+    assert result["steady_charge"] >= util.RECEIVER_THRESHOLD
+    assert len(result["mirror_angles"]) == len(official_level.mirror_list + official_level.curved_mirror_list)
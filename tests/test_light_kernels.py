@@ -0,0 +1,219 @@
+import math
+
+import numpy
+import pytest
+
+from illumigator import geometry, level_solver, light, util
+
+
+def random_rays(count: int, seed: int) -> tuple[numpy.ndarray, numpy.ndarray]:
+    rng = numpy.random.default_rng(seed)
+    origins = rng.uniform(-100, 100, (count, 2))
+    angles = rng.uniform(-numpy.pi, numpy.pi, count)
+    return origins, numpy.column_stack([numpy.cos(angles), numpy.sin(angles)])
+
+
+def march(origins: numpy.ndarray, directions: numpy.ndarray, is_inside, step: float = 0.01, length: float = 400) -> numpy.ndarray:
+    # Brute-force reference: first distance along each ray where it goes into or out of the shape
+    t = numpy.arange(0, length, step)
+    points = origins[:, None, :] + directions[:, None, :] * t[None, :, None]
+    inside = is_inside(points)
+    changes = inside[:, 1:] != inside[:, :1]
+    return numpy.where(changes.any(axis=1), t[1:][numpy.argmax(changes, axis=1)], numpy.inf)
+
+
+def is_inside_polygon(points: numpy.ndarray, vertices: numpy.ndarray) -> numpy.ndarray:
+    # Even-odd rule, counts the edges crossed by a horizontal line from each point
+    inside = numpy.zeros(points.shape[:-1], dtype=bool)
+    x, y = points[..., 0], points[..., 1]
+    for (x1, y1), (x2, y2) in zip(vertices, numpy.roll(vertices, -1, axis=0)):
+        if y1 == y2:
+            continue
+        crosses = ((y1 > y) != (y2 > y)) & (x < x1 + (y - y1) * (x2 - x1) / (y2 - y1))
+        inside ^= crosses
+    return inside
+
+
+def angle_between(a: numpy.ndarray, b: numpy.ndarray) -> float:
+    return math.atan2(a[0] * b[1] - a[1] * b[0], a @ b)
+
+
+def test_circle_raycast_matches_marching():
+    centers = numpy.array([[0.0, 0.0], [50.0, -30.0], [-60.0, 40.0]])
+    radii = numpy.array([30.0, 15.0, 25.0])
+    origins, directions = random_rays(200, 1)
+    distances, indices = light.get_circle_raycast_results(origins, directions, centers, radii)
+
+    def inside_circles(points):
+        offsets = points[:, :, None, :] - centers[None, None, :, :]
+        return numpy.hypot(offsets[..., 0], offsets[..., 1]) < radii
+
+    # Each circle on its own, so the first crossing of each can be compared
+    for index in range(len(centers)):
+        reference = march(origins, directions, lambda points: inside_circles(points)[..., index])
+        own_distances, _ = light.get_circle_raycast_results(origins, directions, centers[index:index + 1], radii[index:index + 1])
+        hit = numpy.isfinite(reference)
+        numpy.testing.assert_array_equal(numpy.isfinite(own_distances), hit)
+        numpy.testing.assert_allclose(own_distances[hit], reference[hit], atol=0.02)
+    assert numpy.isfinite(distances).any()
+    hit_points = origins + directions * numpy.where(numpy.isfinite(distances), distances, 0)[:, None]
+    on_circle = numpy.isfinite(distances)
+    numpy.testing.assert_allclose(
+        numpy.hypot(*(hit_points[on_circle] - centers[indices[on_circle]]).T), radii[indices[on_circle]], atol=1e-9)
+
+
+def test_circle_raycast_from_inside_hits_on_the_way_out():
+    distances, _ = light.get_circle_raycast_results(
+        numpy.array([[0.0, 0.0], [5.0, 0.0]]), numpy.array([[1.0, 0.0], [-1.0, 0.0]]),
+        numpy.array([[0.0, 0.0]]), numpy.array([10.0]))
+    numpy.testing.assert_allclose(distances, [10.0, 15.0])
+
+
+@pytest.mark.parametrize("vertices", [
+    numpy.array([[-30.0, -20.0], [40.0, -25.0], [10.0, 45.0]]),  # Counterclockwise triangle
+    numpy.array([[-20.0, -20.0], [-20.0, 20.0], [20.0, 20.0], [20.0, -20.0]]),  # Clockwise square
+])
+def test_polygon_raycast_matches_marching(vertices):
+    polygon = geometry.Polygon(None, vertices)
+    origins, directions = random_rays(200, 2)
+    edge_p1, edge_p2 = polygon.get_edges()
+    distances, polygon_indices, edge_indices = light.get_polygon_raycast_results(
+        origins, directions, edge_p1, edge_p2, numpy.zeros(len(vertices), dtype=int))
+
+    reference = march(origins, directions, lambda points: is_inside_polygon(points, vertices))
+    hit = numpy.isfinite(reference)
+    numpy.testing.assert_array_equal(numpy.isfinite(distances), hit)
+    numpy.testing.assert_allclose(distances[hit], reference[hit], atol=0.02)
+    assert (polygon_indices == 0).all()
+
+    # Normals point out of the polygon whatever the order of its vertices
+    midpoints = (edge_p1 + edge_p2) / 2
+    assert not is_inside_polygon(midpoints + polygon.normals, vertices).any()
+    assert is_inside_polygon(midpoints - polygon.normals, vertices).all()
+
+
+def test_reflection_off_circle_mirrors_about_the_tangent():
+    circle = geometry.Circle(None, numpy.array([0.0, 0.0]), 20.0, is_reflective=True)
+    origins = numpy.column_stack([numpy.full(9, -50.0), numpy.linspace(-18, 18, 9)])
+    directions = numpy.tile([1.0, 0.0], (9, 1))
+    distances, _ = light.get_circle_raycast_results(origins, directions, circle.center[None], numpy.array([circle.radius]))
+    for origin, direction, distance in zip(origins, directions, distances):
+        end = origin + direction * distance
+        reflected = geometry.reflect(direction, circle.get_normal(end))
+        # The angle of incidence equals the angle of reflection about the tangent at the hit point
+        tangent_angle = math.atan2(end[0], -end[1])
+        expected_angle = 2 * tangent_angle - math.atan2(direction[1], direction[0])
+        numpy.testing.assert_allclose(reflected, [math.cos(expected_angle), math.sin(expected_angle)], atol=1e-9)
+        assert reflected @ circle.get_normal(end) > 0  # Sent back out of the circle
+
+
+def test_polygon_refraction_follows_the_game_angle_law():
+    # The game bends light by dividing the angle to the normal by the index of refraction on the way in, and
+    # multiplying it on the way out. Close to the normal that is Snell's law.
+    polygon = geometry.Polygon(None, numpy.array([[0.0, -50.0], [100.0, -50.0], [100.0, 50.0], [0.0, 50.0]]))
+    face_normal = polygon.normals[numpy.argmin(polygon.normals[:, 0])]
+    numpy.testing.assert_allclose(face_normal, [-1.0, 0.0], atol=1e-12)
+    for incidence in numpy.linspace(-1.2, 1.2, 13):
+        direction = numpy.array([math.cos(incidence), math.sin(incidence)])
+        entering = geometry.refract(direction, face_normal)
+        refraction = angle_between(-face_normal, entering)
+        assert refraction == pytest.approx(incidence / util.INDEX_OF_REFRACTION, abs=1e-9)
+        # Out through the parallel face, the ray leaves in the direction it came in
+        leaving = geometry.refract(entering, -face_normal)
+        numpy.testing.assert_allclose(leaving, direction, atol=1e-9)
+
+    incidence = 0.02
+    entering = geometry.refract(numpy.array([math.cos(incidence), math.sin(incidence)]), face_normal)
+    snell = math.asin(math.sin(incidence) / util.INDEX_OF_REFRACTION)
+    assert angle_between(-face_normal, entering) == pytest.approx(snell, rel=1e-3)
+
+
+def test_wide_arc_is_hit_only_where_it_covers():
+    # Wider than PI and turned so that it wraps around the negative x axis with both end angles below zero
+    rotation_angle, angular_width = numpy.pi / 2 + 0.3, 1.5 * numpy.pi
+    arc = geometry.Arc(None, numpy.array([0.0, 0.0]), 10.0, rotation_angle, angular_width)
+    assert arc._start_angle > arc._end_angle
+    angles = numpy.linspace(-numpy.pi, numpy.pi, 361)[:-1] + 0.001
+    origins = numpy.zeros((len(angles), 2))
+    directions = numpy.column_stack([numpy.cos(angles), numpy.sin(angles)])
+    distances, _ = light.get_arc_raycast_results(
+        origins[:, 0], origins[:, 1], directions[:, 0], directions[:, 1],
+        *(numpy.array([value]) for value in arc.pack()))
+
+    covered = numpy.abs((angles - rotation_angle + numpy.pi) % (2 * numpy.pi) - numpy.pi) < angular_width / 2
+    numpy.testing.assert_array_equal(numpy.isfinite(distances), covered)
+    numpy.testing.assert_allclose(distances[covered], 10.0)
+
+
+def test_arc_cannot_close_into_a_circle():
+    with pytest.raises(ValueError):
+        geometry.Arc(None, numpy.zeros(2), 10.0, 0, 2 * numpy.pi)
+
+
+def make_state(line_p1, line_p2, ray_origin, ray_dir, polygons=(), circles=(), arcs=()) -> dict:
+    # Plain arrays like level_solver.extract_state builds from a level
+    lines = len(line_p1)
+    edge_p1, edge_p2 = (numpy.concatenate(edges).reshape(-1, 2) for edges in
+                        zip(*(polygon.get_edges() for polygon in polygons))) if polygons else (numpy.zeros((0, 2)),) * 2
+    edge_polygons = [polygon for polygon in polygons for _ in polygon.vertices]
+    return {
+        "line_p1": numpy.asarray(line_p1, dtype=float), "line_p2": numpy.asarray(line_p2, dtype=float),
+        "line_reflective": numpy.zeros(lines, dtype=bool), "line_receiver": numpy.full(lines, -1),
+        "line_mirror": numpy.full(lines, -1), "line_animation": numpy.full(lines, -1),
+        "animations": numpy.zeros((0, 11)),
+        "arc_center": numpy.array([arc.center for arc in arcs], dtype=float).reshape(-1, 2),
+        "arc_radius": numpy.array([arc.radius for arc in arcs], dtype=float),
+        "arc_angles": numpy.array([(arc._start_angle, arc._end_angle) for arc in arcs], dtype=float).reshape(-1, 2),
+        "arc_reflective": numpy.array([arc.is_reflective for arc in arcs], dtype=bool),
+        "arc_refractive": numpy.array([arc.is_refractive for arc in arcs], dtype=bool),
+        "arc_mirror": numpy.full(len(arcs), -1),
+        "circle_center": numpy.array([circle.center for circle in circles], dtype=float).reshape(-1, 2),
+        "circle_radius": numpy.array([circle.radius for circle in circles], dtype=float),
+        "circle_reflective": numpy.array([circle.is_reflective for circle in circles], dtype=bool),
+        "circle_refractive": numpy.array([circle.is_refractive for circle in circles], dtype=bool),
+        "edge_p1": edge_p1, "edge_p2": edge_p2,
+        "edge_normals": numpy.array([normal for polygon in polygons for normal in polygon.normals]).reshape(-1, 2),
+        "edge_reflective": numpy.array([polygon.is_reflective for polygon in edge_polygons], dtype=bool),
+        "edge_refractive": numpy.array([polygon.is_refractive for polygon in edge_polygons], dtype=bool),
+        "mirror_positions": numpy.zeros((0, 2)), "mirror_angles": numpy.zeros(0), "mirror_curved": numpy.zeros(0, dtype=bool),
+        "ray_origin": numpy.asarray(ray_origin, dtype=float), "ray_dir": numpy.asarray(ray_dir, dtype=float),
+        "receiver_count": 0, "receiver_positions": numpy.zeros((0, 2)), "lens_positions": numpy.zeros((0, 2)),
+    }
+
+
+def test_solver_traces_through_a_glass_slab():
+    slab = geometry.Polygon(None, numpy.array([[0.0, -50.0], [40.0, -50.0], [40.0, 50.0], [0.0, 50.0]]), is_refractive=True)
+    direction = numpy.array([math.cos(0.5), math.sin(0.5)])
+    state = make_state([[200.0, -500.0]], [[200.0, 500.0]], [[-50.0, -30.0]], [direction], polygons=[slab])
+    _, segments, _ = level_solver.trace(state, numpy.zeros(0))
+
+    assert len(segments) == 3  # Into the slab, across it and on to the wall behind it
+    inside = segments[1, 2:] - segments[1, :2]
+    assert angle_between(numpy.array([1.0, 0.0]), inside) == pytest.approx(0.5 / util.INDEX_OF_REFRACTION, abs=1e-6)
+    leaving = segments[2, 2:] - segments[2, :2]
+    numpy.testing.assert_allclose(leaving / numpy.linalg.norm(leaving), direction, atol=1e-6)
+    assert segments[2, 2] == pytest.approx(200.0)
+
+
+def test_solver_reflects_off_a_mirrored_circle():
+    ball = geometry.Circle(None, numpy.array([0.0, 0.0]), 20.0, is_reflective=True)
+    state = make_state([[-500.0, -500.0]], [[-500.0, 500.0]], [[100.0, 10.0]], [[-1.0, 0.0]], circles=[ball])
+    _, segments, _ = level_solver.trace(state, numpy.zeros(0))
+
+    end = segments[0, 2:]
+    assert numpy.hypot(*end) == pytest.approx(20.0)
+    outgoing = segments[1, 2:] - segments[1, :2]
+    numpy.testing.assert_allclose(outgoing / numpy.linalg.norm(outgoing),
+                                  geometry.reflect(numpy.array([-1.0, 0.0]), ball.get_normal(end)), atol=1e-6)
+
+
+def test_solver_reflects_off_a_mirrored_arc():
+    arc = geometry.Arc(None, numpy.array([0.0, 0.0]), 20.0, 0, numpy.pi / 2, is_reflective=True, is_refractive=False)
+    state = make_state([[-500.0, -500.0]], [[-500.0, 500.0]], [[100.0, 5.0]], [[-1.0, 0.0]], arcs=[arc])
+    _, segments, _ = level_solver.trace(state, numpy.zeros(0))
+
+    end = segments[0, 2:]
+    assert numpy.hypot(*end) == pytest.approx(20.0)
+    outgoing = segments[1, 2:] - segments[1, :2]
+    numpy.testing.assert_allclose(outgoing / numpy.linalg.norm(outgoing),
+                                  geometry.reflect(numpy.array([-1.0, 0.0]), arc.get_normal(end)), atol=1e-6)
@@ -0,0 +1,24 @@
+from illumigator import raycast_governor, util
+
+
+def run(governor: raycast_governor.RaycastGovernor, elapsed: float, frames: int):
+    for _ in range(frames):
+        governor.update(elapsed)
+
+
+def test_governor_steps_down_over_budget_and_back_up_under_it():
+    governor = raycast_governor.RaycastGovernor(budget=0.01)
+    run(governor, 0.02, util.GOVERNOR_SETTLE_FRAMES)
+    assert governor.level == 1
+    assert governor.ray_count < util.NUM_LIGHT_RAYS
+    run(governor, 0.001, util.GOVERNOR_SETTLE_FRAMES)
+    assert governor.level == 0
+    assert governor.ray_count == util.NUM_LIGHT_RAYS
+
+
+def test_governor_keeps_the_bounces_a_level_needs():
+    governor = raycast_governor.RaycastGovernor(budget=0.01, min_generations=15)
+    run(governor, 0.02, util.GOVERNOR_SETTLE_FRAMES * len(governor.LEVELS))
+    assert governor.level == len(governor.LEVELS) - 1
+    assert governor.max_generations == 15
+    assert raycast_governor.RaycastGovernor(min_generations=100).max_generations == util.MAX_GENERATIONS
@@ -0,0 +1,56 @@
+import pytest
+
+from illumigator import level, simulation
+
+
+def make_level() -> level.Level:
+    # A parallel source aimed straight at a receiver, the gator is out of the way
+    return level.Level(
+        light_receiver_coordinate_list=[[1000, 360, 0]],
+        light_source_coordinate_list=[[300, 360, 0]],
+        gator_coordinates=[640, 100],
+    )
+
+
+@pytest.fixture
+def sim():
+    sim = simulation.Simulation()
+    yield sim
+    sim.shutdown()
+
+
+def test_deferred_raycast_leaves_the_level_unchanged():
+    traced_level = make_level()
+    receiver = traced_level.light_receiver_list[0]
+    traced_level.run_raycast(False, defer_effects=True)
+    assert receiver.charge == 0
+    charge_gains, enemy_alerted = traced_level.take_effects()
+    assert charge_gains[receiver] > 0 and not enemy_alerted
+    assert traced_level.take_effects() == ({}, False)
+
+
+def test_charges_are_applied_on_the_main_thread(sim):
+    current_level = make_level()
+    receiver = current_level.light_receiver_list[0]
+    sim.step(current_level, 0)
+    assert receiver.charge == 0  # The worker only collects the charge
+    sim.wait(current_level)
+    assert receiver.charge > 0
+    assert sim.get_charges(current_level) == {receiver: receiver.charge}
+
+
+def test_posts_only_apply_to_their_level(sim):
+    old_level, current_level = make_level(), make_level()
+    applied = []
+    sim.post(old_level, lambda: applied.append(old_level))
+    sim.post(current_level, lambda: applied.append(current_level))
+    sim.step(current_level, 0)
+    assert applied == [current_level]
+
+
+def test_a_raycast_of_a_level_left_behind_is_not_applied(sim):
+    old_level, current_level = make_level(), make_level()
+    sim.step(old_level, 0)
+    sim.wait(current_level)
+    assert old_level.light_receiver_list[0].charge == 0
+    assert sim.get_charges(current_level) == {current_level.light_receiver_list[0]: 0}
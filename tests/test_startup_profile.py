@@ -0,0 +1,28 @@
+from concurrent.futures import Future
+
+from illumigator import util
+
+
+def test_profile_is_complete_once_the_first_frame_is_drawn_and_every_task_is_done(capsys):
+    profile = util.StartupProfile()
+    future = Future()
+    profile.track("first level", future)
+    profile.mark_first_frame()
+    assert not profile.is_complete()
+
+    future.set_result(None)
+    assert profile.is_complete()
+    profile.mark("texture atlas")
+    profile.report()
+    report = capsys.readouterr().out
+    assert "first level (background)" in report
+    assert report.index("first frame") < report.index("texture atlas")
+
+
+def test_first_frame_is_only_marked_once():
+    profile = util.StartupProfile()
+    profile.mark_first_frame()
+    first_frame = profile.first_frame
+    profile.mark_first_frame()
+    assert profile.first_frame == first_frame
+    assert [phase for phase, _ in profile.phases] == ["first frame"]
@@ -0,0 +1,60 @@
+import math
+
+import numpy
+import pytest
+
+from illumigator import light, visibility
+
+
+def random_segments(count: int, seed: int) -> tuple[numpy.ndarray, numpy.ndarray]:
+    # Segments of all lengths in a box, many of them cross each other
+    rng = numpy.random.default_rng(seed)
+    centers = rng.uniform(-300, 300, (count, 2))
+    angles = rng.uniform(0, numpy.pi, count)
+    half_lengths = rng.uniform(5, 120, count)[:, None] * numpy.column_stack([numpy.cos(angles), numpy.sin(angles)])
+    return centers - half_lengths, centers + half_lengths
+
+
+def box_segments(size: float = 400) -> tuple[numpy.ndarray, numpy.ndarray]:
+    corners = numpy.array([[-size, -size], [size, -size], [size, size], [-size, size]])
+    return corners, numpy.roll(corners, -1, axis=0)
+
+
+def assert_same_hits(sweep: visibility.SegmentSweep, ray_origin, ray_dir, line_p1, line_p2):
+    distances, indices = sweep.cast(ray_origin, ray_dir)
+    expected_distances, expected_indices = light.get_line_raycast_results(ray_origin, ray_dir, line_p1, line_p2)
+    numpy.testing.assert_allclose(distances, expected_distances, rtol=1e-9, atol=1e-9)
+    hit = numpy.isfinite(expected_distances)
+    numpy.testing.assert_array_equal(indices[hit], expected_indices[hit])
+
+
+@pytest.mark.parametrize("seed", range(4))
+@pytest.mark.parametrize("start_angle, end_angle", [(-0.6, 0.9), (2.5, 4.0), (0, 2 * numpy.pi)])
+def test_radial_sweep_matches_brute_force(seed, start_angle, end_angle):
+    line_p1, line_p2 = (numpy.concatenate(pair) for pair in zip(random_segments(60, seed), box_segments()))
+    origin = numpy.array([13.0, -21.0])
+    sweep = visibility.Visibility(origin, line_p1, line_p2, start_angle, end_angle)
+
+    angles = numpy.linspace(start_angle, end_angle, 2000)
+    ray_dir = numpy.column_stack([numpy.cos(angles), numpy.sin(angles)])
+    assert_same_hits(sweep, numpy.broadcast_to(origin, ray_dir.shape), ray_dir, line_p1, line_p2)
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_parallel_sweep_matches_brute_force(seed):
+    line_p1, line_p2 = (numpy.concatenate(pair) for pair in zip(random_segments(60, seed), box_segments()))
+    center, direction, half_width = numpy.array([-50.0, 20.0]), numpy.array([math.cos(0.7), math.sin(0.7)]), 150
+    sweep = visibility.BeamVisibility(center, direction, half_width, line_p1, line_p2)
+
+    across = numpy.array([-direction[1], direction[0]])
+    ray_origin = center + numpy.multiply.outer(numpy.linspace(-half_width, half_width, 2000), across)
+    assert_same_hits(sweep, ray_origin, numpy.broadcast_to(direction, ray_origin.shape), line_p1, line_p2)
+
+
+def test_sweep_finds_crossings_between_segment_ends():
+    # Two long segments crossing once in front of the source, the nearest one changes where they cross
+    line_p1 = numpy.array([[100.0, -100.0], [100.0, 100.0]])
+    line_p2 = numpy.array([[200.0, 100.0], [200.0, -100.0]])
+    sweep = visibility.Visibility(numpy.zeros(2), line_p1, line_p2, -0.6, 0.6)
+    assert list(sweep.segments) == [0, 1]  # Both reach past the window, so no ray misses
+    numpy.testing.assert_allclose(sweep.boundaries[1], 0.6, atol=1e-9)  # Straight ahead of the source
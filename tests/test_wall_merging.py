@@ -0,0 +1,42 @@
+import numpy
+
+from illumigator import level, light, util
+
+
+def get_hits(traced_level: level.Level, ray_origin: numpy.ndarray, ray_dir: numpy.ndarray):
+    data = traced_level.line_segments.data
+    distances, indices = light.get_line_raycast_results(ray_origin, ray_dir, data[:, 0:2], data[:, 2:4])
+    return distances, ray_origin + ray_dir * distances[:, None], indices
+
+
+def test_merged_walls_block_the_same_rays_as_the_walls_themselves():
+    # Six wall tiles in a block, merged into one outline
+    walls = [[400 + i * util.WALL_SIZE, 300 + j * util.WALL_SIZE, 1, 1, 0] for i in range(3) for j in range(2)]
+    merged = level.Level(walls, gator_coordinates=[100, 650], merge_walls=True)
+    unmerged = level.Level(walls, gator_coordinates=[100, 650], merge_walls=False)
+    assert len(merged.merged_wall_segments) == 4
+
+    tiles = merged.wall_list[:len(walls)]
+    boxes = numpy.array([(*(tile.position - util.WALL_SIZE / 2), *(tile.position + util.WALL_SIZE / 2)) for tile in tiles])
+    rng = numpy.random.default_rng(7)
+    ray_origin = rng.uniform((util.WALL_SIZE, util.WALL_SIZE), (1280 - util.WALL_SIZE, 720 - util.WALL_SIZE), (4000, 2))
+    outside = ~numpy.any((ray_origin[:, None, 0] >= boxes[:, 0]) & (ray_origin[:, None, 0] <= boxes[:, 2])
+                         & (ray_origin[:, None, 1] >= boxes[:, 1]) & (ray_origin[:, None, 1] <= boxes[:, 3]), axis=1)
+    ray_origin = ray_origin[outside]
+    angles = rng.uniform(0, 2 * numpy.pi, len(ray_origin))
+    ray_dir = numpy.column_stack([numpy.cos(angles), numpy.sin(angles)])
+
+    merged_distances, merged_ends, _ = get_hits(merged, ray_origin, ray_dir)
+    unmerged_distances, unmerged_ends, unmerged_indices = get_hits(unmerged, ray_origin, ray_dir)
+    numpy.testing.assert_array_equal(numpy.isfinite(merged_distances), numpy.isfinite(unmerged_distances))
+
+    # Rays that hit a tile hit the same tile, on its edge instead of on its diagonal
+    unmerged_tiles = unmerged.wall_list[:len(walls)]
+    hit_tiles = [unmerged.line_segments[index].parent_object for index in unmerged_indices.tolist()]
+    assert sum(tile in unmerged_tiles for tile in hit_tiles) > 100
+    for i, tile in enumerate(hit_tiles):
+        if tile not in unmerged_tiles:
+            continue
+        box = boxes[unmerged_tiles.index(tile)]
+        assert box[0] - 1e-6 <= merged_ends[i, 0] <= box[2] + 1e-6 and box[1] - 1e-6 <= merged_ends[i, 1] <= box[3] + 1e-6
+        assert merged_distances[i] <= unmerged_distances[i] + 1e-6
@@ -0,0 +1,69 @@
+import math
+import types
+
+import arcade
+import numpy
+import pytest
+
+from illumigator import entity, worldobjects
+
+
+def make_character(x: float, y: float):
+    # Stand-in for the gator, move_if_safe only looks at its sprite
+    sprite = arcade.SpriteSolidColor(10, 10, arcade.color.RED)
+    sprite.center_x, sprite.center_y = x, y
+    return types.SimpleNamespace(sprite=sprite)
+
+
+def test_curved_mirror_arc_bulges_through_its_position():
+    mirror = worldobjects.CurvedMirror(numpy.array([100.0, 100.0]), 0.4)
+    arc = mirror.geometry_segments[0]
+    assert arc.is_reflective and not arc.is_refractive
+    facing = numpy.array([math.cos(0.4), math.sin(0.4)])
+    numpy.testing.assert_allclose(arc.center + arc.radius * facing, mirror.position)
+    # Both ends are a flat mirror's length apart
+    ends = [arc.center + arc.radius * numpy.array([math.cos(angle), math.sin(angle)])
+            for angle in (arc._start_angle, arc._end_angle)]
+    assert numpy.linalg.norm(ends[1] - ends[0]) == pytest.approx(mirror.length)
+
+
+def test_curved_mirror_turns_around_its_position():
+    mirror = worldobjects.CurvedMirror(numpy.array([100.0, 100.0]), 0.0)
+    assert mirror.move_if_safe(make_character(300, 300), None, numpy.zeros(2), numpy.pi / 2)
+    arc = mirror.geometry_segments[0]
+    numpy.testing.assert_allclose(arc.center, [100.0, 100.0 - arc.radius], atol=1e-9)
+    assert (arc._start_angle + arc._end_angle) / 2 == pytest.approx(numpy.pi / 2)
+
+
+def test_curved_mirror_does_not_turn_into_the_character():
+    mirror = worldobjects.CurvedMirror(numpy.array([100.0, 100.0]), 0.0)
+    character = make_character(125, 100)  # Clear of the mirror, but in the way once it is turned a quarter
+    assert not mirror.check_collision_with_sprite(character.sprite)
+    outline = mirror.get_outline()
+
+    assert not mirror.move_if_safe(character, None, numpy.zeros(2), numpy.pi / 2)
+    assert mirror.rotation_angle == pytest.approx(0.0)
+    numpy.testing.assert_allclose(mirror.get_outline(), outline, atol=1e-9)
+
+
+@pytest.mark.parametrize("world_object", [
+    worldobjects.Prism(numpy.array([100.0, 100.0]), 0.0),
+    worldobjects.BallLens(numpy.array([100.0, 100.0])),
+])
+def test_glass_collides_from_its_geometry(world_object):
+    assert world_object.check_collision_with_sprite(make_character(100, 100).sprite)
+    assert not world_object.check_collision_with_sprite(make_character(160, 100).sprite)
+
+
+def test_player_sprite_loader_reset_starts_the_animations_over():
+    loader = entity.PlayerSpriteLoader("right")
+    loader.dead = True
+    for _ in range(30):
+        next(loader)
+    assert next(loader) is None  # The death animation is over
+
+    loader.reset()  # Only the walking frames
+    assert loader.dead and next(loader) is None
+    loader.reset(animations=True)
+    assert not loader.dead and not loader.idle
+    assert next(loader) is loader.stationary